@@ -0,0 +1,246 @@
+# analysis_queue.py
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+MAX_TRACKED_CLIENTS = 64
+
+
+class _Pending:
+    __slots__ = ("domain", "future", "hits", "clients", "enqueued_at", "version")
+
+    def __init__(self, domain, now):
+        self.domain = domain
+        self.future = Future()
+        self.hits = 0
+        self.clients = set()
+        self.enqueued_at = now
+        self.version = 0
+
+
+class AnalysisQueue:
+    """
+    Pending LLM analyses, served most valuable first by a fixed pool of
+    worker threads.
+
+    Priority = hits_weight * log1p(queries) + client_weight * log1p(distinct
+    clients) + age_weight * seconds waiting. The age term grows at the same
+    rate for every entry, so the heap key (priority minus age_weight *
+    enqueue time) never needs re-sorting as time passes. Repeated submits
+    of a pending domain share one analysis and raise its priority. When
+    `max_pending` is reached the lowest-priority entry is dropped (its
+    waiters get None), or the newcomer if it would rank lowest.
+
+    Results are kept for `recent_ttl_s` so a client retrying after its
+    wait timed out gets the finished analysis instead of a new one.
+    """
+
+    def __init__(self, analyse: Callable[[str], dict], workers=4, max_pending=1000, *,
+                 hits_weight=1.0, client_weight=1.0, age_weight=0.05, wait_s=3.0,
+                 timeout_verdict="allow", recent_ttl_s=300.0, max_recent=10000):
+        self.analyse = analyse
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.hits_weight = hits_weight
+        self.client_weight = client_weight
+        self.age_weight = age_weight
+        self.wait_s = wait_s
+        self.timeout_verdict = timeout_verdict
+        self.recent_ttl_s = recent_ttl_s
+        self.max_recent = max_recent
+        self.recent = OrderedDict()  # domain -> (finished_at, Future)
+        # Turned-away domains keep their counts so repeat queries can get them in
+        self.rejected = OrderedDict()  # domain -> _Pending
+
+        self.pending = {}   # domain -> _Pending (queued, not yet running)
+        self.running = {}   # domain -> _Pending
+        self.heap = []      # (-key, seq, domain, version); stale versions are skipped
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.threads = []
+        self.stats = {"submitted": 0, "deduped": 0, "refused": 0, "dropped": 0, "completed": 0, "failed": 0}
+
+    @classmethod
+    def from_config(cls, cfg: dict, analyse: Callable[[str], dict]) -> "AnalysisQueue":
+        return cls(
+            analyse,
+            workers=cfg.get("workers", 4),
+            max_pending=cfg.get("max_pending", 1000),
+            hits_weight=cfg.get("hits_weight", 1.0),
+            client_weight=cfg.get("client_weight", 1.0),
+            age_weight=cfg.get("age_weight", 0.05),
+            wait_s=cfg.get("wait_s", 3.0),
+            timeout_verdict=cfg.get("timeout_verdict", "allow"),
+            recent_ttl_s=cfg.get("recent_ttl_s", 300),
+            max_recent=cfg.get("max_recent", 10000),
+        )
+
+    @classmethod
+    def from_settings(cls, analyse: Callable[[str], dict]) -> Optional["AnalysisQueue"]:
+        """
+        Builds the queue from config.json, or None when disabled there.
+        """
+        from settings import config
+        cfg = config.get("analysis_queue", {})
+        if not cfg.get("enabled", True):
+            return None
+        return cls.from_config(cfg, analyse)
+
+    # ---------- Priority ----------
+
+    def _key(self, entry: _Pending) -> float:
+        return (self.hits_weight * math.log1p(entry.hits)
+                + self.client_weight * math.log1p(len(entry.clients))
+                - self.age_weight * entry.enqueued_at)
+
+    def priority(self, entry: _Pending, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return self._key(entry) + self.age_weight * now
+
+    def _push(self, entry: _Pending):
+        entry.version += 1
+        heapq.heappush(self.heap, (-self._key(entry), next(self.seq), entry.domain, entry.version))
+
+    # ---------- Submit ----------
+
+    def submit(self, domain: str, client=None, admit: Optional[Callable[[], bool]] = None) -> Optional[Future]:
+        """
+        Queues `domain` (or joins its pending/running analysis) and returns
+        a Future resolving to the analyser's result, or None if dropped.
+        `admit()` is asked only when a new analysis would be queued (not for
+        recent results or ones already pending/running); if it refuses,
+        nothing is queued and submit returns None.
+        """
+        now = time.monotonic()
+        with self.cond:
+            self._start_workers()
+            self.stats["submitted"] += 1
+            done = self.recent.get(domain)
+            if done is not None:
+                if now - done[0] < self.recent_ttl_s:
+                    self.stats["deduped"] += 1
+                    return done[1]
+                del self.recent[domain]
+            entry = self.running.get(domain)
+            if entry is not None:
+                self.stats["deduped"] += 1
+                return entry.future
+
+            entry = self.pending.get(domain)
+            if entry is not None:
+                self.stats["deduped"] += 1
+            elif admit is not None and not admit():
+                self.stats["refused"] += 1
+                return None
+            else:
+                entry = self.rejected.pop(domain, None) or _Pending(domain, now)
+                if entry.future.done():
+                    entry.future = Future()
+            entry.hits += 1
+            if client is not None and len(entry.clients) < MAX_TRACKED_CLIENTS:
+                entry.clients.add(client)
+
+            if domain not in self.pending:
+                if len(self.pending) >= self.max_pending and not self._make_room(entry):
+                    self.stats["dropped"] += 1
+                    entry.future.set_result(None)
+                    self.rejected[domain] = entry
+                    while len(self.rejected) > self.max_pending:
+                        self.rejected.popitem(last=False)
+                    return entry.future
+                self.pending[domain] = entry
+            self._push(entry)
+            # Stale heap entries pile up under heavy dedupe; rebuild occasionally
+            if len(self.heap) > 4 * self.max_pending:
+                self.heap = [h for h in self.heap if self._live(h)]
+                heapq.heapify(self.heap)
+            self.cond.notify()
+            return entry.future
+
+    def _live(self, item) -> bool:
+        entry = self.pending.get(item[2])
+        return entry is not None and entry.version == item[3]
+
+    def _make_room(self, newcomer: _Pending) -> bool:
+        """
+        Drops the lowest-priority pending entry if it ranks below `newcomer`.
+        """
+        victim = min(self.pending.values(), key=self._key)
+        if self._key(victim) >= self._key(newcomer):
+            return False
+        del self.pending[victim.domain]
+        self.stats["dropped"] += 1
+        victim.future.set_result(None)
+        self.rejected[victim.domain] = victim
+        return True
+
+    # ---------- Workers ----------
+
+    def _start_workers(self):
+        if self.threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"analysis-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _next(self) -> _Pending:
+        with self.cond:
+            while True:
+                while self.heap:
+                    item = heapq.heappop(self.heap)
+                    if self._live(item):
+                        entry = self.pending.pop(item[2])
+                        self.running[entry.domain] = entry
+                        return entry
+                self.cond.wait()
+
+    def _work(self):
+        while True:
+            entry = self._next()
+            try:
+                result = self.analyse(entry.domain)
+                self.stats["completed"] += 1
+                entry.future.set_result(result)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"[QUEUE ERROR] {entry.domain}: {e}")
+                entry.future.set_result(None)
+            finally:
+                with self.cond:
+                    self.running.pop(entry.domain, None)
+                    if entry.future.result() is not None:
+                        self.recent[entry.domain] = (time.monotonic(), entry.future)
+                        self.recent.move_to_end(entry.domain)
+                        while len(self.recent) > self.max_recent:
+                            self.recent.popitem(last=False)
+
+    def invalidate(self, stale: Callable[[dict], bool]) -> int:
+        """
+        Forgets finished results for which stale(result) is true, e.g. those
+        a new threshold or model would decide differently.
+        """
+        with self.cond:
+            drop = [d for d, (_, future) in self.recent.items() if stale(future.result())]
+            for domain in drop:
+                del self.recent[domain]
+        return len(drop)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        with self.cond:
+            top = sorted(self.pending.values(), key=self._key, reverse=True)[:10]
+            return {
+                **self.stats,
+                "pending": len(self.pending),
+                "running": len(self.running),
+                "top": [{"domain": e.domain, "hits": e.hits, "clients": len(e.clients),
+                         "waiting_s": round(now - e.enqueued_at, 1),
+                         "priority": round(self.priority(e, now), 3)} for e in top],
+            }
@@ -1,15 +1,25 @@
 #app.py
 
-from flask import Flask, render_template_string, request, redirect, url_for, flash
-from settings import load_config, save_config
+from flask import Flask, Response, render_template_string, request, redirect, url_for, flash, jsonify, stream_with_context
+from werkzeug.serving import make_server
+from settings import load_config, save_config, validate_config, manager, active_profile
+from lists import WHITELIST_USER, open_list
+from event_stream import shared_stream
+from query_index import QueryIndex
+from tracing import sample_profile, format_folded
 import os
+import json
 import logging
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
 
 LOG_FILE = os.path.join(CONFIG_DIR, "queries.log")
-WHITELIST_FILE = os.path.join(CONFIG_DIR, "whitelist.txt")
+FEED_STATUS_FILE = os.path.join(CONFIG_DIR, "feeds", "status.json")
+RATE_LIMIT_STATUS_FILE = os.path.join(CONFIG_DIR, "rate_limit_status.json")
+LLM_BACKENDS_STATUS_FILE = os.path.join(CONFIG_DIR, "llm_backends.json")
+# Sockets are bound once at startup; everything else in the form applies live
+RESTART_KEYS = ("dns_port", "dashboard_port", "dns_listen_address")
 
 
 #-----------------------HTML TEMPLATES-----------------------
@@ -98,13 +108,13 @@ TEMPLATE = """
     align-items: end;
   ">
     <div>
-      <label><strong>Model:</strong></label><br>
-      <input name="model" value="{{ config.model }}">
+      <label><strong>Model ({{ config.llm.active_profile }} profile):</strong></label><br>
+      <input name="model" value="{{ profile.model }}">
     </div>
 
     <div>
       <label><strong>API URL:</strong></label><br>
-      <input name="api_url" value="{{ config.api_url }}">
+      <input name="api_url" value="{{ profile.api_url }}">
     </div>
 
     <div>
@@ -189,6 +199,37 @@ LOG_TEMPLATE = """
 {{ line.strip() }}
 {% endfor %}</pre>
 
+<h2>Live</h2>
+<form id="live-filter">
+  <select name="verdict">
+    <option value="">all</option><option value="allow">allow</option><option value="block">block</option>
+  </select>
+  <input name="client" placeholder="client IP">
+  <input name="q" placeholder="domain contains">
+  <button type="submit">▶️ Follow</button>
+</form>
+<pre id="live"></pre>
+
+<script>
+  let source = null;
+  const live = document.getElementById("live");
+  document.getElementById("live-filter").addEventListener("submit", (e) => {
+    e.preventDefault();
+    if (source) source.close();
+    live.textContent = "";
+    const params = new URLSearchParams(new FormData(e.target));
+    source = new EventSource("{{ url_for('query_stream') }}?" + params);
+    source.onmessage = (msg) => {
+      const ev = JSON.parse(msg.data);
+      const ts = new Date(ev.ts * 1000).toLocaleTimeString();
+      live.textContent = `${ts} - ${ev.client || "-"} - ${ev.qname} - ${ev.verdict} (${ev.reason})\n` + live.textContent.slice(0, 20000);
+    };
+    source.addEventListener("dropped", (msg) => {
+      live.textContent = `… ${JSON.parse(msg.data).count} events skipped\n` + live.textContent;
+    });
+  });
+</script>
+
 <form method="get" action="{{ url_for('view_logs') }}">
   <button type="submit">🔄 Refresh</button>
 </form>
@@ -207,6 +248,9 @@ class Dashboard:
     def __init__(self):
         self.app = Flask(__name__)
         self.app.secret_key = 'dev'
+        self.query_index = QueryIndex.from_settings(log_path=LOG_FILE)
+        if self.query_index is not None:
+            self.query_index.start()
         self._setup_routes()
 
         # Suppress Werkzeug logging for cleaner output
@@ -228,8 +272,10 @@ class Dashboard:
                     #Update config settings
                     config["filtering_enabled"] = "filtering_enabled" in request.form
                     config["advanced_analysis_enabled"] = "advanced_analysis_enabled" in request.form
-                    config["model"] = request.form["model"]
-                    config["api_url"] = request.form["api_url"]
+                    # The LLM in use is the active profile's; editing it applies live
+                    profile = active_profile(config)
+                    profile["model"] = request.form["model"]
+                    profile["api_url"] = request.form["api_url"]
                     config["dns_port"] = int(request.form["dns_port"])
                     config["dashboard_port"] = int(request.form["dashboard_port"])  # New line
                     config["upstream_dns"] = request.form["upstream_dns"]
@@ -242,25 +288,27 @@ class Dashboard:
                         flash("✅ New blacklist URL added.")
 
                     new_domain = request.form.get("new_whitelist_domain", "").strip().lower()
-                    if new_domain:
-                        if os.path.exists(WHITELIST_FILE):
-                            with open(WHITELIST_FILE, "r") as f:
-                                existing = set(line.strip().lower() for line in f)
-                        else:
-                            existing = set()
-                        if new_domain not in existing:
-                            with open(WHITELIST_FILE, "a") as f:
-                                f.write(new_domain + "\n")
-                            flash("✅ Whitelisted domain added.")
-
+                    # Through the shared store: the resolver gets it as a delta, no rescan
+                    if new_domain and open_list(WHITELIST_USER).add(new_domain):
+                        flash("✅ Whitelisted domain added.")
+
+                    errors = validate_config(config)
+                    if errors:
+                        flash("❌ Not saved: " + "; ".join(errors))
+                        return redirect(url_for("dashboard"))
+                    running = manager.snapshot
                     save_config(config)
-                    flash("⚙️ Settings saved successfully! Restart the program to apply them.")
+                    if any(config.get(k) != running.get(k) for k in RESTART_KEYS):
+                        flash("⚙️ Settings saved and applied. Restart the program to change ports "
+                              "or the listen address.")
+                    else:
+                        flash("⚙️ Settings saved and applied.")
                     return redirect(url_for("dashboard"))
 
                 except Exception as e:
                     return f"<h2>Error:</h2><pre>{e}</pre>"
 
-            return render_template_string(TEMPLATE, config=config, stats=stats)
+            return render_template_string(TEMPLATE, config=config, profile=active_profile(config), stats=stats)
 
 #-----------------------VIEW LOGS ROUTE-----------------------
         @self.app.route("/logs")
@@ -287,6 +335,92 @@ class Dashboard:
                 flash(f"Error clearing logs: {e}")
             return redirect(url_for("view_logs"))
 
+#-----------------------FEED STATUS ROUTE-----------------------
+        @self.app.route("/api/feeds")
+        def feed_status():
+            # Written by FeedScheduler after every refresh
+            try:
+                with open(FEED_STATUS_FILE) as f:
+                    return jsonify(json.load(f))
+            except (FileNotFoundError, json.JSONDecodeError):
+                return jsonify({"feeds": []})
+
+        @self.app.route("/api/clients")
+        def client_status():
+            # Written by ClientRateLimiter while the resolver runs
+            try:
+                with open(RATE_LIMIT_STATUS_FILE) as f:
+                    return jsonify(json.load(f))
+            except (FileNotFoundError, json.JSONDecodeError):
+                return jsonify({"top_offenders": []})
+
+        @self.app.route("/api/llm")
+        def llm_status():
+            # Per-backend latency, errors, tokens and cost, written by LLMRouter
+            try:
+                with open(LLM_BACKENDS_STATUS_FILE) as f:
+                    return jsonify(json.load(f))
+            except (FileNotFoundError, json.JSONDecodeError):
+                return jsonify({"backends": []})
+
+#-----------------------LIVE QUERY STREAM ROUTE-----------------------
+        @self.app.route("/api/stream")
+        def query_stream():
+            # Server-sent events from the resolver's in-memory ring buffer
+            stream = shared_stream()
+            if stream is None:
+                return jsonify({"error": "event stream disabled"}), 404
+            if not stream.acquire_viewer():
+                return jsonify({"error": "too many live viewers"}), 503
+            last_id = request.headers.get("Last-Event-ID") or request.args.get("since")
+            body = stream.sse(
+                verdict=request.args.get("verdict") or None,
+                client=request.args.get("client") or None,
+                q=(request.args.get("q") or "").lower() or None,
+                last_id=int(last_id) if last_id and last_id.isdigit() else None,
+            )
+            response = Response(stream_with_context(body), mimetype="text/event-stream")
+            response.headers["Cache-Control"] = "no-cache"
+            response.headers["X-Accel-Buffering"] = "no"
+            response.call_on_close(stream.release_viewer)
+            return response
+
+#-----------------------QUERY SEARCH ROUTE-----------------------
+        @self.app.route("/api/queries")
+        def query_search():
+            # Paginated search over the incrementally built log index
+            if self.query_index is None:
+                return jsonify({"error": "query index disabled"}), 404
+            args = request.args
+            try:
+                # Pick up the last few lines if the index is idle; catching up on a
+                # large backlog is the background thread's job, never a request's
+                self.query_index.sync(blocking=False, max_batches=1)
+                page = self.query_index.search(
+                    since=args.get("since"), until=args.get("until"),
+                    domain=args.get("domain"), exact=args.get("exact") in ("1", "true"),
+                    verdict=args.get("verdict"), source=args.get("source"), client=args.get("client"),
+                    cursor=args.get("cursor", type=int), limit=args.get("limit", 100, type=int),
+                    order=args.get("order", "desc"),
+                )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            return jsonify(page)
+
+#-----------------------PROFILER ROUTE-----------------------
+        @self.app.route("/api/profile")
+        def profile():
+            # Samples every thread's stack (resolver, workers, feeds) for N seconds
+            seconds = max(0.1, min(request.args.get("seconds", 5, type=float), 60))
+            interval = max(1, request.args.get("interval_ms", 5, type=float)) / 1000
+            folded = sample_profile(seconds, interval)
+            if folded is None:
+                return jsonify({"error": "a profile is already running"}), 409
+            if request.args.get("format") == "json":
+                total = sum(folded.values())
+                return jsonify({"seconds": seconds, "samples": total,
+                                "stacks": [{"stack": s, "count": n} for s, n in folded.most_common(200)]})
+            return Response(format_folded(folded), mimetype="text/plain")
 
 #-----------------------HELPERS-----------------------
 
@@ -306,4 +440,7 @@ class Dashboard:
     def start(self, host="0.0.0.0", port=None):
         config = load_config()
         actual_port = port or config.get("dashboard_port", 5000)
-        self.app.run(host=host, port=actual_port, debug=False, use_reloader=False)
+        # One thread per request, so open live streams never block the pages
+        server = make_server(host, actual_port, self.app, threaded=True)
+        server.daemon_threads = True
+        server.serve_forever()
@@ -0,0 +1,132 @@
+# backends.py
+
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BASE_DIR, "config")
+
+
+def _config_path(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(CONFIG_DIR, path)
+
+
+def _load_fixture(path: str) -> dict:
+    with open(_config_path(path)) as f:
+        return {k.lower().strip("."): v for k, v in json.load(f).items()}
+
+
+def _sleep(latency: Optional[str]):
+    if latency:
+        from mock_llm import parse_latency
+        time.sleep(max(0.0, parse_latency(latency)()))
+
+
+# ---------- WHOIS ----------
+
+class LiveWhoisProvider:
+    def creation_date(self, domain: str):
+        from simple_verifier import get_domain_creation_date
+        return get_domain_creation_date(domain)
+
+
+class FixtureWhoisProvider:
+    """
+    Creation dates from a JSON fixture: {"example.com": "1995-08-14", ...}.
+    A null value means "WHOIS had no date". Unlisted domains get
+    `default_age_days` (None -> no date).
+    """
+
+    def __init__(self, path: str, default_age_days: Optional[int] = 3650, latency: Optional[str] = None):
+        self.dates = _load_fixture(path) if path else {}
+        self.default_age_days = default_age_days
+        self.latency = latency
+
+    def creation_date(self, domain: str):
+        _sleep(self.latency)
+        domain = domain.lower().strip(".")
+        if domain in self.dates:
+            value = self.dates[domain]
+            return datetime.fromisoformat(value).replace(tzinfo=timezone.utc) if value else None
+        if self.default_age_days is None:
+            return None
+        return datetime.now(timezone.utc) - timedelta(days=self.default_age_days)
+
+
+# ---------- TLS certificates ----------
+
+class LiveCertProvider:
+    def get_san(self, hostname: str) -> Optional[List[str]]:
+        from simple_verifier import get_san
+        return get_san(hostname)
+
+
+class FixtureCertProvider:
+    """
+    SAN lists from a JSON fixture: {"example.com": ["example.com", "www.example.com"]}.
+    Unlisted hosts get a single-name certificate for themselves.
+    """
+
+    def __init__(self, path: str, latency: Optional[str] = None):
+        self.sans = _load_fixture(path) if path else {}
+        self.latency = latency
+
+    def get_san(self, hostname: str) -> Optional[List[str]]:
+        _sleep(self.latency)
+        hostname = hostname.lower().strip(".")
+        return self.sans.get(hostname, [hostname])
+
+
+# ---------- Selection from config ----------
+
+def build_backends(cfg: Optional[dict]) -> dict:
+    """
+    Builds the backends selected under "backends" in config.json:
+
+      "backends": {
+        "llm": "live" | "mock",
+        "mock_llm": {"latency": "lognormal:300,0.5", "jitter_ms": 0,
+                     "error_rate": 0.0, "script": "fixtures/llm_script.json"},
+        "whois": "live" | "fixture",
+        "whois_fixture": "fixtures/whois.json",
+        "tls": "live" | "fixture",
+        "tls_fixture": "fixtures/certs.json"
+      }
+
+    Returns {"whois": provider, "cert": provider, "llm_url": url-or-None,
+    "llm_server": MockLLMServer-or-None}. A mock LLM is started in-process
+    and its URL should replace the profile's api_url.
+    """
+    cfg = cfg or {}
+    out = {"llm_url": None, "llm_server": None}
+
+    if cfg.get("whois", "live") == "fixture":
+        out["whois"] = FixtureWhoisProvider(cfg.get("whois_fixture", ""),
+                                            default_age_days=cfg.get("whois_default_age_days", 3650),
+                                            latency=cfg.get("whois_latency"))
+    else:
+        out["whois"] = LiveWhoisProvider()
+
+    if cfg.get("tls", "live") == "fixture":
+        out["cert"] = FixtureCertProvider(cfg.get("tls_fixture", ""), latency=cfg.get("tls_latency"))
+    else:
+        out["cert"] = LiveCertProvider()
+
+    if cfg.get("llm", "live") == "mock":
+        from mock_llm import MockLLMServer
+        m = cfg.get("mock_llm", {})
+        script = m.get("script")
+        server = MockLLMServer(
+            latency=m.get("latency", "fixed:0"),
+            jitter_ms=float(m.get("jitter_ms", 0)),
+            error_rate=float(m.get("error_rate", 0.0)),
+            malicious_ratio=float(m.get("malicious_ratio", 0.0)),
+            script=_config_path(script) if script else None,
+        ).start()
+        out["llm_server"] = server
+        out["llm_url"] = server.url
+
+    return out
@@ -1,20 +1,82 @@
 # blacklist_updater.py
 
-import requests
-import re
+import hashlib
+import heapq
+import json
 import os
+import time
+
+from list_store import open_store
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
 
 BLACKLIST_FILE = os.path.join(CONFIG_DIR, "blacklist.txt")
 WHITELIST_FILE = os.path.join(CONFIG_DIR, "whitelist.txt")
+FEEDS_DIR = os.path.join(CONFIG_DIR, "feeds")
+VERSION_FILE = os.path.join(CONFIG_DIR, "blacklist.version.json")
+
+# Source key for rules that were in blacklist.txt before it was compiled from feeds
+LOCAL_SOURCE = "local"
+
+
+def _atomic_write_lines(path, lines):
+    """
+    Writes lines to a temp file next to `path` and renames it into place,
+    so readers only ever see a complete old or new version.
+    """
+    tmp = f"{path}.tmp"
+    count = 0
+    with open(tmp, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return count
+
+
+def _store_entries(path):
+    store = open_store(path)
+    store.refresh()  # pick up other processes' journal lines
+    return set(entry for entry, _ in store.items())
+
+
+def _read_lines(path):
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line:
+                yield line
+
+
+def source_key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
 
 class BlacklistUpdater:
-    def __init__(self, blacklist_url, local_file=BLACKLIST_FILE, whitelist_file=WHITELIST_FILE):
+    def __init__(self, blacklist_url, local_file=BLACKLIST_FILE, whitelist_file=WHITELIST_FILE,
+                 feeds_dir=FEEDS_DIR, version_file=VERSION_FILE, session=None, timeout=10):
         self.blacklist_url = blacklist_url
         self.local_file = local_file
         self.whitelist_file = whitelist_file
+        self.feeds_dir = feeds_dir
+        self.version_file = version_file
+        if session is None:
+            import requests  # only needed once a feed is actually fetched
+            session = requests.Session()
+        self.session = session
+        self.timeout = timeout
+        self.last_error = None
+
+        # Per-source state: sorted rule snapshot + conditional-request validators
+        key = source_key(blacklist_url)
+        self.source_key = key
+        self.rules_file = os.path.join(feeds_dir, f"{key}.rules")
+        self.state_file = os.path.join(feeds_dir, f"{key}.json")
 
     #  NEW — Validate AdGuard-style rules (filter only useful ones)
     def is_valid_rule(self, line):
@@ -23,21 +85,82 @@ class BlacklistUpdater:
             return False
         return True
 
-    #  MODIFIED — Don't reduce rules to domains, keep raw filter rules
-    def fetch_remote_rules(self):
+    # ---------- Source state ----------
+
+    def load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_state(self, state):
+        os.makedirs(self.feeds_dir, exist_ok=True)
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.state_file)
+
+    #  MODIFIED — conditional GET, stream-parsed line by line
+    def fetch_remote_rules(self, state=None):
+        """
+        Returns (rules, headers). `rules` is the feed's sorted unique rules,
+        or None when the feed is unchanged (HTTP 304) or unreachable.
+        """
+        state = state if state is not None else self.load_state()
+        headers = {}
+        if os.path.exists(self.rules_file):
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        import requests
+
         print(f"Fetching rules from {self.blacklist_url}...")
+        self.last_error = None
         try:
-            response = requests.get(self.blacklist_url, timeout=10)
-            response.raise_for_status()
+            with self.session.get(self.blacklist_url, headers=headers,
+                                  timeout=self.timeout, stream=True) as response:
+                if response.status_code == 304:
+                    return None, response.headers
+                response.raise_for_status()
+                if response.encoding is None:
+                    response.encoding = "utf-8"
+
+                rules = []
+                for line in response.iter_lines(decode_unicode=True):
+                    if line and self.is_valid_rule(line):
+                        rules.append(line.strip())
         except requests.RequestException as e:
             print(f"Error downloading rules: {e}")
-            return set()
+            self.last_error = str(e)
+            return None, {}
+
+        rules.sort()
+        return [r for i, r in enumerate(rules) if i == 0 or r != rules[i - 1]], response.headers
 
-        rules = set()
-        for line in response.text.splitlines():
-            if self.is_valid_rule(line):
-                rules.add(line.strip())
-        return rules
+    def load_source_rules(self):
+        return _read_lines(self.rules_file)
+
+    @staticmethod
+    def diff_sorted(old, new):
+        """
+        Merge-walks two sorted rule streams and returns (added, removed).
+        """
+        added, removed = [], []
+        old, new = iter(old), iter(new)
+        a, b = next(old, None), next(new, None)
+        while a is not None or b is not None:
+            if b is None or (a is not None and a < b):
+                removed.append(a)
+                a = next(old, None)
+            elif a is None or b < a:
+                added.append(b)
+                b = next(new, None)
+            else:
+                a, b = next(old, None), next(new, None)
+        return added, removed
 
     #  MODIFIED — load full rules, not just domains
     def load_local_rules(self):
@@ -48,49 +171,161 @@ class BlacklistUpdater:
             return set(line.strip() for line in f if line.strip())
 
     def load_whitelist_rules(self):
-        if not os.path.exists(self.whitelist_file):
-            return set()
-
-        with open(self.whitelist_file, 'r') as f:
-            return set(line.strip() for line in f if line.strip())
-
-    def save_new_rules(self, new_rules):
-        if not new_rules:
-            print("No new rules to add.")
-            return
-
-        with open(self.local_file, 'a') as f:
-            for rule in sorted(new_rules):
-                f.write(rule + '\n')
-
-        print(f"Added {len(new_rules)} new rules to {self.local_file}.")
+        return _store_entries(self.whitelist_file)
 
     def add_to_whitelist(self, rules):
         if not rules:
             print("No rules provided.")
             return
 
-        existing = self.load_whitelist_rules()
-        new = set(rules) - existing
+        added = open_store(self.whitelist_file).bulk_import(sorted(set(r.strip() for r in rules if r.strip())))
 
-        if not new:
+        if not added:
             print("No new whitelist rules to add.")
             return
 
-        with open(self.whitelist_file, 'a') as f:
-            for rule in sorted(new):
-                f.write(rule + '\n')
+        print(f"Added {added} new rules to {self.whitelist_file}.")
+
+    # ---------- Compiled list ----------
+
+    @staticmethod
+    def compile(feeds_dir=FEEDS_DIR, local_file=BLACKLIST_FILE, whitelist_file=WHITELIST_FILE,
+                version_file=VERSION_FILE, sources=None):
+        """
+        Streams a k-way merge of every source snapshot into a new version of
+        the compiled blacklist and swaps it in atomically. `sources` limits
+        the merge to the given source keys (feeds dropped from the config
+        then drop out of the list).
+        """
+        if sources is None:
+            sources = sorted(f[:-len(".rules")] for f in os.listdir(feeds_dir)
+                             if f.endswith(".rules")) if os.path.isdir(feeds_dir) else []
+        whitelist = _store_entries(whitelist_file)
+
+        def merged():
+            last = None
+            streams = [_read_lines(os.path.join(feeds_dir, f"{k}.rules")) for k in sources]
+            for rule in heapq.merge(*streams):
+                if rule != last and rule not in whitelist:
+                    yield rule
+                last = rule
+
+        count = _atomic_write_lines(local_file, merged())
+
+        try:
+            with open(version_file) as f:
+                version = json.load(f).get("version", 0) + 1
+        except (FileNotFoundError, json.JSONDecodeError):
+            version = 1
+        info = {"version": version, "compiled_at": time.time(), "rules": count, "sources": sources}
+        tmp = f"{version_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(info, f, indent=2)
+        os.replace(tmp, version_file)
+
+        print(f"Published blacklist v{version} with {count} rules from {len(sources)} sources.")
+        return info
+
+    #  MODIFIED — incremental: conditional fetch, per-source delta, atomic publish
+    def update(self, compile=True):
+        """
+        Returns {"added": [...], "removed": [...]} for this source, or None
+        when the feed was unchanged or unreachable.
+        """
+        state = self.load_state()
+        remote_rules, headers = self.fetch_remote_rules(state)
+
+        state["url"] = self.blacklist_url
+        state["checked_at"] = time.time()
+        state["error"] = self.last_error
+        if self.last_error is None:
+            # 200 or 304: our snapshot is known to match upstream as of now
+            state["verified_at"] = state["checked_at"]
+        if remote_rules is None:
+            self.save_state(state)
+            print(f"No changes for {self.blacklist_url}.")
+            return None
+
+        added, removed = self.diff_sorted(self.load_source_rules(), remote_rules)
+
+        os.makedirs(self.feeds_dir, exist_ok=True)
+        _atomic_write_lines(self.rules_file, remote_rules)
+        state.update({
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": state["checked_at"],
+            "rules": len(remote_rules),
+            "added": len(added),
+            "removed": len(removed),
+        })
+        self.save_state(state)
+        print(f"{self.blacklist_url}: +{len(added)} / -{len(removed)} rules.")
+
+        if compile and (added or removed):
+            self.compile(self.feeds_dir, self.local_file, self.whitelist_file, self.version_file)
+        return {"added": added, "removed": removed}
+
+
+def seed_local_source(feeds_dir=FEEDS_DIR, local_file=BLACKLIST_FILE, version_file=VERSION_FILE):
+    """
+    On the first compiled publish, keeps what the old append-only updater
+    (or a hand edit) left in blacklist.txt by snapshotting it as the
+    LOCAL_SOURCE feed. Returns the source keys to merge in addition to the
+    configured feeds ([] when there is no such snapshot).
+    """
+    rules_file = os.path.join(feeds_dir, f"{LOCAL_SOURCE}.rules")
+    if not os.path.exists(rules_file) and not os.path.exists(version_file) and os.path.exists(local_file):
+        rules = sorted(set(line.strip() for line in _read_lines(local_file) if line.strip()))
+        os.makedirs(feeds_dir, exist_ok=True)
+        _atomic_write_lines(rules_file, rules)
+        print(f"Kept {len(rules)} existing rules from {local_file} as the local source.")
+    return [LOCAL_SOURCE] if os.path.exists(rules_file) else []
+
+
+def has_snapshots(feeds_dir, sources):
+    return any(os.path.exists(os.path.join(feeds_dir, f"{k}.rules")) for k in sources)
+
 
-        print(f"Added {len(new)} new rules to {self.whitelist_file}.")
+def feed_sources(urls, feeds_dir=FEEDS_DIR, local_file=BLACKLIST_FILE, version_file=VERSION_FILE):
+    """
+    Source keys a compiled list is merged from: the given feeds plus the
+    local source seeded from an older blacklist.txt, if any.
+    """
+    return [source_key(url) for url in urls] + seed_local_source(feeds_dir, local_file, version_file)
 
-    #  MODIFIED — operate on rules instead of just domains
-    def update(self):
-        remote_rules = self.fetch_remote_rules()
-        local_rules = self.load_local_rules()
-        whitelist_rules = self.load_whitelist_rules()
 
-        # Remove already known or whitelisted rules
-        filtered_new_rules = remote_rules - local_rules - whitelist_rules
+def update_all(urls, fetch=True, force=False, **kwargs):
+    """
+    Updates every configured feed (unless `fetch` is false), then publishes
+    one compiled list containing only those feeds and the local source,
+    if anything changed or `force`. Returns the version info, or None when
+    nothing was published; with no source snapshot at all the existing
+    list is kept rather than replaced by an empty one.
+    """
+    changed = False
+    if fetch:
+        for url in urls:
+            changed = BlacklistUpdater(url, **kwargs).update(compile=False) is not None or changed
 
-        self.save_new_rules(filtered_new_rules)
+    version_file = kwargs.get("version_file", VERSION_FILE)
+    feeds_dir = kwargs.get("feeds_dir", FEEDS_DIR)
+    local_file = kwargs.get("local_file", BLACKLIST_FILE)
+    sources = feed_sources(urls, feeds_dir, local_file, version_file)
+    if not has_snapshots(feeds_dir, sources):
+        print("No feed has been fetched yet; keeping the current blacklist.")
+        return None
+    try:
+        with open(version_file) as f:
+            published = json.load(f).get("sources")
+    except (FileNotFoundError, json.JSONDecodeError):
+        published = None
 
+    if changed or force or published != sources:
+        return BlacklistUpdater.compile(
+            feeds_dir,
+            local_file,
+            kwargs.get("whitelist_file", WHITELIST_FILE),
+            version_file,
+            sources=sources,
+        )
+    return None
@@ -0,0 +1,246 @@
+# burst_detector.py
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+ACTIONS = {"block", "list_only"}
+
+# Shared hosting and CDNs where many distinct unlisted names a minute is normal traffic
+DEFAULT_EXEMPT = (
+    "akamaiedge.net", "akamaized.net", "amazonaws.com", "azureedge.net", "blogspot.com",
+    "cloudfront.net", "fastly.net", "github.io", "googlevideo.com", "herokuapp.com",
+    "netlify.app", "vercel.app", "weebly.com",
+)
+_INV_POW2 = [2.0 ** -r for r in range(66)]
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """
+    Minimal HyperLogLog over 64-bit hashes with 2**p one-byte registers.
+    """
+
+    def __init__(self, p: int = 8, registers: Optional[bytearray] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, h: int) -> bool:
+        """
+        Returns True if a register changed (only then can the estimate move).
+        """
+        idx = h >> (64 - self.p)
+        w = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - w.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+            return True
+        return False
+
+    def count(self) -> float:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(map(_INV_POW2.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # small-range correction
+        return estimate
+
+    @classmethod
+    def union(cls, sketches, p: int) -> "HyperLogLog":
+        sketches = list(sketches)
+        if not sketches:
+            return cls(p)
+        if len(sketches) == 1:
+            return cls(p, bytearray(sketches[0].registers))
+        return cls(p, bytearray(map(max, *(s.registers for s in sketches))))
+
+
+class BurstDetector:
+    """
+    Spots random-subdomain floods (a8f3k2.victim.com, ...) and clients whose
+    queries mostly come back NXDOMAIN, over a sliding window of `slices`
+    sub-windows.
+
+    Per registrable domain it keeps one HyperLogLog per sub-window of the
+    distinct names seen under it; when their union crosses
+    `subdomain_threshold` the domain is held for `hold_s` seconds under
+    `action` ("list_only" or "block"). Domains in `exempt`, and names under
+    them, are never flagged. Tracked domains and clients are LRUs
+    capped at `max_domains` / `max_clients`, so memory is bounded however
+    many names or source addresses an attacker uses.
+    """
+
+    def __init__(self, window_s=60.0, slices=6, subdomain_threshold=50, action="list_only",
+                 hold_s=600.0, nx_ratio=0.5, nx_min_queries=50, max_domains=4096,
+                 max_clients=10000, precision=8, exempt=DEFAULT_EXEMPT):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown burst action: {action}")
+        self.slice_s = float(window_s) / slices
+        self.slices = int(slices)
+        self.subdomain_threshold = subdomain_threshold
+        self.action = action
+        self.hold_s = float(hold_s)
+        self.nx_ratio = nx_ratio
+        self.nx_min_queries = nx_min_queries
+        self.max_domains = int(max_domains)
+        self.max_clients = int(max_clients)
+        self.p = precision
+        self.exempt = frozenset(d.lower().strip(".") for d in exempt)
+
+        # registrable -> {slice_id: HyperLogLog}
+        self.domains: "OrderedDict[str, dict]" = OrderedDict()
+        # client -> {slice_id: [queries, nxdomain]}
+        self.clients: "OrderedDict[str, dict]" = OrderedDict()
+        # registrable -> (action, until)
+        self.flagged: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "BurstDetector":
+        return cls(
+            window_s=cfg.get("window_s", 60),
+            slices=cfg.get("slices", 6),
+            subdomain_threshold=cfg.get("subdomain_threshold", 50),
+            action=cfg.get("action", "list_only"),
+            hold_s=cfg.get("hold_s", 600),
+            nx_ratio=cfg.get("nx_ratio", 0.5),
+            nx_min_queries=cfg.get("nx_min_queries", 50),
+            max_domains=cfg.get("max_domains", 4096),
+            max_clients=cfg.get("max_clients", 10000),
+            precision=cfg.get("precision", 8),
+            exempt=cfg.get("exempt", DEFAULT_EXEMPT),
+        )
+
+    @classmethod
+    def from_settings(cls) -> Optional["BurstDetector"]:
+        """
+        Builds the detector from config.json, or None when disabled there.
+        """
+        from settings import config
+        cfg = config.get("burst_detection", {})
+        if not cfg.get("enabled", False):
+            return None
+        return cls.from_config(cfg)
+
+    # ---------- Helpers ----------
+
+    def _slice(self, now):
+        return int(now // self.slice_s)
+
+    def is_exempt(self, registrable: str) -> bool:
+        labels = registrable.split(".")
+        return any(".".join(labels[i:]) in self.exempt for i in range(len(labels) - 1))
+
+    def _live(self, ring, current):
+        # Drop sub-windows that slid out of the window
+        for sid in [s for s in ring if s <= current - self.slices]:
+            del ring[sid]
+
+    @staticmethod
+    def _lru_get(table, key, cap):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = {}
+            while len(table) > cap:
+                table.popitem(last=False)
+        else:
+            table.move_to_end(key)
+        return entry
+
+    # ---------- Domains ----------
+
+    def check(self, registrable: str, now: Optional[float] = None) -> Optional[str]:
+        """
+        Returns the action held for `registrable`, or None.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            held = self.flagged.get(registrable)
+            if held is None:
+                return None
+            if held[1] <= now:
+                del self.flagged[registrable]
+                return None
+            return held[0]
+
+    def observe(self, name: str, registrable: str, now: Optional[float] = None) -> Optional[str]:
+        """
+        Records `name` (a name about to be analysed) under its registrable
+        domain. Returns the action if the domain is, or just became, flagged.
+        """
+        now = time.time() if now is None else now
+        if name == registrable:
+            return self.check(registrable, now)
+        if self.is_exempt(registrable):
+            return None
+        current = self._slice(now)
+        with self.lock:
+            held = self.flagged.get(registrable)
+            if held is not None and held[1] > now:
+                return held[0]
+            ring = self._lru_get(self.domains, registrable, self.max_domains)
+            self._live(ring, current)
+            sketch = ring.get(current)
+            if sketch is None:
+                sketch = ring[current] = HyperLogLog(self.p)
+            if not sketch.add(_hash64(name)):
+                return None
+            distinct = HyperLogLog.union(ring.values(), self.p).count()
+            if distinct < self.subdomain_threshold:
+                return None
+            self.flagged[registrable] = (self.action, now + self.hold_s)
+            self.flagged.move_to_end(registrable)
+            while len(self.flagged) > self.max_domains:
+                self.flagged.popitem(last=False)
+            self.domains.pop(registrable, None)
+        print(f"[BURST] {registrable}: ~{distinct:.0f} distinct names in window -> {self.action}")
+        return self.action
+
+    # ---------- Clients ----------
+
+    def observe_reply(self, client, rcode: int, now: Optional[float] = None):
+        if client is None:
+            return
+        now = time.time() if now is None else now
+        current = self._slice(now)
+        with self.lock:
+            ring = self._lru_get(self.clients, client, self.max_clients)
+            self._live(ring, current)
+            counts = ring.setdefault(current, [0, 0])
+            counts[0] += 1
+            if rcode == 3:
+                counts[1] += 1
+
+    def client_suspicious(self, client, now: Optional[float] = None) -> bool:
+        """
+        True when most of the client's recent queries came back NXDOMAIN.
+        """
+        if client is None:
+            return False
+        now = time.time() if now is None else now
+        with self.lock:
+            ring = self.clients.get(client)
+            if not ring:
+                return False
+            self._live(ring, self._slice(now))
+            total = sum(c[0] for c in ring.values())
+            nx = sum(c[1] for c in ring.values())
+        return total >= self.nx_min_queries and nx / total >= self.nx_ratio
+
+    def status(self) -> dict:
+        now = time.time()
+        with self.lock:
+            return {
+                "tracked_domains": len(self.domains),
+                "tracked_clients": len(self.clients),
+                "flagged": {d: {"action": a, "expires_in_s": round(u - now, 1)}
+                            for d, (a, u) in self.flagged.items() if u > now},
+            }
@@ -0,0 +1,240 @@
+# dataset_sampler.py
+
+import gzip
+import hashlib
+import io
+import math
+import os
+import random
+import sqlite3
+import tempfile
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def open_text(path: str):
+    """
+    Opens a plain, gzip (.gz) or zstd (.zst) file for text reading.
+    zstd needs the optional `zstandard` package.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    if path.endswith((".zst", ".zstd")):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Reading .zst datasets needs the 'zstandard' package (pip install zstandard)")
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, newline="", encoding="utf-8")
+    return open(path, newline="", encoding="utf-8")
+
+
+# ---------- Dedup ----------
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings (bytearray bits, blake2b double hashing).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        m = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.nbits = max(64, m)
+        self.k = max(1, int(round(self.nbits / capacity * math.log(2))))
+        self.bits = bytearray((self.nbits + 7) // 8)
+
+    def _positions(self, key: str):
+        h = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(h[:8], "little")
+        h2 = int.from_bytes(h[8:], "little") | 1
+        return [(h1 + i * h2) % self.nbits for i in range(self.k)]
+
+    def add(self, key: str) -> bool:
+        """
+        Sets the key's bits; returns True if they were all set already
+        (the key was possibly seen before).
+        """
+        seen = True
+        for p in self._positions(key):
+            byte, bit = p >> 3, 1 << (p & 7)
+            if not self.bits[byte] & bit:
+                seen = False
+                self.bits[byte] |= bit
+        return seen
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+class DomainDeduper:
+    """
+    Exact dedup with bounded memory: a Bloom filter answers "new" for most
+    keys, and only its "maybe seen" answers are confirmed against an on-disk
+    SQLite table that holds every key and its (max) label.
+    """
+
+    BATCH = 10000
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 0.01, path: Optional[str] = None):
+        self.bloom = BloomFilter(capacity, error_rate)
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="dedup-", suffix=".sqlite")
+            os.close(fd)
+            self._owned = path
+        else:
+            self._owned = None
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=OFF")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen (domain TEXT PRIMARY KEY, label INTEGER)")
+        self.pending: Dict[str, int] = {}
+        self.spill_checks = 0
+
+    def _flush(self):
+        if self.pending:
+            self.db.executemany("INSERT OR REPLACE INTO seen VALUES (?, ?)", self.pending.items())
+            self.pending.clear()
+
+    def add(self, domain: str, label: int) -> bool:
+        """
+        Returns True if `domain` is new. A repeat with a higher label raises
+        the stored one (the dataset keeps the max label per domain).
+        """
+        if not self.bloom.add(domain):
+            self.pending[domain] = label
+            if len(self.pending) >= self.BATCH:
+                self._flush()
+            return True
+
+        self.spill_checks += 1
+        if domain in self.pending:
+            old = self.pending[domain]
+        else:
+            row = self.db.execute("SELECT label FROM seen WHERE domain = ?", (domain,)).fetchone()
+            if row is None:
+                self.pending[domain] = label
+                if len(self.pending) >= self.BATCH:
+                    self._flush()
+                return True
+            old = row[0]
+        if label > old:
+            self.pending[domain] = label
+        return False
+
+    def label(self, domain: str) -> Optional[int]:
+        if domain in self.pending:
+            return self.pending[domain]
+        row = self.db.execute("SELECT label FROM seen WHERE domain = ?", (domain,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.db.close()
+        if self._owned:
+            try:
+                os.remove(self._owned)
+            except OSError:
+                pass
+
+
+# ---------- Sampling ----------
+
+class _Reservoir:
+    def __init__(self, size: int, rng: random.Random):
+        self.size = size
+        self.rng = rng
+        self.items: List[Tuple[str, int]] = []
+        self.seen = 0
+
+    def offer(self, item: Tuple[str, int]):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = self.rng.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+
+def reservoir_sample(
+    rows: Iterable[Tuple[str, int]],
+    n: int,
+    stratify: bool = True,
+    seed: Optional[int] = None,
+    normalize: Optional[Callable[[str], str]] = None,
+    capacity: int = 10_000_000,
+) -> Tuple[List[Tuple[str, int]], dict]:
+    """
+    One pass over (url, label) rows: normalizes, dedups and keeps a uniform
+    reservoir of `n` domains per class (or overall when not stratifying).
+    Memory is O(n) plus the fixed-size Bloom filter; the exact dedup table
+    lives on disk.
+
+    Returns (sample, stats). With stratify, the sample keeps the dataset's
+    class ratio. A domain whose label is raised by a later duplicate is
+    relabeled in the sample but stays in the reservoir it was drawn into.
+    """
+    rng = random.Random(seed)
+    dedup = DomainDeduper(capacity=capacity)
+    reservoirs = {0: _Reservoir(n, rng), 1: _Reservoir(n, rng)} if stratify else {None: _Reservoir(n, rng)}
+    stats = {"rows": 0, "skipped": 0, "unique": 0, "by_label": {0: 0, 1: 0}}
+    try:
+        for url, label in rows:
+            stats["rows"] += 1
+            domain = normalize(url) if normalize else url
+            if not domain:
+                stats["skipped"] += 1
+                continue
+            if not dedup.add(domain, label):
+                continue
+            stats["unique"] += 1
+            stats["by_label"][label] += 1
+            reservoirs[label if stratify else None].offer((domain, label))
+        stats["spill_checks"] = dedup.spill_checks
+        stats["bloom_bytes"] = dedup.bloom.nbytes
+
+        if stratify:
+            total = stats["unique"]
+            n1 = round(n * stats["by_label"][1] / total) if total else 0
+            n1 = min(n1, len(reservoirs[1].items))
+            n0 = min(n - n1, len(reservoirs[0].items))
+            sample = rng.sample(reservoirs[1].items, n1) + rng.sample(reservoirs[0].items, n0)
+            rng.shuffle(sample)
+        else:
+            sample = reservoirs[None].items
+        sample = [(d, dedup.label(d)) for d, _ in sample]
+    finally:
+        dedup.close()
+    return sample, stats
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Streaming dedup + reservoir sampling benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--unique", type=int, default=500_000)
+    parser.add_argument("--sample", type=int, default=1000)
+    args = parser.parse_args()
+
+    def synthetic():
+        r = random.Random(0)
+        for _ in range(args.rows):
+            i = r.randrange(args.unique)
+            yield f"site{i}.example", int(i % 10 == 0)
+
+    t0 = time.perf_counter()
+    sample, stats = reservoir_sample(synthetic(), args.sample, seed=0, capacity=args.unique)
+    dt = time.perf_counter() - t0
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        peak = 0.0
+    print(f"rows={stats['rows']} unique={stats['unique']} sample={len(sample)} "
+          f"time={dt:.1f}s ({stats['rows'] / dt:,.0f} rows/s) peak_rss={peak:.0f}MB "
+          f"bloom={stats['bloom_bytes'] / 1e6:.1f}MB spill_checks={stats['spill_checks']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,39 @@
 # test_detection_v2.py  — v2 CLI with v1-style batch evaluation
 # Cloud mode: concurrent; Local mode: sequential
 
+from __future__ import annotations
+
+import argparse
 import os
 import sys
 import csv
 import re
 import ipaddress
 import random
+import shutil
+import tempfile
 import contextlib
 import asyncio
 import inspect
+import itertools
 import json
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import List, Tuple, Optional, Dict, Any, Callable
+from typing import TYPE_CHECKING, List, Tuple, Optional, Dict, Any, Callable, Iterator
 
-# Local imports
+# Local imports (the analyser pulls in tldextract/numpy/whois/cryptography,
+# so it is imported when first needed to keep --help fast)
 from settings import config, get_llm_settings
-from domain_analyser import DomainAnalyser as _Analyser  # UPDATED
+from backends import build_backends
+from dataset_sampler import open_text, reservoir_sample
+
+if TYPE_CHECKING:
+    from domain_analyser import DomainAnalyser as _Analyser
+
+def _analyser_class():
+    from domain_analyser import DomainAnalyser  # UPDATED
+    return DomainAnalyser
 
 # ---------- Defaults (match v1) ----------
 DEFAULT_CSV = os.path.join(os.path.dirname(__file__), "cleaned.csv")
@@ -141,18 +157,31 @@ def normalize_to_domain(url_or_host: str) -> str:
             pass
     if ":" in host:
         host = host.split(":", 1)[0]
-    host = host.rstrip(".").lower()
-    if host.startswith("www."):
-        host = host[4:]
+    from domain_names import normalize
+    host = normalize(host).name
     if not re.fullmatch(r"[a-z0-9\-._~%]+", host):
         if not host or any(c.isspace() for c in host):
             return ""
     return host
 
-def load_dataset(csv_path: str) -> List[Tuple[str, int]]:
-    rows: List[Tuple[str, int]] = []
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        peek = f.read(4096); f.seek(0)
+def iter_dataset(csv_path: str) -> Iterator[Tuple[str, int]]:
+    """
+    Streams (url, label) rows from the CSV (plain, .gz or .zst) without
+    loading it whole.
+    """
+    with open_text(csv_path) as f:
+        # Whole lines only: re-chaining a partial one would split that row in two
+        head = []
+        while sum(map(len, head)) < 4096:
+            line = f.readline()
+            if not line:
+                break
+            head.append(line)
+        peek = "".join(head)
+        if f.seekable():
+            f.seek(0)
+        else:
+            f = itertools.chain(head, f)
         has_header = any(col in peek.lower() for col in URL_COLS | LABEL_COLS)
         if has_header:
             reader = csv.DictReader(f)
@@ -168,9 +197,9 @@ def load_dataset(csv_path: str) -> List[Tuple[str, int]]:
                     if lab is None:
                         u2, l2 = _split_url_and_label(url)
                         if l2 is not None:
-                            rows.append((u2, l2))
+                            yield u2, l2
                     else:
-                        rows.append((url, lab))
+                        yield url, lab
         else:
             reader = csv.reader(f)
             for row in reader:
@@ -179,41 +208,12 @@ def load_dataset(csv_path: str) -> List[Tuple[str, int]]:
                 if len(row) == 1:
                     u, l = _split_url_and_label(row[0])
                     if l is not None:
-                        rows.append((u, l))
+                        yield u, l
                 else:
                     u = (row[0] or "").strip()
                     l = _coerce_label(row[1])
                     if l is not None:
-                        rows.append((u, l))
-    if not rows:
-        raise ValueError("No labeled rows found in CSV.")
-    dedup: Dict[str, int] = {}
-    skipped = 0
-    for u, l in rows:
-        d = normalize_to_domain(u)
-        if not d:
-            skipped += 1
-            continue
-        dedup[d] = max(l, dedup.get(d, 0))
-    if skipped:
-        print(f"[INFO] Skipped {skipped} rows with invalid/empty domains after normalization.")
-    return list(dedup.items())
-
-def stratified_sample(items: List[Tuple[str, int]], n: int, seed: Optional[int]) -> List[Tuple[str, int]]:
-    if seed is not None:
-        random.seed(seed)
-    if n >= len(items):
-        return items[:]
-    by_label: Dict[int, List[Tuple[str, int]]] = {0: [], 1: []}
-    for d in items:
-        by_label[d[1]].append(d)
-    total = len(items)
-    n1 = round(n * len(by_label[1]) / total) if total else 0
-    n0 = n - n1
-    sample = random.sample(by_label[1], min(n1, len(by_label[1]))) + \
-             random.sample(by_label[0], min(n0, len(by_label[0])))
-    random.shuffle(sample)
-    return sample
+                        yield u, l
 
 def verdict_is_block(analysis: dict) -> bool:
     if not isinstance(analysis, dict):
@@ -254,7 +254,8 @@ def _report_and_write(
     false_positives: List[Tuple[str, str]],
     log_path: str,
     llm_responses_path: str,
-) -> None:
+    sources: Optional[List[Optional[str]]] = None,
+) -> Dict[str, Any]:
     # --- REPORT (v1 metrics) ---
     print("\n=== REPORT ===")
     tp = sum(1 for t, p in zip(y_true, y_pred) if t == 1 and p == 1)
@@ -268,6 +269,8 @@ def _report_and_write(
 
     print(f"TP={tp}  FP={fp}  TN={tn}  FN={fn}")
     print(f"Accuracy: {accuracy:.4f} | Precision: {precision:.4f} | Recall: {recall:.4f} | F1: {f1:.4f}")
+    if sources is not None:
+        _report_preclassifier(y_true, y_pred, sources)
     print(f"Per-domain logs:\n- {log_path}\n- {llm_responses_path}")
 
     base_dir = os.path.dirname(__file__)
@@ -284,196 +287,435 @@ def _report_and_write(
     print(f"Also wrote:\n- {fn_path}\n- {fp_path}")
     print("\nDone.\n")
 
-def _run_batch_sequential(
+    skipped = sum(1 for src in (sources or []) if src == "lexical")
+    return {
+        "n": len(y_true), "tp": tp, "fp": fp, "tn": tn, "fn": fn,
+        "accuracy": round(accuracy, 4), "precision": round(precision, 4),
+        "recall": round(recall, 4), "f1": round(f1, 4),
+        "skip_rate": round(skipped / len(y_true), 4) if y_true else 0.0,
+        "log": log_path,
+    }
+
+def _report_preclassifier(y_true: List[int], y_pred: List[int], sources: List[Optional[str]]) -> None:
+    """
+    Skip rate of the lexical pre-classifier and how its decisions compare
+    with the ones that went through the LLM.
+    """
+    total = len(y_true)
+    if not total:
+        return
+    skipped = [i for i, s in enumerate(sources) if s == "lexical"]
+    sent = [i for i, s in enumerate(sources) if s != "lexical"]
+    skip_wrong = sum(1 for i in skipped if y_true[i] != y_pred[i])
+    sent_right = sum(1 for i in sent if y_true[i] == y_pred[i])
+    skip_acc = (len(skipped) - skip_wrong) / len(skipped) if skipped else 0.0
+    sent_acc = sent_right / len(sent) if sent else 0.0
+
+    print(f"Pre-classifier: skipped {len(skipped)}/{total} LLM calls (skip rate {len(skipped) / total:.2%})")
+    print(f"  accuracy on skipped: {skip_acc:.4f} | accuracy on LLM band: {sent_acc:.4f}")
+    # Worst case: the LLM would have been right on every domain we skipped
+    print(f"  accuracy impact (upper bound): -{skip_wrong / total:.4f} ({skip_wrong} wrong skip decisions)")
+
+def _outcome(label: int, blocked: bool) -> str:
+    if label == 1:
+        return "TP" if blocked else "FN"
+    return "FP" if blocked else "TN"
+
+def _read_checkpoint(log_path: str) -> Tuple[Optional[dict], Dict[str, dict]]:
+    """
+    Reads a run log written by _run_batch: the run header (first line) and the
+    records of every domain already completed, including those still in
+    per-process part files. A torn last line is ignored.
+    """
+    header, done = None, {}
+    for path in [log_path] + _part_paths(log_path):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "run" in rec:
+                    header = header or rec["run"]
+                elif rec.get("domain"):
+                    done[rec["domain"]] = rec
+    return header, done
+
+def _part_paths(log_path: str) -> List[str]:
+    base = os.path.basename(log_path) + ".part"
+    folder = os.path.dirname(log_path) or "."
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, n) for n in os.listdir(folder) if n.startswith(base))
+
+def _merge_parts(log_path: str) -> None:
+    """
+    Appends every per-process part file to the main log and removes it.
+    """
+    with open(log_path, "a", encoding="utf-8") as out:
+        for part in _part_paths(log_path):
+            with open(part, encoding="utf-8") as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        out.write(line)
+            out.flush()
+            os.remove(part)
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(max(0, seconds))
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def _analyse_into_log(
     analyser: _Analyser,
-    sampled: List[Tuple[str, int]],
+    todo: List[Tuple[str, int]],
+    log_path: str,
+    llm_responses_path: str,
+    workers: int = 1,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, dict]:
+    """
+    Analyses `todo` with at most `workers` domains in flight. Each finished
+    domain is appended to the JSONL log and flushed right away (the
+    checkpoint used for resuming). Returns {domain: record}.
+    """
+    done: Dict[str, dict] = {}
+    log_f = open(log_path, "a", encoding="utf-8")
+    llm_f = open(llm_responses_path, "a", encoding="utf-8")
+
+    def analyse_one(domain: str) -> Tuple[dict, float]:
+        t0 = time.perf_counter()
+        try:
+            result = _syncify(analyser.analyse(domain))
+        except Exception as e:
+            result = {"verdict": "Error", "reason": str(e), "source": "exception"}
+        if not isinstance(result, dict):
+            result = {"verdict": str(result)}
+        return result, (time.perf_counter() - t0) * 1000.0
+
+    def record(domain: str, label: int, result: dict, dur_ms: float) -> dict:
+        blocked = verdict_is_block(result)
+        ev = result.get("evidence", {}) or {}
+        rec = {
+            "domain": domain,
+            "label": label,
+            "outcome": _outcome(label, blocked),
+            "blocked": blocked,
+            "latency_ms": round(dur_ms, 2),
+            "verdict": result.get("verdict"),
+            "score": result.get("score"),
+            "reason": str(result.get("reason") or ""),
+            "source": result.get("source"),
+            "lexical_score": ev.get("lexical_score"),
+            "llm_verdict": ev.get("llm_verdict"),
+            "recent_domain": ev.get("recent_domain"),
+            "san_verdict": ev.get("san_verdict"),
+        }
+        # Checkpoint: one complete line per domain, flushed before moving on
+        log_f.write(json.dumps(rec) + "\n")
+        log_f.flush()
+
+        # Human-readable per-domain log
+        llm_f.write(
+            f"Domain: {domain}\n"
+            f"Label: {label}\n"
+            f"Outcome: {rec['outcome']}\n"
+            f"Final verdict: {rec['verdict']}\n"
+            f"Score: {rec['score']}\n"
+            f"LLM verdict: {rec['llm_verdict']}\n"
+            f"Recent domain: {rec['recent_domain']}\n"
+            f"SAN verdict: {rec['san_verdict']}\n"
+            + "-" * 70 + "\n\n"
+        )
+        llm_f.flush()
+        return rec
+
+    workers = max(1, workers)
+    pending = set()
+    items = iter(todo)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Bounded queue: never more than `workers` domains submitted at once
+            while True:
+                while len(pending) < workers:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    fut = pool.submit(analyse_one, item[0])
+                    fut.item = item
+                    pending.add(fut)
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    domain, label = fut.item
+                    result, dur_ms = fut.result()
+                    done[domain] = record(domain, label, result, dur_ms)
+                if on_progress:
+                    on_progress(len(done))
+    finally:
+        for fut in pending:
+            fut.cancel()
+        log_f.close()
+        llm_f.close()
+    return done
+
+def _process_worker(
+    analyser_kwargs: dict,
+    backends_cfg: Optional[dict],
+    shard: List[Tuple[str, int]],
+    log_path: str,
+    llm_responses_path: str,
+    workers: int,
+    quiet: bool,
+) -> int:
+    """
+    Runs in a child process: builds its own DomainAnalyser (and WHOIS/TLS
+    providers) and writes its shard to its own part files.
+    """
+    backends = build_backends({k: v for k, v in (backends_cfg or {}).items() if k != "llm"})
+    with suppress_output(quiet):
+        analyser = _analyser_class()(**analyser_kwargs, whois_provider=backends["whois"], cert_provider=backends["cert"])
+        done = _analyse_into_log(analyser, shard, log_path, llm_responses_path, workers)
+    return len(done)
+
+def _run_sharded(
+    analyser_kwargs: dict,
+    backends_cfg: Optional[dict],
+    todo: List[Tuple[str, int]],
     quiet: bool,
     log_path: str,
     llm_responses_path: str,
-):
-    undetected: List[Tuple[str, str]] = []
-    false_positives: List[Tuple[str, str]] = []
-    y_true: List[int] = []
-    y_pred: List[int] = []
-    
-    with open(log_path, "w", encoding="utf-8") as log_f, open(llm_responses_path, "a", encoding="utf-8") as llm_f:
-        llm_f.write("=== Raw LLM Responses (from analyser result) ===\n\n")
-        for domain, label in sampled:
-            t0 = time.perf_counter()
-            try:
-                with suppress_output(quiet):
-                    result = _syncify(analyser.analyse(domain))
-            except Exception as e:
-                result = {"verdict": "Error", "reason": str(e), "source": "exception"}
-            dur_ms = (time.perf_counter() - t0) * 1000.0
-
-            blocked = verdict_is_block(result if isinstance(result, dict) else {})
-
-            if label == 1 and not blocked:
-                undetected.append((domain, str(result.get("reason") if isinstance(result, dict) else "")))
-            if label == 0 and blocked:
-                false_positives.append((domain, str(result.get("reason") if isinstance(result, dict) else "")))
-
-            y_true.append(label)
-            y_pred.append(1 if blocked else 0)
-
-            # JSONL log
-            if label == 1 and blocked:
-                outcome = "TP"
-            elif label == 0 and not blocked:
-                outcome = "TN"
-            elif label == 0 and blocked:
-                outcome = "FP"
-            else:
-                outcome = "FN"
-
-            json.dump({
-                "domain": domain,
-                "label": label,
-                "outcome": outcome,
-                "blocked": blocked,
-                "latency_ms": round(dur_ms, 2),
-                "verdict": result.get("verdict"),
-                "score": result.get("score"),
-                "llm_verdict": result.get("evidence", {}).get("llm_verdict"),
-                "recent_domain": result.get("evidence", {}).get("recent_domain"),
-                "san_verdict": result.get("evidence", {}).get("san_verdict"),
-            }, log_f)
-            log_f.write("\n")
-
-
-            # Human-readable per-domain log
-            ev = result.get("evidence", {})
-            llm_f.write(
-                f"Domain: {domain}\n"
-                f"Label: {label}\n"
-                f"Outcome: {outcome}\n"
-                f"Final verdict: {result.get('verdict')}\n"
-                f"Score: {result.get('score')}\n"
-                f"LLM verdict: {ev.get('llm_verdict')}\n"
-                f"Recent domain: {ev.get('recent_domain')}\n"
-                f"SAN verdict: {ev.get('san_verdict')}\n"
-                + "-" * 70 + "\n\n"
-            )
-
-    _report_and_write(y_true, y_pred, undetected, false_positives, log_path, llm_responses_path)
-
-async def _run_batch_concurrent_async(
-    analyser: _Analyser,
+    workers: int,
+    processes: int,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> None:
+    """
+    Shards `todo` round-robin across `processes` worker processes, each with
+    its own analyser and `workers` domains in flight, then merges their part
+    files into the main log. Progress is read from the part files.
+    """
+    # Resumed part files were already counted by _read_checkpoint; fold them in first
+    _merge_parts(log_path)
+    shards = [todo[i::processes] for i in range(processes)]
+    parts = [f"{log_path}.part{i}" for i in range(processes)]
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(_process_worker, analyser_kwargs, backends_cfg, shard, part,
+                            f"{llm_responses_path}.part{i}", workers, quiet)
+                for i, (shard, part) in enumerate(zip(shards, parts)) if shard
+            ]
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, timeout=2.0)
+                if on_progress:
+                    on_progress(sum(_count_lines(p) for p in parts))
+            for fut in futures:
+                fut.result()
+    finally:
+        _merge_parts(log_path)
+        _merge_text_parts(llm_responses_path)
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+def _merge_text_parts(path: str) -> None:
+    with open(path, "a", encoding="utf-8") as out:
+        for part in _part_paths(path):
+            with open(part, encoding="utf-8") as f:
+                shutil.copyfileobj(f, out)
+            os.remove(part)
+
+def _run_batch(
+    analyser: Optional[_Analyser],
     sampled: List[Tuple[str, int]],
     quiet: bool,
     log_path: str,
     llm_responses_path: str,
-    max_concurrency: int,
+    workers: int = 1,
+    run_info: Optional[dict] = None,
+    processes: int = 1,
+    analyser_kwargs: Optional[dict] = None,
+    backends_cfg: Optional[dict] = None,
 ):
     """
-    Concurrent version for cloud mode. Bounded by max_concurrency.
-    Works whether analyser.analyse is async or sync.
+    Evaluates `sampled` with at most `workers` analyses in flight (1 = the old
+    sequential local mode), or across `processes` worker processes built from
+    `analyser_kwargs`. Domains already in the log are counted but not
+    re-analysed, so an interrupted run resumes from the same log.
     """
-    sem = asyncio.Semaphore(max_concurrency)
-    lock = asyncio.Lock()  # protect file writes and shared lists
+    header, done = _read_checkpoint(log_path)
+    todo = [(d, l) for d, l in sampled if d not in done]
+    total = len(sampled)
+    resumed = total - len(todo)
+    if done:
+        print(f"[INFO] Resuming: {len(done)} domains already in {os.path.basename(log_path)}, {len(todo)} to go")
+
+    if header is None:
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"run": run_info or {}}) + "\n")
+    if not os.path.exists(llm_responses_path):
+        with open(llm_responses_path, "w", encoding="utf-8") as f:
+            f.write("=== Raw LLM Responses (from analyser result) ===\n\n")
+
+    # Progress goes to the real stdout even when the analyser is silenced
+    out = sys.stdout
+    t_start = time.perf_counter()
+    last_report = 0.0
+    completed = 0
+
+    def progress(n: int, final: bool = False):
+        nonlocal last_report, completed
+        completed = n
+        now = time.perf_counter()
+        if not final and now - last_report < 2.0:
+            return
+        last_report = now
+        elapsed = now - t_start
+        rate = completed / elapsed if elapsed > 0 else 0.0
+        eta = (len(todo) - completed) / rate if rate > 0 else 0.0
+        out.write(f"\r[PROGRESS] {resumed + completed}/{total} | {rate:.2f} domains/s | "
+                  f"elapsed {_format_eta(elapsed)} | ETA {_format_eta(eta)}   ")
+        if final:
+            out.write("\n")
+        out.flush()
+
+    try:
+        if processes > 1:
+            _run_sharded(analyser_kwargs or {}, backends_cfg, todo, quiet, log_path,
+                         llm_responses_path, workers, processes, progress)
+        else:
+            with suppress_output(quiet):
+                _analyse_into_log(analyser, todo, log_path, llm_responses_path, workers, progress)
+    finally:
+        progress(completed, final=True)
 
+    _, done = _read_checkpoint(log_path)
     undetected: List[Tuple[str, str]] = []
     false_positives: List[Tuple[str, str]] = []
     y_true: List[int] = []
     y_pred: List[int] = []
+    sources: List[Optional[str]] = []
+    for domain, label in sampled:
+        rec = done.get(domain)
+        if rec is None:
+            continue
+        blocked = bool(rec.get("blocked"))
+        if label == 1 and not blocked:
+            undetected.append((domain, rec.get("reason", "")))
+        if label == 0 and blocked:
+            false_positives.append((domain, rec.get("reason", "")))
+        y_true.append(label)
+        y_pred.append(1 if blocked else 0)
+        sources.append(rec.get("source"))
 
-    # Open files once; serialise writes via lock
-    log_f = open(log_path, "w", encoding="utf-8")
-    llm_f = open(llm_responses_path, "a", encoding="utf-8")
-    llm_f.write("=== Raw LLM Responses (from analyser result) ===\n\n")
+    return _report_and_write(y_true, y_pred, undetected, false_positives, log_path, llm_responses_path, sources)
 
-    async def run_one(domain: str, label: int):
-        nonlocal undetected, false_positives, y_true, y_pred
-        async with sem:
-            t0 = time.perf_counter()
-            try:
-                res_candidate = analyser.analyse(domain)
-                if inspect.iscoroutine(res_candidate):
-                    if quiet:
-                        with suppress_output(True):
-                            result = await res_candidate
-                    else:
-                        result = await res_candidate
-                else:
-                    result = await asyncio.to_thread(lambda: _syncify(res_candidate))
-            except Exception as e:
-                result = {"verdict": "Error", "reason": str(e), "source": "exception"}
-            dur_ms = (time.perf_counter() - t0) * 1000.0
-
-            blocked = verdict_is_block(result if isinstance(result, dict) else {})
-
-            async with lock:
-                if label == 1 and not blocked:
-                    undetected.append((domain, str(result.get("reason") if isinstance(result, dict) else "")))
-                if label == 0 and blocked:
-                    false_positives.append((domain, str(result.get("reason") if isinstance(result, dict) else "")))
-
-                y_true.append(label)
-                y_pred.append(1 if blocked else 0)
-
-                # JSONL log
-                json.dump({
-                    "domain": domain,
-                    "label": label,
-                    "blocked": blocked,
-                    "latency_ms": round(dur_ms, 2),
-                    "result": result
-                }, log_f)
-                log_f.write("\n")
-
-                # Human-readable per-domain log
-                llm_f.write(f"Domain: {domain}\nLabel: {label}\nBlocked: {blocked}\nLatency (ms): {dur_ms:.2f}\n")
-                llm_f.write("LLM/Analyser Result:\n")
-                llm_f.write(json.dumps(result, ensure_ascii=False, indent=2))
-                llm_f.write("\n" + "-" * 70 + "\n\n")
-
-    tasks = [asyncio.create_task(run_one(domain, label)) for domain, label in sampled]
-    await asyncio.gather(*tasks)
-
-    log_f.close()
-    llm_f.close()
-
-    _report_and_write(y_true, y_pred, undetected, false_positives, log_path, llm_responses_path)
-
-def _run_batch_v1_style(analyser: _Analyser, concurrent: bool, max_concurrency: int) -> None:
-    sample_size_str = _ask("Sample size", "100", lambda s: s.isdigit() and int(s) > 0)
-    stratify_str    = _ask("Stratify by class? (y/n)", "y", lambda s: s.lower() in {"y","n"}).lower()
-    quiet_str       = _ask("Quiet mode (suppress analyser output)? (y/n)", "y", lambda s: s.lower() in {"y","n"}).lower()
-
-    rows = load_dataset(DEFAULT_CSV)
-    sample_size = min(int(sample_size_str or "100"), len(rows))
-    stratify = stratify_str.startswith("y")
-    quiet = quiet_str.startswith("y")
-    sampled = stratified_sample(rows, sample_size, None) if stratify else random.sample(rows, sample_size)
-
-    run_ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+def _run_batch_v1_style(
+    analyser: _Analyser,
+    concurrent: bool,
+    max_concurrency: int,
+    processes: int = 1,
+    analyser_kwargs: Optional[dict] = None,
+    backends_cfg: Optional[dict] = None,
+) -> None:
     base_dir = os.path.dirname(__file__)
-    log_path = os.path.join(base_dir, f"analyses-{run_ts}.jsonl")
-    llm_responses_path = os.path.join(base_dir, f"llm_responses-{run_ts}.txt")
+    resume_path = _ask("Resume from a previous run log (path, blank for a new run)", "")
+    header = None
+    if resume_path:
+        header, _ = _read_checkpoint(resume_path)
+        if header is None:
+            print(f"[BATCH ERROR] {resume_path} has no run header, starting a new run")
+            resume_path = ""
+
+    if header:
+        sample_size, stratify, quiet, seed = header["sample_size"], header["stratify"], header["quiet"], header["seed"]
+        csv_path = header.get("csv") or DEFAULT_CSV
+        log_path = resume_path
+        llm_responses_path = header.get("llm_responses_path") or os.path.splitext(resume_path)[0] + ".txt"
+    else:
+        csv_path        = _ask("Dataset (CSV, .csv.gz or .csv.zst)", DEFAULT_CSV)
+        sample_size_str = _ask("Sample size", "100", lambda s: s.isdigit() and int(s) > 0)
+        stratify_str    = _ask("Stratify by class? (y/n)", "y", lambda s: s.lower() in {"y","n"}).lower()
+        quiet_str       = _ask("Quiet mode (suppress analyser output)? (y/n)", "y", lambda s: s.lower() in {"y","n"}).lower()
+        sample_size = int(sample_size_str or "100")
+        stratify = stratify_str.startswith("y")
+        quiet = quiet_str.startswith("y")
+        # Recorded in the log so a resumed run draws the same sample
+        seed = random.randrange(2**31)
+
+        run_ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+        log_path = os.path.join(base_dir, f"analyses-{run_ts}.jsonl")
+        llm_responses_path = os.path.join(base_dir, f"llm_responses-{run_ts}.txt")
 
-    print(f"\nLoaded {len(rows)} domains | Testing {len(sampled)} (stratify={stratify})")
-    if concurrent:
+    # One streaming pass: normalize, dedup and reservoir-sample per class
+    sampled, stats = reservoir_sample(iter_dataset(csv_path), sample_size, stratify=stratify,
+                                      seed=seed, normalize=normalize_to_domain)
+    if not stats["rows"]:
+        raise ValueError("No labeled rows found in CSV.")
+    if stats["skipped"]:
+        print(f"[INFO] Skipped {stats['skipped']} rows with invalid/empty domains after normalization.")
+
+    print(f"\nLoaded {stats['unique']} domains | Testing {len(sampled)} (stratify={stratify})")
+    if processes > 1:
+        print(f"Multi-process mode: {processes} processes x {max_concurrency if concurrent else 1} in flight...\n")
+    elif concurrent:
         print(f"Cloud mode: concurrent processing with up to {max_concurrency} in flight...\n")
-        asyncio.run(_run_batch_concurrent_async(
-            analyser=analyser,
-            sampled=sampled,
-            quiet=quiet,
-            log_path=log_path,
-            llm_responses_path=llm_responses_path,
-            max_concurrency=max_concurrency,
-        ))
     else:
         print("Local mode: sequential processing, waiting for each LLM reply...\n")
-        _run_batch_sequential(
-            analyser=analyser,
-            sampled=sampled,
-            quiet=quiet,
-            log_path=log_path,
-            llm_responses_path=llm_responses_path,
-        )
+    _run_batch(
+        analyser=analyser,
+        sampled=sampled,
+        quiet=quiet,
+        log_path=log_path,
+        llm_responses_path=llm_responses_path,
+        workers=max_concurrency if concurrent else 1,
+        run_info={"sample_size": sample_size, "stratify": stratify, "quiet": quiet, "seed": seed,
+                  "csv": csv_path, "llm_responses_path": llm_responses_path},
+        processes=processes,
+        analyser_kwargs=analyser_kwargs,
+        backends_cfg=backends_cfg,
+    )
+
+def _bench_scaling(
+    analyser_kwargs: dict,
+    backends_cfg: Optional[dict],
+    max_processes: int,
+    workers: int,
+) -> None:
+    """
+    Runs the same sample with 1, 2, ... `max_processes` worker processes
+    and prints throughput and speedup for each.
+    """
+    csv_path = _ask("Dataset (CSV, .csv.gz or .csv.zst)", DEFAULT_CSV)
+    sample_size = int(_ask("Sample size", "500", _is_pos_int))
+    sampled, _ = reservoir_sample(iter_dataset(csv_path), sample_size, seed=0, normalize=normalize_to_domain)
+    print(f"\nScaling benchmark: {len(sampled)} domains, {workers} in flight per process "
+          f"(os.cpu_count()={os.cpu_count()})\n")
+
+    base_rate = None
+    print(f"{'processes':>9} {'seconds':>9} {'domains/s':>10} {'speedup':>8}")
+    for n in range(1, max_processes + 1):
+        tmp = tempfile.mkdtemp(prefix="scaling-")
+        log_path = os.path.join(tmp, "analyses.jsonl")
+        t0 = time.perf_counter()
+        _run_sharded(analyser_kwargs, backends_cfg, sampled, True, log_path,
+                     os.path.join(tmp, "llm_responses.txt"), workers, n)
+        dt = time.perf_counter() - t0
+        shutil.rmtree(tmp, ignore_errors=True)
+        rate = len(sampled) / dt if dt > 0 else 0.0
+        base_rate = base_rate or rate
+        print(f"{n:>9} {dt:>9.2f} {rate:>10.1f} {rate / base_rate:>7.2f}x")
+
+def _interactive(args: argparse.Namespace) -> int:
+    processes = max(1, args.processes)
 
-def main():
     print("=" * 72)
     print(" Domain Evaluator — V2 CLI (V1-style batch; cloud=concurrent)")
     print("=" * 72)
@@ -489,6 +731,12 @@ def main():
     api_url = llm_info["api_url"]
     api_key_env = llm_info["api_key_env"]
 
+    # Offline stand-ins selected under "backends" in config.json
+    backends = build_backends(config.get("backends"))
+    if backends["llm_url"]:
+        api_url = backends["llm_url"]
+        print(f"[INFO] Using mock LLM backend at {api_url}")
+
     api_key = os.environ.get(api_key_env)
     if (("openai.com" in api_url) or (".azure.com" in api_url)) and not api_key:
         try:
@@ -513,10 +761,15 @@ def main():
     threshold_str = _ask("Block threshold (int)", "1", _is_int)
     threshold = int(threshold_str)
 
+    precls_str = _ask("Use lexical pre-classifier to skip obvious domains? (y/n)", "y",
+                      lambda s: s.lower() in {"y","n"}).lower()
+    use_preclassifier = precls_str.startswith("y")
+
     mode_choice = _ask("Run mode (single/batch)", "batch", lambda s: s.lower() in {"single","batch"}).lower()
 
-    # UPDATED: build DomainAnalyser, disable list persistence, but keep your logging toggles
-    analyser = _Analyser(
+    # UPDATED: build DomainAnalyser, disable list persistence, but keep your logging toggles.
+    # Worker processes (--processes) rebuild their own analyser from the same kwargs.
+    analyser_kwargs = dict(
         model=model,
         api_url=api_url,
         block_score=threshold,
@@ -526,7 +779,9 @@ def main():
         log_dir=log_dir,
         api_key=api_key,
         timeout=60.0,
+        use_preclassifier=use_preclassifier,
     )
+    analyser = _analyser_class()(**analyser_kwargs, whois_provider=backends["whois"], cert_provider=backends["cert"])
 
     is_cloud = (mode.lower() == "cloud")
     max_conc = 8
@@ -534,14 +789,258 @@ def main():
         mc_str = _ask("Max concurrency for cloud mode", str(max_conc), _is_pos_int)
         max_conc = int(mc_str)
 
-    if mode_choice == "single":
+    if args.bench_scaling:
+        _bench_scaling(analyser_kwargs, config.get("backends"), processes, max_conc if is_cloud else 1)
+    elif mode_choice == "single":
         _run_single(analyser)
     else:
-        _run_batch_v1_style(analyser, concurrent=is_cloud, max_concurrency=max_conc)
+        _run_batch_v1_style(analyser, concurrent=is_cloud, max_concurrency=max_conc,
+                            processes=processes, analyser_kwargs=analyser_kwargs,
+                            backends_cfg=config.get("backends"))
+    return 0
+
+# ------------------------------ Scripted CLI ------------------------------
+METRIC_CHECKS = {
+    # option -> (metric, "min"|"max")
+    "min_accuracy": ("accuracy", "min"),
+    "min_precision": ("precision", "min"),
+    "min_recall": ("recall", "min"),
+    "min_f1": ("f1", "min"),
+    "min_qps": ("qps", "min"),
+    "max_p95_ms": ("p95_ms", "max"),
+    "max_p99_ms": ("p99_ms", "max"),
+    "max_timeouts": ("timeouts", "max"),
+}
+
+def _check_thresholds(args: argparse.Namespace, metrics: Dict[str, Any]) -> List[str]:
+    failures = []
+    for opt, (metric, kind) in METRIC_CHECKS.items():
+        limit = getattr(args, opt, None)
+        if limit is None or metric not in metrics:
+            continue
+        value = metrics[metric]
+        if (kind == "min" and value < limit) or (kind == "max" and value > limit):
+            failures.append(f"{metric}={value} ({'<' if kind == 'min' else '>'} {limit})")
+    return failures
+
+def _emit(args: argparse.Namespace, rows: List[Dict[str, Any]]) -> None:
+    """
+    Writes results as JSON (one object, or a list) or CSV to --output / stdout.
+    """
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            fields: List[str] = []
+            for row in rows:
+                fields += [k for k in row if k not in fields]
+            writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in row.items()})
+        else:
+            json.dump(rows[0] if len(rows) == 1 else rows, out, indent=2, default=str)
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def _finish(args: argparse.Namespace, rows: List[Dict[str, Any]], metrics: Dict[str, Any]) -> int:
+    _emit(args, rows)
+    failures = _check_thresholds(args, metrics)
+    for f in failures:
+        print(f"[THRESHOLD FAILED] {f}", file=sys.stderr)
+    return 1 if failures else 0
+
+def _scripted_analyser_kwargs(args: argparse.Namespace) -> Tuple[dict, dict]:
+    llm_info = get_llm_settings(profile_choice=args.profile)
+    api_url = args.api_url or llm_info["api_url"]
+    backends = build_backends(config.get("backends"))
+    if backends["llm_url"]:
+        api_url = backends["llm_url"]
+    kwargs = dict(
+        model=args.model or llm_info["model"],
+        api_url=api_url,
+        block_score=args.threshold,
+        use_blacklists=False,
+        enable_logging=args.http_logging,
+        enable_reasoning_log=args.reasoning_log,
+        log_dir=args.log_dir,
+        api_key=os.environ.get(llm_info["api_key_env"]),
+        timeout=args.timeout,
+        use_preclassifier=not args.no_preclassifier,
+    )
+    os.makedirs(args.log_dir, exist_ok=True)
+    return kwargs, backends
+
+def _cmd_analyse(args: argparse.Namespace) -> int:
+    kwargs, backends = _scripted_analyser_kwargs(args)
+    with contextlib.redirect_stdout(sys.stderr):
+        analyser = _analyser_class()(**kwargs, whois_provider=backends["whois"], cert_provider=backends["cert"])
+    rows = []
+    for domain in args.domains:
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr):
+            result = _syncify(analyser.analyse(domain))
+        rows.append({"domain": domain, "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+                     "blocked": verdict_is_block(result), **result})
+    blocked = sum(1 for r in rows if r["blocked"])
+    code = _finish(args, rows, {})
+    # Exit 3 when --fail-on-block is set and anything was blocked (for shell checks)
+    return 3 if (args.fail_on_block and blocked and code == 0) else code
+
+def _cmd_eval(args: argparse.Namespace) -> int:
+    kwargs, backends = _scripted_analyser_kwargs(args)
+    base_dir = os.path.dirname(__file__)
+    header = _read_checkpoint(args.resume)[0] if args.resume else None
+    if args.resume and header is None:
+        print(f"[BATCH ERROR] {args.resume} has no run header", file=sys.stderr)
+        return 2
+    if header:
+        dataset, sample_size, stratify, seed = header.get("csv") or args.dataset, header["sample_size"], header["stratify"], header["seed"]
+        log_path = args.resume
+        llm_responses_path = header.get("llm_responses_path") or os.path.splitext(args.resume)[0] + ".txt"
+    else:
+        dataset, sample_size, stratify = args.dataset, args.sample_size, not args.no_stratify
+        seed = args.seed if args.seed is not None else random.randrange(2**31)
+        run_ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+        log_path = os.path.join(base_dir, f"analyses-{run_ts}.jsonl")
+        llm_responses_path = os.path.join(base_dir, f"llm_responses-{run_ts}.txt")
+
+    t0 = time.perf_counter()
+    # Human-readable report goes to stderr; stdout carries only the result
+    with contextlib.redirect_stdout(sys.stderr):
+        sampled, stats = reservoir_sample(iter_dataset(dataset), sample_size, stratify=stratify,
+                                          seed=seed, normalize=normalize_to_domain)
+        analyser = None
+        if args.processes <= 1:
+            with suppress_output(not args.verbose):
+                analyser = _analyser_class()(**kwargs, whois_provider=backends["whois"], cert_provider=backends["cert"])
+        metrics = _run_batch(
+            analyser=analyser,
+            sampled=sampled,
+            quiet=not args.verbose,
+            log_path=log_path,
+            llm_responses_path=llm_responses_path,
+            workers=args.concurrency,
+            run_info={"sample_size": sample_size, "stratify": stratify, "quiet": not args.verbose,
+                      "seed": seed, "csv": dataset, "llm_responses_path": llm_responses_path},
+            processes=max(1, args.processes),
+            analyser_kwargs=kwargs,
+            backends_cfg=config.get("backends"),
+        )
+    metrics.update({"dataset": dataset, "unique_domains": stats["unique"], "seed": seed,
+                    "wall_s": round(time.perf_counter() - t0, 2)})
+    return _finish(args, [metrics], metrics)
+
+def _cmd_loadtest(args: argparse.Namespace, extra: List[str]) -> int:
+    import replay_bench
+    bench_args = replay_bench.build_parser(prog="demo_cli.py loadtest").parse_args(extra)
+    with contextlib.redirect_stdout(sys.stderr):
+        report = replay_bench.run(bench_args)
+    if bench_args.out:
+        with open(bench_args.out, "a") as f:
+            f.write(json.dumps(report) + "\n")
+    lat = report["latency_ms"]
+    metrics = {"qps": report["qps"], "p95_ms": lat.get("p95", 0.0), "p99_ms": lat.get("p99", 0.0),
+               "timeouts": report["rcodes"].get("timeout", 0)}
+    row = report if args.format == "json" else {**report["config"], **metrics,
+                                                 "cpu_pct": report["resolver"]["cpu_pct"],
+                                                 "rss_mb": report["resolver"]["rss_mb"]}
+    return _finish(args, [row], metrics)
+
+def _cmd_compile_lists(args: argparse.Namespace) -> int:
+    from blacklist_updater import FEEDS_DIR, feed_sources, has_snapshots, update_all
+    from feed_scheduler import _feed_entries
+
+    urls = [url for url, _ in _feed_entries(config.get("blacklist_urls", []), 0)]
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        # Without --fetch the snapshots on disk are always recompiled
+        info = update_all(urls, fetch=args.fetch, force=args.force or not args.fetch)
+    if info is None and not has_snapshots(FEEDS_DIR, feed_sources(urls)):
+        print("[LISTS ERROR] No configured feed or local source has a snapshot; nothing published.",
+              file=sys.stderr)
+        return 1
+    row = {"changed": info is not None, "feeds": len(urls),
+           "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1), **(info or {})}
+    if args.format == "csv":
+        row.pop("sources", None)
+    return _finish(args, [row], {})
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Domain evaluator CLI. Without a command it runs the interactive prompts.")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="interactive batch mode: shard domains across N worker processes")
+    parser.add_argument("--bench-scaling", action="store_true",
+                        help="benchmark batch throughput from 1 to --processes processes")
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--format", choices=["json", "csv"], default="json")
+    output.add_argument("-o", "--output", default=None, help="write results here instead of stdout")
+
+    analyser = argparse.ArgumentParser(add_help=False)
+    analyser.add_argument("--profile", default=None, help="LLM profile from config.json")
+    analyser.add_argument("--model", default=None)
+    analyser.add_argument("--api-url", default=None)
+    analyser.add_argument("--threshold", type=int, default=1, help="block score threshold")
+    analyser.add_argument("--timeout", type=float, default=60.0)
+    analyser.add_argument("--no-preclassifier", action="store_true")
+    analyser.add_argument("--log-dir", default=DEFAULT_LOG_DIR)
+    analyser.add_argument("--http-logging", action="store_true", default=DEFAULT_ENABLE_LOGGING)
+    analyser.add_argument("--reasoning-log", action="store_true", default=DEFAULT_ENABLE_REASONING)
+
+    metrics = argparse.ArgumentParser(add_help=False)
+    for opt in ("accuracy", "precision", "recall", "f1"):
+        metrics.add_argument(f"--min-{opt}", type=float, default=None, help=f"exit 1 if {opt} is lower")
+
+    sub = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    p = sub.add_parser("analyse", parents=[analyser, output], help="analyse one or more domains")
+    p.add_argument("domains", nargs="+")
+    p.add_argument("--fail-on-block", action="store_true", help="exit 3 if any domain is blocked")
+
+    p = sub.add_parser("eval", parents=[analyser, output, metrics], help="batch evaluation on a labeled dataset")
+    p.add_argument("--dataset", default=DEFAULT_CSV, help="CSV, .csv.gz or .csv.zst")
+    p.add_argument("--sample-size", type=int, default=100)
+    p.add_argument("--no-stratify", action="store_true")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--concurrency", type=int, default=1, help="analyses in flight (per process)")
+    p.add_argument("--processes", type=int, default=1)
+    p.add_argument("--resume", default=None, help="continue the run recorded in this analyses-*.jsonl")
+    p.add_argument("--verbose", action="store_true", help="show analyser output")
+
+    p = sub.add_parser("loadtest", parents=[output], allow_abbrev=False,
+                       help="resolver replay benchmark (other options go to replay_bench.py)")
+    p.add_argument("--min-qps", type=float, default=None)
+    p.add_argument("--max-p95-ms", type=float, default=None)
+    p.add_argument("--max-p99-ms", type=float, default=None)
+    p.add_argument("--max-timeouts", type=int, default=None)
+
+    p = sub.add_parser("compile-lists", parents=[output], help="compile the feed blacklist")
+    p.add_argument("--fetch", action="store_true", help="refresh every configured feed first")
+    p.add_argument("--force", action="store_true", help="recompile even if nothing changed")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = _build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != "loadtest":
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    if args.command == "analyse":
+        return _cmd_analyse(args)
+    if args.command == "eval":
+        return _cmd_eval(args)
+    if args.command == "loadtest":
+        return _cmd_loadtest(args, extra)
+    if args.command == "compile-lists":
+        return _cmd_compile_lists(args)
+    return _interactive(args)
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
         print("\nInterrupted.")
         sys.exit(130)
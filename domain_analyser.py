@@ -2,8 +2,13 @@ import os
 import time
 from typing import Optional
 from llm_client import LLMClient
-from simple_verifier import get_domain_creation_date, is_recent_domain, get_san
+from domain_names import normalize
+from preclassifier import LexicalPreClassifier
+from typosquat_index import TyposquatIndex
+from simple_verifier import is_recent_domain
+from backends import LiveWhoisProvider, LiveCertProvider
 from lists import WHITELIST_AUTO, BLACKLIST_AUTO
+from tracing import add_span
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
@@ -35,6 +40,12 @@ class DomainAnalyser:
         enable_reasoning_log: bool = False,
         log_dir: Optional[str] = None,
         api_key: Optional[str] = None,
+        use_preclassifier: bool = True,
+        preclassifier: Optional[LexicalPreClassifier] = None,
+        use_typosquat_index: bool = True,
+        typosquat_index: Optional[TyposquatIndex] = None,
+        whois_provider=None,
+        cert_provider=None,
     ):
         self.llm = LLMClient(
             model=model,
@@ -47,21 +58,59 @@ class DomainAnalyser:
         )
         self.block_score = block_score
         self.use_blacklists = use_blacklists
+        if preclassifier is None and use_preclassifier:
+            preclassifier = LexicalPreClassifier.from_settings()
+        self.preclassifier = preclassifier
+        if typosquat_index is None and use_typosquat_index:
+            typosquat_index = TyposquatIndex.from_settings()
+        self.typosquat_index = typosquat_index
+        # Pluggable so benchmarks can run against fixtures (see backends.py)
+        self.whois = whois_provider or LiveWhoisProvider()
+        self.certs = cert_provider or LiveCertProvider()
+
+    def reconfigure(self, *, block_score: Optional[int] = None, model: Optional[str] = None,
+                    api_url: Optional[str] = None, stream: Optional[bool] = None,
+                    max_tokens: Optional[dict] = None, structured_output: Optional[str] = None,
+                    structured_max_tokens: Optional[dict] = None, llm_cfg: Optional[dict] = None):
+        """
+        Applies a live config change; analyses already running keep the
+        values they started with.
+        """
+        if block_score is not None:
+            self.block_score = block_score
+        if model is not None or api_url is not None:
+            self.llm.reconfigure(model or self.llm.model, api_url or self.llm.api_url)
+        if stream is not None:
+            self.llm.stream = stream
+        if max_tokens is not None:
+            self.llm.max_tokens = max_tokens
+        if structured_output is not None:
+            self.llm.structured_output = structured_output
+        if structured_max_tokens is not None:
+            self.llm.structured_max_tokens = structured_max_tokens
+        if llm_cfg is not None:
+            self.llm.set_routing(llm_cfg)
 
     def analyse(self, domain: str) -> dict:
         t_start = time.perf_counter()
 
-        domain = (domain or "").lower().strip()
+        name = normalize(domain)
+        domain = name.name
         score = 0
 
         evidence = {
+            "mimics": None,
+            "lexical_score": None,
             "llm_verdict": None,
             "recent_domain": None,
             "san_verdict": None,
         }
 
         timing = {
+            "typosquat_ms": 0.0,
+            "lexical_ms": 0.0,
             "llm_ms": 0.0,
+            "llm_ttv_ms": 0.0,
             "whois_ms": 0.0,
             "san_ms": 0.0,
             "total_ms": 0.0,
@@ -79,13 +128,53 @@ class DomainAnalyser:
                 "timing_ms": timing,
             }
 
+        # ---------- Typosquat index ----------
+        # A hit skips the lexical stage but not the LLM: permutations of short
+        # brands are often real sites (live.com -> life.com, olive.com), so the
+        # phishing check still gets the last word
+        impersonation = False
+        if self.typosquat_index is not None:
+            t0 = time.perf_counter()
+            mimics = self.typosquat_index.lookup(domain)
+            if mimics is None and name.registrable != domain:
+                mimics = self.typosquat_index.lookup(name.registrable)
+            timing["typosquat_ms"] = (time.perf_counter() - t0) * 1000
+            add_span("typosquat", t0)
+            if mimics:
+                evidence["mimics"] = mimics
+                impersonation = True
+                score += 3
+
+        # ---------- Lexical pre-classifier ----------
+        if self.preclassifier is not None and not impersonation:
+            t0 = time.perf_counter()
+            lexical = self.preclassifier.classify(domain)
+            timing["lexical_ms"] = (time.perf_counter() - t0) * 1000
+            add_span("lexical", t0)
+            evidence["lexical_score"] = lexical["score"]
+
+            if lexical["verdict"] is not None:
+                verdict = lexical["verdict"]
+                timing["total_ms"] = (time.perf_counter() - t_start) * 1000
+                return {
+                    "verdict": verdict,
+                    "score": self.block_score if verdict == "block" else 0,
+                    "source": "lexical",
+                    "evidence": evidence,
+                    "timing_ms": timing,
+                }
+
         # ---------- LLM phishing ----------
         t0 = time.perf_counter()
         llm = self.llm.phishing_check(domain)
         timing["llm_ms"] = (time.perf_counter() - t0) * 1000
+        add_span("llm", t0)
+        # Time until the verdict was parsed; less than llm_ms when streaming stops early
+        timing["llm_ttv_ms"] = (llm.get("timing_ms") or {}).get("ttv_ms") or timing["llm_ms"]
 
         llm_verdict = llm.get("verdict", "")
         evidence["llm_verdict"] = llm_verdict
+        evidence["mimics"] = llm.get("mimics") or evidence["mimics"]
 
         if llm_verdict in {"Malicious", "Likely Phishing"}:
             score += 3
@@ -101,18 +190,19 @@ class DomainAnalyser:
         # ---------- WHOIS ----------
         t0 = time.perf_counter()
         try:
-            created = get_domain_creation_date(domain)
+            created = self.whois.creation_date(name.registrable)
             recent = bool(created and is_recent_domain(created, 30))
             evidence["recent_domain"] = recent
             if recent:
                 score += 3
         finally:
             timing["whois_ms"] = (time.perf_counter() - t0) * 1000
+            add_span("whois", t0)
 
         # ---------- SAN ----------
         t0 = time.perf_counter()
         try:
-            sans = get_san(domain) or []
+            sans = self.certs.get_san(domain) or []
             san = self.llm.san_check(domain, sans)
             san_verdict = san.get("verdict")
             evidence["san_verdict"] = san_verdict
@@ -120,6 +210,7 @@ class DomainAnalyser:
                 score += 1
         finally:
             timing["san_ms"] = (time.perf_counter() - t0) * 1000
+            add_span("san", t0)
 
         verdict = "block" if score >= self.block_score else "allow"
 
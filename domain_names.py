@@ -0,0 +1,63 @@
+# domain_names.py
+
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+import tldextract
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BASE_DIR, "config")
+
+# Optional local PSL override; without it tldextract's bundled snapshot is
+# used. Either way nothing is ever fetched from the network.
+PSL_FILE = os.path.join(CONFIG_DIR, "public_suffix_list.dat")
+
+_extract = tldextract.TLDExtract(
+    suffix_list_urls=(f"file://{PSL_FILE}",) if os.path.exists(PSL_FILE) else (),
+    cache_dir=None,
+    fallback_to_snapshot=True,
+)
+
+
+class DomainName(NamedTuple):
+    name: str          # full name: lowercased, no trailing dot, leading "www." dropped
+    registrable: str   # example.co.uk
+    suffix: str        # co.uk ("" for names outside the PSL, e.g. router.lan)
+
+
+@lru_cache(maxsize=65536)
+def normalize(qname: str) -> DomainName:
+    """
+    Canonical keys for a queried name. Every list and cache lookup
+    should go through this so that the same site always hits the
+    same entry.
+    """
+    name = (qname or "").strip().rstrip(".").lower()
+    if not name:
+        return DomainName("", "", "")
+
+    ext = _extract(name)
+    if ext.subdomain == "www" or ext.subdomain.startswith("www."):
+        name = name[4:]
+
+    if ext.domain and ext.suffix:
+        registrable = f"{ext.domain}.{ext.suffix}"
+    else:
+        # IPs, single-label and private names: fall back to the last two labels
+        registrable = name if ext.domain == name else ".".join(name.split(".")[-2:])
+    return DomainName(name, registrable, ext.suffix)
+
+
+@lru_cache(maxsize=65536)
+def on_shared_host(qname: str) -> bool:
+    """
+    True when the name sits under a suffix from the PSL's private section
+    (cloudfront.net, github.io, blogspot.com, ...), where anyone can get
+    a subdomain, so the parent's reputation says nothing about it.
+    """
+    name = (qname or "").strip().rstrip(".").lower()
+    if not name:
+        return False
+    ext = _extract(name, include_psl_private_domains=True)
+    return ext.is_private and bool(ext.domain)  # the suffix itself is the host's own name
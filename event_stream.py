@@ -0,0 +1,154 @@
+# event_stream.py
+
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+
+class EventStream:
+    """
+    Ring buffer of the resolver's recent decisions for live dashboard views.
+
+    publish() is one deque append under an uncontended lock, whatever the
+    number of viewers: readers poll for sequence numbers past their cursor
+    instead of being woken per event. A viewer that falls more than
+    `capacity` events behind loses the oldest ones, and one with more than
+    `max_batch` events pending skips ahead; both are reported to it as
+    dropped counts instead of slowing anyone else down.
+    """
+
+    def __init__(self, capacity=2000, max_batch=200, max_viewers=20, poll_s=0.25, heartbeat_s=15.0):
+        self.capacity = int(capacity)
+        self.max_batch = int(max_batch)
+        self.max_viewers = int(max_viewers)
+        self.poll_s = poll_s
+        self.heartbeat_s = heartbeat_s
+        self.ring = deque(maxlen=self.capacity)  # (seq, event)
+        self.seq = itertools.count(1)
+        self.last_seq = 0
+        self.lock = threading.Lock()
+        self.viewers = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "EventStream":
+        return cls(
+            capacity=cfg.get("capacity", 2000),
+            max_batch=cfg.get("max_batch", 200),
+            max_viewers=cfg.get("max_viewers", 20),
+        )
+
+    @classmethod
+    def from_settings(cls) -> Optional["EventStream"]:
+        """
+        Builds the stream from config.json, or None when disabled there.
+        """
+        from settings import config
+        cfg = config.get("event_stream", {})
+        if not cfg.get("enabled", True):
+            return None
+        return cls.from_config(cfg)
+
+    # ---------- Publishing ----------
+
+    def publish(self, qname: str, verdict: str, client=None):
+        """
+        `verdict` is the log form, e.g. "block (user blacklist)".
+        """
+        action, _, reason = verdict.partition(" ")
+        event = {"ts": time.time(), "qname": qname, "client": client,
+                 "verdict": action, "reason": reason.strip("()")}
+        with self.lock:
+            seq = next(self.seq)
+            event["seq"] = seq
+            self.ring.append((seq, event))
+            self.last_seq = seq
+
+    # ---------- Reading ----------
+
+    def since(self, cursor: int, limit: Optional[int] = None):
+        """
+        Up to `limit` of the newest events after `cursor`, oldest first, and
+        how many events after it are skipped (overwritten or over the limit).
+        """
+        limit = self.capacity if limit is None else limit
+        with self.lock:
+            if self.last_seq <= cursor:
+                return [], 0
+            events = []
+            for seq, event in reversed(self.ring):
+                if seq <= cursor or len(events) >= limit:
+                    break
+                events.append(event)
+            last = self.last_seq
+        events.reverse()
+        lost = (last - cursor) - len(events)
+        return events, lost
+
+    @staticmethod
+    def matches(event: dict, verdict=None, client=None, q=None) -> bool:
+        if verdict and event["verdict"] != verdict:
+            return False
+        if client and event["client"] != client:
+            return False
+        if q and q not in event["qname"]:
+            return False
+        return True
+
+    def acquire_viewer(self) -> bool:
+        with self.lock:
+            if self.viewers >= self.max_viewers:
+                return False
+            self.viewers += 1
+            return True
+
+    def release_viewer(self):
+        with self.lock:
+            self.viewers -= 1
+
+    def sse(self, verdict=None, client=None, q=None, last_id: Optional[int] = None) -> Iterator[str]:
+        """
+        Server-sent-events body: filtered decisions from `last_id` on (or
+        from now), heartbeats, and "dropped" events when the viewer lagged.
+        Pair with acquire_viewer() / release_viewer() around the response.
+        """
+        # Unknown or future ids (the server restarted) start from now
+        cursor = self.last_seq if last_id is None or last_id > self.last_seq else last_id
+        yield "retry: 2000\n\n"
+        quiet_since = time.monotonic()
+        while True:
+            events, lost = self.since(cursor, self.max_batch)
+            if events:
+                cursor = events[-1]["seq"]
+            if lost:
+                yield f"event: dropped\ndata: {json.dumps({'count': lost})}\n\n"
+            sent = False
+            for event in events:
+                if self.matches(event, verdict, client, q):
+                    yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+                    sent = True
+            now = time.monotonic()
+            if sent or lost:
+                quiet_since = now
+            elif now - quiet_since >= self.heartbeat_s:
+                # Lets the server notice closed connections while filters match nothing
+                yield f"id: {cursor}\n: ping\n\n"
+                quiet_since = now
+            time.sleep(self.poll_s)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_stream() -> Optional[EventStream]:
+    """
+    The process-wide stream the resolver publishes to and the dashboard reads.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = EventStream.from_settings() or False
+        return _shared or None
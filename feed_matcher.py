@@ -0,0 +1,88 @@
+# feed_matcher.py
+
+import os
+
+from blacklist_updater import BLACKLIST_FILE, _read_lines
+
+HOSTS_PREFIXES = ("0.0.0.0 ", "127.0.0.1 ", ":: ", "::1 ")
+# Rule modifiers that still mean "block this domain" for a DNS filter
+DNS_MODIFIERS = {"", "important", "all"}
+
+
+def _parse(rule):
+    """
+    Returns (kind, domain, exception) for rules a DNS resolver can apply,
+    or None. `kind` is "suffix" (the domain and everything under it) or
+    "exact".
+    """
+    rule = rule.strip()
+    exception = rule.startswith("@@")
+    if exception:
+        rule = rule[2:]
+
+    if rule.startswith("||"):
+        body, _, mods = rule[2:].partition("$")
+        if mods.lower() not in DNS_MODIFIERS:
+            return None
+        body = body.rstrip("^").rstrip("|")
+        kind = "suffix"
+    elif rule.startswith(HOSTS_PREFIXES):
+        body = rule.split()[1] if len(rule.split()) > 1 else ""
+        kind = "exact"
+    else:
+        body = rule
+        kind = "exact"
+
+    body = body.split("#", 1)[0].strip().rstrip(".").lower()
+    # Regex, wildcard and path rules aren't expressible as a DNS lookup
+    if not body or any(c in body for c in "/*?|^ ") or "." not in body:
+        return None
+    return kind, body, exception
+
+
+class RuleMatcher:
+    """
+    In-memory matcher for the compiled feed blacklist. Built once per
+    published list version and swapped into the resolver as a whole.
+    """
+
+    def __init__(self, rules=(), version=None):
+        self.version = version
+        self.block_suffix = set()
+        self.block_exact = set()
+        self.allow_suffix = set()
+        self.allow_exact = set()
+        for rule in rules:
+            parsed = _parse(rule)
+            if parsed is None:
+                continue
+            kind, domain, exception = parsed
+            if exception:
+                (self.allow_suffix if kind == "suffix" else self.allow_exact).add(domain)
+            else:
+                (self.block_suffix if kind == "suffix" else self.block_exact).add(domain)
+
+    @classmethod
+    def from_file(cls, path=BLACKLIST_FILE, version=None):
+        if not os.path.exists(path):
+            return cls(version=version)
+        return cls(_read_lines(path), version=version)
+
+    def __len__(self):
+        return len(self.block_suffix) + len(self.block_exact)
+
+    @staticmethod
+    def _hit(name, exact, suffix):
+        if name in exact or name in suffix:
+            return True
+        i = name.find(".")
+        while i != -1:
+            if name[i + 1:] in suffix:
+                return True
+            i = name.find(".", i + 1)
+        return False
+
+    def is_blocked(self, name):
+        if not self._hit(name, self.block_exact, self.block_suffix):
+            return False
+        return not self._hit(name, self.allow_exact, self.allow_suffix)
@@ -0,0 +1,230 @@
+# feed_scheduler.py
+
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from blacklist_updater import (
+    BlacklistUpdater, BLACKLIST_FILE, FEEDS_DIR, VERSION_FILE, WHITELIST_FILE, has_snapshots, seed_local_source
+)
+
+STATUS_FILE = os.path.join(FEEDS_DIR, "status.json")
+
+
+def _feed_entries(urls, default_interval):
+    """
+    `blacklist_urls` entries are plain URLs or {"url": ..., "interval": seconds}.
+    """
+    out = []
+    for entry in urls:
+        if isinstance(entry, dict):
+            url = entry.get("url")
+            interval = float(entry.get("interval", default_interval))
+        else:
+            url, interval = entry, default_interval
+        if url:
+            out.append((url, interval))
+    return out
+
+
+class FeedScheduler:
+    """
+    Refreshes every configured feed in the background: feeds are fetched
+    concurrently, each on its own interval with jitter, and a new compiled
+    list is published (and `on_publish` called) whenever one changed.
+    Rules already in blacklist.txt before the first publish are carried
+    over as the "local" source (config/feeds/local.rules).
+    """
+
+    PUBLISH_DELAY = 5.0
+
+    def __init__(self, urls, on_publish=None, *, interval=3600.0, jitter=0.1,
+                 workers=4, feeds_dir=FEEDS_DIR, local_file=BLACKLIST_FILE,
+                 whitelist_file=WHITELIST_FILE, version_file=VERSION_FILE,
+                 status_file=STATUS_FILE):
+        self.on_publish = on_publish
+        self.jitter = jitter
+        self.local_file = local_file
+        self.version_file = version_file
+        self.status_file = status_file
+        self.feeds_dir = feeds_dir
+        self.whitelist_file = whitelist_file
+
+        kwargs = dict(local_file=local_file, whitelist_file=whitelist_file,
+                      feeds_dir=feeds_dir, version_file=version_file)
+        self.feeds = {}
+        for url, feed_interval in _feed_entries(urls, interval):
+            self.feeds[url] = {
+                "updater": BlacklistUpdater(url, **kwargs),
+                "interval": feed_interval,
+                "last_success": None,
+                "last_attempt": None,
+                "latency_ms": None,
+                "rules": None,
+                "error": None,
+            }
+
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="feed")
+        self.lock = threading.Lock()
+        self.publish_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    @classmethod
+    def from_config(cls, config, on_publish=None):
+        cfg = config.get("feed_refresh", {})
+        return cls(
+            config.get("blacklist_urls", []),
+            on_publish=on_publish,
+            interval=float(cfg.get("interval", 3600)),
+            jitter=float(cfg.get("jitter", 0.1)),
+            workers=int(cfg.get("workers", 4)),
+        )
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="feed-scheduler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+        self.pool.shutdown(wait=False)
+
+    def refresh_now(self):
+        """
+        Marks every feed as due on the next scheduler tick.
+        """
+        for feed in self.feeds.values():
+            feed["due_now"] = True
+        self.wakeup.set()
+
+    def _next_delay(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _run(self):
+        # Small random offsets so feeds sharing a host aren't hit in lockstep
+        self.due = [(time.time() + random.uniform(0, 1.0), url) for url in self.feeds]
+        heapq.heapify(self.due)
+        self.in_flight = set()
+        self.dirty_since = None
+        sources = [f["updater"].source_key for f in self.feeds.values()]
+        sources += seed_local_source(self.feeds_dir, self.local_file, self.version_file)
+        self._publish_if_sources_changed(sources)
+
+        while not self.stopped:
+            now = time.time()
+            with self.lock:
+                for url, feed in self.feeds.items():
+                    if feed.pop("due_now", False) and url not in self.in_flight:
+                        self.due = [d for d in self.due if d[1] != url]
+                        heapq.heapify(self.due)
+                        heapq.heappush(self.due, (now, url))
+                while self.due and self.due[0][0] <= now:
+                    url = heapq.heappop(self.due)[1]
+                    self.in_flight.add(url)
+                    self.pool.submit(self._refresh, url).add_done_callback(
+                        lambda fut, url=url: self._done(url, fut))
+
+                # Coalesce publishes: wait for the in-flight batch, but never
+                # hold a change back for longer than PUBLISH_DELAY
+                publish = self.dirty_since is not None and (
+                    not self.in_flight or now - self.dirty_since >= self.PUBLISH_DELAY)
+                if publish:
+                    self.dirty_since = None
+                timeout = max(0.0, self.due[0][0] - now) if self.due else None
+                if self.dirty_since is not None:
+                    timeout = min(timeout or self.PUBLISH_DELAY, self.PUBLISH_DELAY)
+
+            if publish:
+                self._publish(sources)
+                self._write_status()
+
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+    def _done(self, url, fut):
+        changed = not fut.cancelled() and fut.exception() is None and fut.result()
+        with self.lock:
+            self.in_flight.discard(url)
+            heapq.heappush(self.due, (time.time() + self._next_delay(self.feeds[url]["interval"]), url))
+            if changed and self.dirty_since is None:
+                self.dirty_since = time.time()
+        if not changed:
+            self._write_status()
+        self.wakeup.set()
+
+    # ---------- Work ----------
+
+    def _refresh(self, url):
+        feed = self.feeds[url]
+        t0 = time.perf_counter()
+        feed["last_attempt"] = time.time()
+        try:
+            delta = feed["updater"].update(compile=False)
+            state = feed["updater"].load_state()
+            feed["error"] = state.get("error")
+            feed["rules"] = state.get("rules")
+            feed["last_success"] = state.get("verified_at")
+            return delta is not None
+        except Exception as e:
+            feed["error"] = str(e)
+            print(f"[FEED ERROR] {url}: {e}")
+            return False
+        finally:
+            feed["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def _publish(self, sources):
+        with self.publish_lock:
+            info = BlacklistUpdater.compile(self.feeds_dir, self.local_file, self.whitelist_file,
+                                            self.version_file, sources=sources)
+        if self.on_publish:
+            try:
+                self.on_publish(info)
+            except Exception as e:
+                print(f"[FEED ERROR] publish callback: {e}")
+
+    def _publish_if_sources_changed(self, sources):
+        try:
+            with open(self.version_file) as f:
+                published = json.load(f).get("sources")
+        except (FileNotFoundError, json.JSONDecodeError):
+            published = None
+        # Before any feed has been fetched there is nothing better to publish
+        if published != sources and has_snapshots(self.feeds_dir, sources):
+            self._publish(sources)
+
+    # ---------- Reporting ----------
+
+    def status(self):
+        now = time.time()
+        out = []
+        for url, feed in self.feeds.items():
+            out.append({
+                "url": url,
+                "interval_s": feed["interval"],
+                "age_s": round(now - feed["last_success"], 1) if feed["last_success"] else None,
+                "last_attempt": feed["last_attempt"],
+                "latency_ms": feed["latency_ms"],
+                "rules": feed["rules"],
+                "error": feed["error"],
+            })
+        return out
+
+    def _write_status(self):
+        try:
+            os.makedirs(os.path.dirname(self.status_file), exist_ok=True)
+            tmp = f"{self.status_file}.tmp"
+            with self.publish_lock:
+                with open(tmp, "w") as f:
+                    json.dump({"updated_at": time.time(), "feeds": self.status()}, f, indent=2)
+                os.replace(tmp, self.status_file)
+        except OSError as e:
+            print(f"[FEED ERROR] status: {e}")
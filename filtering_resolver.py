@@ -1,11 +1,20 @@
 from dnslib.server import BaseResolver
 from dnslib import DNSRecord
-from domain_analyser import DomainAnalyser
+from domain_names import normalize
+from feed_matcher import RuleMatcher
+from rate_limiter import ClientRateLimiter
+from burst_detector import BurstDetector
+from analysis_queue import AnalysisQueue
+from verdict_learner import VerdictLearner
+from event_stream import shared_stream
+from tracing import Tracer, current, span
 import socket, threading, time, os
+from concurrent.futures import TimeoutError as FutureTimeout
 
 from lists import (
     WHITELIST_USER, BLACKLIST_USER,
-    WHITELIST_AUTO, BLACKLIST_AUTO
+    WHITELIST_AUTO, BLACKLIST_AUTO,
+    ListIndex,
 )
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,94 +22,330 @@ CONFIG_DIR = os.path.join(BASE_DIR, "config")
 LOG_FILE = os.path.join(CONFIG_DIR, "queries.log")
 
 
+DEFAULT_LISTS = {
+    "user_whitelist": WHITELIST_USER,
+    "user_blacklist": BLACKLIST_USER,
+    "auto_whitelist": WHITELIST_AUTO,
+    "auto_blacklist": BLACKLIST_AUTO,
+}
+# Written by the verdict learner, which only ever judged the exact name
+EXACT_LISTS = {"auto_whitelist", "auto_blacklist"}
+
+
+def _parse_upstream(upstream_dns):
+    # "1.1.1.1", "127.0.0.1:5353" or "[::1]:5353"
+    host, port = upstream_dns, 53
+    if upstream_dns.startswith("["):
+        host, _, rest = upstream_dns[1:].partition("]")
+        port = int(rest[1:]) if rest.startswith(":") else 53
+    elif upstream_dns.count(":") == 1:
+        host, _, p = upstream_dns.partition(":")
+        port = int(p)
+    return host, port
+
+
+def _component(given, from_settings):
+    if given is None:
+        return from_settings()
+    return None if given is False else given
+
+
 class FilteringResolver(BaseResolver):
+    OVER_BUDGET = object()  # _queued_analysis: the client's analysis budget refused a new analysis
+
     def __init__(self, filtering_enabled, list_only_filtering_enabled,
-                 model, api_url, block_score, upstream_dns):
+                 model, api_url, block_score, upstream_dns,
+                 lists=None, log_file=LOG_FILE, analyser=None, rate_limiter=None,
+                 burst_detector=None, analysis_queue=None, learner=None, events=None,
+                 tracer=None):
         self.filtering_enabled = filtering_enabled
         self.list_only = list_only_filtering_enabled
-        self.analyser = DomainAnalyser(model, api_url, block_score)
-        self.upstream = (upstream_dns, 53)
+        # Built on first use (or by warm_up()) so list-only serving never
+        # imports the LLM client, numpy or the WHOIS/TLS stack
+        self._analyser = analyser
+        self._analyser_args = (model, api_url, block_score)
+        self._analyser_lock = threading.Lock()
+        self.upstream = _parse_upstream(upstream_dns)
+        self.lists = {**DEFAULT_LISTS, **(lists or {})}
+        self.log_file = log_file
         self.lock = threading.Lock()
         self.in_progress = set()
+        # Compiled feed blacklist; replaced wholesale by set_feed_matcher()
+        self.feed_matcher = RuleMatcher()
+        # Components left as None are built from config.json; pass False to
+        # run without one regardless of the config (benchmarks, tests)
+        # Per-client query and analysis budgets ("rate_limit" in config.json)
+        self.rate_limiter = _component(rate_limiter, ClientRateLimiter.from_settings)
+        # Random-subdomain floods and NXDOMAIN-heavy clients ("burst_detection")
+        self.burst_detector = _component(burst_detector, BurstDetector.from_settings)
+        # Pending analyses served by popularity instead of arrival order ("analysis_queue")
+        self.analysis_queue = _component(analysis_queue, lambda: AnalysisQueue.from_settings(self._analyse))
+        # Confident verdicts promoted into the auto lists ("verdict_learning")
+        self.learner = _component(learner, lambda: VerdictLearner.from_settings(
+            block_score, whitelist_file=self.lists["auto_whitelist"],
+            blacklist_file=self.lists["auto_blacklist"]))
+        # List files held in memory; writers' changes arrive as deltas
+        self.index = ListIndex(self.lists)
+        # Recent decisions for the dashboard's live view ("event_stream")
+        self.events = _component(events, shared_stream)
+        # Sampled per-query stage timings ("tracing"); None costs nothing per query
+        self.tracer = _component(tracer, Tracer.from_settings)
+
+    def set_feed_matcher(self, matcher):
+        self.feed_matcher = matcher
+
+    @property
+    def analyser(self):
+        if self._analyser is None:
+            with self._analyser_lock:
+                if self._analyser is None:
+                    from domain_analyser import DomainAnalyser
+                    self._analyser = DomainAnalyser(*self._analyser_args)
+        return self._analyser
+
+    def warm_up(self):
+        """
+        Builds the analyser ahead of the first unknown domain.
+        """
+        if self.filtering_enabled and not self.list_only:
+            if self.learner is not None:
+                self.learner.start()
+            return self.analyser
+
+    def apply_config(self, cfg, pinned=()):
+        """
+        Applies a reloaded config.json without dropping service (subscribed
+        to settings.manager by server.py). Settings named in `pinned` were
+        fixed on the command line and are left alone. Cached results are
+        invalidated only where the new threshold or model could change them.
+        """
+        from settings import active_profile
+        if "filtering_enabled" not in pinned:
+            self.filtering_enabled = cfg["filtering_enabled"]
+        if "list_only" not in pinned:
+            self.list_only = not cfg["advanced_analysis_enabled"]
+        if "upstream_dns" not in pinned:
+            self.upstream = _parse_upstream(cfg["upstream_dns"])
+        tracing = cfg.get("tracing", {})
+        if not tracing.get("enabled", False) or tracing.get("sample_rate", 0.01) <= 0:
+            self.tracer = None
+        elif self.tracer is None:
+            self.tracer = Tracer.from_config(tracing)
+        else:
+            self.tracer.sample_rate = float(tracing.get("sample_rate", 0.01))
+
+        profile = active_profile(cfg)
+        old_model, old_url, old_score = self._analyser_args
+        new_args = (profile["model"], profile["api_url"], cfg["block_score"])
+        with self._analyser_lock:
+            self._analyser_args = new_args
+            if self._analyser is not None:
+                self._analyser.reconfigure(block_score=new_args[2], model=new_args[0], api_url=new_args[1],
+                                           stream=cfg["llm"].get("stream", False),
+                                           max_tokens=cfg["llm"].get("max_tokens", {}),
+                                           structured_output=cfg["llm"].get("structured_output", "json_schema"),
+                                           structured_max_tokens=cfg["llm"].get("structured_max_tokens", {}),
+                                           llm_cfg=cfg["llm"])
+
+        if new_args[2] != old_score:
+            # Only results scored between the two thresholds change verdict
+            lo, hi = sorted((old_score, new_args[2]))
+            if self.analysis_queue is not None:
+                self.analysis_queue.invalidate(lambda r: r is not None and lo <= r.get("score", 0) < hi)
+            if self.learner is not None:
+                self.learner.invalidate(block_score=new_args[2])
+        if new_args[:2] != (old_model, old_url):
+            if self.analysis_queue is not None:
+                self.analysis_queue.invalidate(lambda r: True)
+            if self.learner is not None and new_args[0] != old_model:
+                self.learner.invalidate(model=new_args[0])
+        self.warm_up()
 
     def resolve(self, request, handler):
+        tracer = self.tracer
+        trace = tracer.begin("resolve") if tracer is not None else None
+        if trace is None:
+            return self._resolve(request, handler)
+        try:
+            return self._resolve(request, handler)
+        finally:
+            trace.finish(qname=str(request.q.qname).rstrip('.').lower())
+
+    def _resolve(self, request, handler):
         qname = str(request.q.qname).rstrip('.').lower()
-        base = qname.lstrip("www.")
+        name = normalize(qname)
+        base = name.name
+        client = handler.client_address[0] if handler is not None else None
+
+        # ---------- Per-client query budget ----------
+        limiter = self.rate_limiter
+        if limiter is not None:
+            with span("rate_limit"):
+                limiter.maybe_report()
+                allowed = limiter.allow_query(client)
+            if not allowed:
+                self._log(qname, f"{limiter.query_fallback} (rate limit {client})", client)
+                return self._fallback(request, limiter.query_fallback, client)
 
         # ---------- Forward-only mode ----------
         if not self.filtering_enabled:
-            return self.forward(request)
-
-        # ---------- Load lists ----------
-        user_whitelist = self._load(WHITELIST_USER)
-        user_blacklist = self._load(BLACKLIST_USER)
-        auto_whitelist = self._load(WHITELIST_AUTO)
-        auto_blacklist = self._load(BLACKLIST_AUTO)
+            return self.forward(request, client)
 
         # ---------- Resolution priority ----------
-        if base in user_whitelist:
-            self._log(qname, "allow (user whitelist)")
-            return self.forward(request)
+        if self._listed(name, "user_whitelist"):
+            self._log(qname, "allow (user whitelist)", client)
+            return self.forward(request, client)
+
+        if self._listed(name, "user_blacklist"):
+            self._log(qname, "block (user blacklist)", client)
+            return self._block(request)
 
-        if base in user_blacklist:
-            self._log(qname, "block (user blacklist)")
+        with span("feed_blacklist"):
+            feed_blocked = self.feed_matcher.is_blocked(name.name)
+        if feed_blocked:
+            self._log(qname, "block (feed blacklist)", client)
             return self._block(request)
 
-        if base in auto_whitelist:
-            self._log(qname, "allow (auto whitelist)")
-            return self.forward(request)
+        if self._listed(name, "auto_whitelist"):
+            self._log(qname, "allow (auto whitelist)", client)
+            return self.forward(request, client)
 
-        if base in auto_blacklist:
-            self._log(qname, "block (auto blacklist)")
+        if self._listed(name, "auto_blacklist"):
+            self._log(qname, "block (auto blacklist)", client)
             return self._block(request)
 
         # ---------- List-only mode ----------
         if self.list_only:
-            self._log(qname, "allow (list-only)")
-            return self.forward(request)
+            self._log(qname, "allow (list-only)", client)
+            return self.forward(request, client)
 
-        # ---------- Prevent duplicate analysis ----------
-        with self.lock:
-            if base in self.in_progress:
-                reply = request.reply()
-                reply.header.rcode = 2
-                return reply
-            self.in_progress.add(base)
+        # ---------- Random-subdomain bursts ----------
+        # Floods of unique names under one parent never reach per-name analysis
+        if self.burst_detector is not None:
+            with span("burst"):
+                action = self.burst_detector.observe(name.name, name.registrable)
+            if action == "block":
+                self._log(qname, f"block (subdomain burst {name.registrable})", client)
+                return self._block(request)
+            if action == "list_only":
+                self._log(qname, f"allow (subdomain burst {name.registrable}, list-only)", client)
+                return self.forward(request, client)
+            if self.burst_detector.client_suspicious(client):
+                self._log(qname, f"allow (NXDOMAIN-heavy client {client}, list-only)", client)
+                return self.forward(request, client)
 
-        try:
-            result = self.analyser.analyse(base)
-        finally:
-            self.in_progress.remove(base)
+        # ---------- Per-client analysis budget ----------
+        # Charged only for analyses that would actually call the LLM: the
+        # queue asks for it just before enqueueing a new one
+        admit = (lambda: limiter.allow_analysis(client)) if limiter is not None else None
+
+        if self.analysis_queue is not None:
+            with span("analysis"):
+                result = self._queued_analysis(base, client, admit)
+            if result is self.OVER_BUDGET:
+                self._log(qname, f"{limiter.analysis_fallback} (analysis budget {client})", client)
+                return self._fallback(request, limiter.analysis_fallback, client)
+            if result is None:
+                verdict = self.analysis_queue.timeout_verdict
+                self._log(qname, f"{verdict} (analysis pending)", client)
+                return self._fallback(request, verdict, client)
+        else:
+            # ---------- Prevent duplicate analysis ----------
+            with self.lock:
+                if base in self.in_progress:
+                    reply = request.reply()
+                    reply.header.rcode = 2
+                    return reply
+                self.in_progress.add(base)
+
+            if admit is not None and not admit():
+                self.in_progress.discard(base)
+                self._log(qname, f"{limiter.analysis_fallback} (analysis budget {client})", client)
+                return self._fallback(request, limiter.analysis_fallback, client)
+            try:
+                with span("analysis"):
+                    result = self._analyse(base)
+            finally:
+                self.in_progress.remove(base)
 
         if result.get("verdict") == "block":
-            self._log(qname, "block (analysis)")
+            self._log(qname, "block (analysis)", client)
             return self._block(request)
 
-        self._log(qname, "allow (analysis)")
-        return self.forward(request)
+        self._log(qname, "allow (analysis)", client)
+        return self.forward(request, client)
 
     # ---------- Helpers ----------
 
-    def forward(self, request):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.sendto(request.pack(), self.upstream)
-        data, _ = sock.recvfrom(4096)
-        return DNSRecord.parse(data)
+    def forward(self, request, client=None):
+        with span("forward"):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.sendto(request.pack(), self.upstream)
+            data, _ = sock.recvfrom(4096)
+        reply = DNSRecord.parse(data)
+        if self.burst_detector is not None:
+            # Upstream NXDOMAIN ratio per client (our own blocks don't count)
+            self.burst_detector.observe_reply(client, reply.header.rcode)
+        return reply
 
     def _block(self, request):
         reply = request.reply()
         reply.header.rcode = 3  # NXDOMAIN
         return reply
 
-    def _load(self, path):
+    def _analyse(self, domain):
+        # Queue workers run outside any query's trace: sample them on their own
+        tracer = self.tracer
+        trace = tracer.begin("analyse") if tracer is not None and current() is None else None
         try:
-            with open(path) as f:
-                return set(line.strip().lower() for line in f if line.strip())
-        except FileNotFoundError:
-            return set()
-
-    def _log(self, qname, verdict):
-        with open(LOG_FILE, "a") as f:
-            f.write(
-                f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {qname} - {verdict}\n"
-            )
+            result = self.analyser.analyse(domain)
+            if self.learner is not None:
+                self.learner.record(domain, result, self._analyser_args[0])
+            return result
+        finally:
+            if trace is not None:
+                trace.finish(domain=domain)
+
+    def _queued_analysis(self, base, client, admit=None):
+        """
+        Waits up to wait_s for the queued analysis; None if it was dropped
+        or is still running (it then finishes in the background),
+        OVER_BUDGET if `admit` refused a new one.
+        """
+        future = self.analysis_queue.submit(base, client, admit)
+        if future is None:
+            return self.OVER_BUDGET
+        try:
+            return future.result(timeout=self.analysis_queue.wait_s)
+        except FutureTimeout:
+            return None
+
+    def _fallback(self, request, verdict, client=None):
+        if verdict == "allow":
+            return self.forward(request, client)
+        if verdict == "block":
+            return self._block(request)
+        reply = request.reply()
+        reply.header.rcode = 2 if verdict == "servfail" else 5  # SERVFAIL / REFUSED
+        return reply
+
+    def _listed(self, name, key):
+        # A user-list entry covers the exact name and, when it is a
+        # registrable domain, every name under it. Learned entries are exact:
+        # a verdict on weebly.com says nothing about x.weebly.com
+        with span(key):
+            entries = self.index.get(key)
+            if name.name in entries:
+                return True
+            return key not in EXACT_LISTS and name.registrable in entries
+
+    def _log(self, qname, verdict, client=None):
+        trace = current()
+        if trace is not None:
+            trace.attrs["verdict"] = verdict
+        with span("log"):
+            if self.events is not None:
+                self.events.publish(qname, verdict, client)
+            line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {qname} - {verdict}"
+            with open(self.log_file, "a") as f:
+                f.write(f"{line} - {client}\n" if client else f"{line}\n")
@@ -0,0 +1,309 @@
+# list_store.py
+
+import contextlib
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+try:
+    import fcntl  # serialises writers across processes; per-process locking only without it
+except ImportError:
+    fcntl = None
+
+
+def parse_entry(line: str):
+    """
+    "entry [fields...]" -> (entry, fields); None for blanks and comments.
+    """
+    fields = line.split(None, 1)
+    if not fields or fields[0].startswith("#"):
+        return None
+    return fields[0], fields[1].strip() if len(fields) > 1 else ""
+
+
+def _identity(entry: str) -> str:
+    return entry
+
+
+class ListStore:
+    """
+    A list file held in memory as {entry: fields}, changed through an
+    append-only journal ("<path>.journal", one "+entry fields" or "-entry"
+    per line) instead of rewriting or re-reading the file.
+
+    Every write catches up on other writers' journal lines, appends its
+    own and notifies subscribers with just the delta. After
+    `snapshot_every` journal lines the state is written back to `path`
+    (still one entry per line, readable as a plain list) and the journal
+    restarted. refresh() picks up other processes' writes by reading only
+    the journal bytes past the last offset; a replaced snapshot or journal
+    triggers a full reload.
+
+    `key` canonicalises entries (e.g. domain normalisation) before they
+    are stored or looked up.
+    """
+
+    def __init__(self, path: str, key: Optional[Callable[[str], str]] = None, snapshot_every: int = 1000):
+        self.path = path
+        self.journal = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+        self.key = key or _identity
+        self.snapshot_every = max(1, int(snapshot_every))
+        self.entries: Dict[str, str] = {}
+        self.loaded = False
+        self.ids = (None, None)  # inodes of (snapshot, journal) the state was built from
+        self.offset = 0          # journal bytes applied
+        self.ops = 0             # journal lines since the last snapshot
+        self.subscribers = []
+        self.lock = threading.RLock()
+
+    # ---------- Reads ----------
+
+    def __contains__(self, entry: str) -> bool:
+        return self.contains(entry)
+
+    def contains(self, entry: str) -> bool:
+        self._ensure()
+        return self.key(entry) in self.entries
+
+    def get(self, entry: str) -> Optional[str]:
+        self._ensure()
+        return self.entries.get(self.key(entry))
+
+    def items(self):
+        self._ensure()
+        with self.lock:
+            return list(self.entries.items())
+
+    def __len__(self):
+        self._ensure()
+        return len(self.entries)
+
+    def subscribe(self, callback: Callable[[dict, list], None]):
+        """
+        callback(added {entry: fields}, removed [entry]) after every change;
+        removals apply before additions.
+        """
+        self.subscribers.append(callback)
+
+    # ---------- Writes ----------
+
+    def add(self, entry: str, fields: str = "") -> bool:
+        return self.update({entry: fields})[0] == 1
+
+    def remove(self, entry: str) -> bool:
+        return self.update(removed=[entry])[1] == 1
+
+    def bulk_import(self, entries: Iterable) -> int:
+        """
+        Adds bare entries or (entry, fields) pairs in one journal write.
+        Returns how many were new or changed.
+        """
+        rows = {}
+        for item in entries:
+            entry, fields = (item, "") if isinstance(item, str) else item
+            rows[entry] = fields
+        return self.update(rows)[0]
+
+    def update(self, added: Optional[dict] = None, removed: Iterable[str] = ()):
+        """
+        Applies removals then additions; returns (added, removed) counts of
+        entries that actually changed.
+        """
+        delta_added, delta_removed, lines = {}, [], []
+        with self.lock, self._file_lock():
+            caught_up = self._catch_up()
+            for entry in removed:
+                k = self.key(entry)
+                if k in self.entries:
+                    del self.entries[k]
+                    delta_removed.append(k)
+                    lines.append(f"-{k}\n")
+            for entry, fields in (added or {}).items():
+                k, fields = self.key(entry), (fields or "").strip()
+                if self.entries.get(k) != fields:
+                    self.entries[k] = fields
+                    delta_added[k] = fields
+                    lines.append(f"+{k} {fields}".rstrip() + "\n")
+            if lines:
+                with open(self.journal, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+                    f.flush()
+                    self.offset = f.tell()
+                self.ids = (self.ids[0], self._inode(self.journal))
+                self.ops += len(lines)
+                if self.ops >= self.snapshot_every:
+                    self._snapshot()
+        self._notify(*caught_up)
+        self._notify(delta_added, delta_removed)
+        return len(delta_added), len(delta_removed)
+
+    def snapshot(self):
+        """
+        Writes the current state to `path` and restarts the journal.
+        """
+        with self.lock, self._file_lock():
+            self._catch_up()
+            self._snapshot()
+
+    def refresh(self):
+        """
+        Applies other processes' changes since the last read.
+        """
+        with self.lock, self._file_lock():
+            delta = self._catch_up()
+        self._notify(*delta)
+
+    # ---------- Internals ----------
+
+    def _ensure(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    with self._file_lock():
+                        self._reload()
+                    self.loaded = True
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _inode(path):
+        try:
+            return os.stat(path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _apply(self, line, added, removed, entries=None):
+        entries = self.entries if entries is None else entries
+        op, rest = line[:1], line[1:]
+        entry = parse_entry(rest)
+        if entry is None:
+            return
+        k, fields = entry
+        if op == "+":
+            entries[k] = fields
+            added[k] = fields
+        elif op == "-" and entries.pop(k, None) is not None:
+            removed.append(k)
+            added.pop(k, None)
+
+    def _catch_up(self):
+        """
+        Reads journal lines past `offset`; returns the (added, removed) delta.
+        """
+        added, removed = {}, []
+        if not self.loaded:
+            self._reload()
+            self.loaded = True
+            return added, removed
+        if self._inode(self.path) != self.ids[0]:
+            return self._reload()
+        try:
+            with open(self.journal, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self.ids[1] or st.st_size < self.offset:
+                    if self.ids[1] is not None or st.st_size < self.offset:
+                        return self._reload()
+                    self.ids = (self.ids[0], st.st_ino)  # journal created since our load
+                if st.st_size == self.offset:
+                    return added, removed
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return (self._reload() if self.ids[1] is not None else (added, removed))
+        # A line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8", "replace").splitlines():
+            self._apply(line, added, removed)
+            self.ops += 1
+        self.offset += end
+        return added, removed
+
+    def _reload(self):
+        """
+        Rebuilds the state from snapshot + journal; returns the delta
+        against what was held before.
+        """
+        # Built aside and swapped in whole: resolver threads read `entries`
+        # without the lock and must never see a half-loaded dict
+        old, entries = self.entries, {}
+        ops = offset = 0
+        snapshot_id = self._inode(self.path)
+        try:
+            with open(self.path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    entry = parse_entry(line)
+                    if entry is not None:
+                        entries[self.key(entry[0])] = entry[1]
+        except FileNotFoundError:
+            pass
+        journal_id = None
+        try:
+            with open(self.journal, "rb") as f:
+                journal_id = os.fstat(f.fileno()).st_ino
+                data = f.read()
+            end = data.rfind(b"\n") + 1
+            scratch = ({}, [])
+            for line in data[:end].decode("utf-8", "replace").splitlines():
+                self._apply(line, *scratch, entries)
+                ops += 1
+            offset = end
+        except FileNotFoundError:
+            pass
+        self.entries, self.ops, self.offset = entries, ops, offset
+        self.ids = (snapshot_id, journal_id)
+        added = {k: v for k, v in entries.items() if old.get(k) != v}
+        removed = [k for k in old if k not in entries]
+        return added, removed
+
+    def _snapshot(self):
+        # Callers hold both locks, so no reader sees the new snapshot with the old journal
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(f"{k} {v}".rstrip() + "\n" for k, v in self.entries.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        tmp = f"{self.journal}.tmp"
+        open(tmp, "w").close()
+        os.replace(tmp, self.journal)
+        self.ids = (self._inode(self.path), self._inode(self.journal))
+        self.offset = self.ops = 0
+
+    def _notify(self, added, removed):
+        if not (added or removed):
+            return
+        for callback in list(self.subscribers):
+            try:
+                callback(added, removed)
+            except Exception as e:
+                print(f"[LIST STORE ERROR] {self.path}: {e}")
+
+
+# ---------- Registry ----------
+
+_stores: Dict[str, ListStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path: str, key: Optional[Callable[[str], str]] = None, **kwargs) -> ListStore:
+    """
+    The process-wide store for `path`, so every writer in a process shares
+    one in-memory state (the first caller's `key` wins).
+    """
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ListStore(path, key, **kwargs)
+        return store
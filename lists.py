@@ -1,4 +1,8 @@
 import os
+import time
+
+from domain_names import normalize
+from list_store import ListStore, open_store
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
@@ -8,3 +12,46 @@ WHITELIST_USER = os.path.join(CONFIG_DIR, "whitelist_user.txt")
 BLACKLIST_USER = os.path.join(CONFIG_DIR, "blacklist_user.txt")
 WHITELIST_AUTO = os.path.join(CONFIG_DIR, "whitelist_auto.txt")
 BLACKLIST_AUTO = os.path.join(CONFIG_DIR, "blacklist_auto.txt")
+
+
+def domain_key(entry: str) -> str:
+    return normalize(entry).name
+
+
+def open_list(path: str) -> ListStore:
+    """
+    The shared store for a domain list file (entries normalized).
+    """
+    return open_store(path, domain_key)
+
+
+# ---------- In-memory index ----------
+
+class ListIndex:
+    """
+    The resolver's view of the list files: one shared ListStore per list,
+    so writes from the dashboard, feed updater or verdict learner in this
+    process land in memory as deltas. Other processes' writes are picked
+    up by reading new journal lines, at most every `check_interval`
+    seconds per list.
+    """
+
+    def __init__(self, paths: dict, check_interval: float = 1.0):
+        self.stores = {key: open_list(path) for key, path in paths.items()}
+        self.check_interval = check_interval
+        self.checked = {key: None for key in self.stores}
+
+    def get(self, key: str) -> dict:
+        """
+        {entry: fields} for `key`; only membership tests are meant on it.
+        """
+        store = self.stores[key]
+        now = time.monotonic()
+        last = self.checked[key]
+        if last is None or now - last >= self.check_interval:
+            self.checked[key] = now
+            try:
+                store.refresh()
+            except OSError as e:
+                print(f"[LIST ERROR] {store.path}: {e}")
+        return store.entries
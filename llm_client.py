@@ -5,197 +5,475 @@ import time
 import os
 import uuid
 from datetime import datetime
-from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict
+
+from llm_router import LLMRouter
+from llm_telemetry import TelemetrySink, open_sink
+
+DEFAULT_MAX_TOKENS = 768
+# A constrained reply is just the JSON object: a few dozen tokens at most
+DEFAULT_STRUCTURED_MAX_TOKENS = 64
+
+PHISHING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": ["Safe", "Malicious", "Likely Phishing", "Possibly Legitimate"]},
+        "mimics": {"type": ["string", "null"]},
+    },
+    "required": ["verdict", "mimics"],
+    "additionalProperties": False,
+}
+SAN_SCHEMA = {
+    "type": "object",
+    "properties": {"verdict": {"type": "string", "enum": ["Safe", "Suspicious"]}},
+    "required": ["verdict"],
+    "additionalProperties": False,
+}
+STRUCTURED_MODES = {"json_schema", "json_object", "grammar", "off"}
+# Statuses of servers that reject response_format / grammar outright
+_UNSUPPORTED_STATUS = {400, 415, 422, 501}
+# Free-text or empty replies to a constrained request before an endpoint is
+# treated as not honouring it, and how long until it is asked again
+STRUCTURED_MAX_MISSES = 3
+STRUCTURED_RETRY_S = 3600.0
+_THINK_PREFIX = re.compile(r"^\s*<think>.*?</think>", re.S)
+
+
+def _counts_reasoning(model: str) -> bool:
+    # Reasoning models: max_completion_tokens covers their hidden reasoning too
+    return (model or "").lower().startswith(("gpt-5", "o1", "o3", "o4"))
+
+
+def build_grammar(schema: dict) -> str:
+    """
+    GBNF grammar (llama.cpp "grammar" field) for the flat verdict schemas
+    above: string enums and nullable strings, in schema order.
+    """
+    fields, rules = [], []
+    for i, (name, prop) in enumerate(schema["properties"].items()):
+        rule = f"f{i}"
+        fields.append(f'"\\"{name}\\"" ws ":" ws {rule}')
+        if "enum" in prop:
+            rules.append(f"{rule} ::= " + " | ".join(f'"\\"{v}\\""' for v in prop["enum"]))
+        else:
+            rules.append(f'{rule} ::= "null" | "\\"" [a-zA-Z0-9._-]+ "\\""')
+    root = 'root ::= "{" ws ' + ' ws "," ws '.join(fields) + ' ws "}"'
+    return "\n".join([root, *rules, "ws ::= [ ]?"]) + "\n"
+
+
+class VerdictScanner:
+    """
+    Incremental parser for streamed completions: feed() text as it arrives
+    and get the first complete top-level JSON object carrying a "verdict",
+    skipping <think> blocks and braces inside JSON strings. Each character
+    is examined once, however the text is split.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.start = None   # index of the open "{" of the current object
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.in_think = False
+
+    def feed(self, text: str) -> Optional[dict]:
+        self.buf += text
+        buf, i = self.buf, self.pos
+        while i < len(buf):
+            if self.in_think:
+                end = buf.find("</think>", i)
+                if end < 0:
+                    self.pos = max(i, len(buf) - len("</think>"))
+                    return None
+                i, self.in_think = end + len("</think>"), False
+                continue
+            c = buf[i]
+            if self.depth == 0:
+                if c == "<" and buf.startswith("<think>", i):
+                    self.in_think = True
+                    i += len("<think>")
+                    continue
+                if c == "<" and len(buf) - i < len("<think>") and "<think>".startswith(buf[i:]):
+                    break  # maybe a tag split across chunks
+                if c == "{":
+                    self.start, self.depth = i, 1
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+            elif c == '"':
+                self.in_string = True
+            elif c == "{":
+                self.depth += 1
+            elif c == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        obj = json.loads(buf[self.start:i + 1])
+                    except json.JSONDecodeError:
+                        obj = None
+                    if isinstance(obj, dict) and "verdict" in obj:
+                        self.pos = i + 1
+                        return obj
+            i += 1
+        self.pos = i
+        return None
 
 
 class LLMClient:
     def __init__(self, model: str, api_url: str, timeout: float = 30.0,
                  enable_logging: bool = False, enable_reasoning_log: bool = False,
-                 log_dir: Optional[str] = None, api_key: Optional[str] = None):
-        self.model = model
-        self.api_url = api_url
+                 log_dir: Optional[str] = None, api_key: Optional[str] = None,
+                 telemetry: Optional[TelemetrySink] = None, stream: Optional[bool] = None,
+                 max_tokens: Optional[Dict[str, int]] = None, structured_output: Optional[str] = None,
+                 structured_max_tokens: Optional[Dict[str, int]] = None, router: Optional[LLMRouter] = None):
         self.timeout = timeout
         self.enable_logging = enable_logging
         self.enable_reasoning_log = enable_reasoning_log
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.reconfigure(model, api_url)
+
+        # --- streaming and per-check token budgets ("llm" in config.json) ---
+        from settings import config
+        llm_cfg = config.get("llm", {})
+        if None in (stream, max_tokens, structured_output, structured_max_tokens):
+            stream = llm_cfg.get("stream", False) if stream is None else stream
+            max_tokens = llm_cfg.get("max_tokens", {}) if max_tokens is None else max_tokens
+            if structured_output is None:
+                structured_output = llm_cfg.get("structured_output", "json_schema")
+            if structured_max_tokens is None:
+                structured_max_tokens = llm_cfg.get("structured_max_tokens", {})
+        self.stream = stream
+        self.max_tokens = max_tokens
+        # --- constrained decoding; endpoints that reject or ignore it fall back to free text ---
+        self.structured_output = structured_output if structured_output in STRUCTURED_MODES else "off"
+        self.structured_max_tokens = structured_max_tokens
+        self.structured_support: Dict[str, bool] = {}  # api_url -> constraint honoured
+        self.structured_misses: Dict[str, int] = {}    # api_url -> misses since the last honoured reply
+        self.structured_retry_at: Dict[str, float] = {}  # api_url -> when to try a rejecting endpoint again
+
+        # --- several profiles at once with hedging ("llm.routing"); None uses `endpoint` only ---
+        self.router = router if router is not None else LLMRouter.from_config(llm_cfg, self._build_headers)
 
+        # --- logging: one batched sink per log dir, written off the request thread ---
+        self.telemetry = telemetry
+        if self.telemetry is None and (enable_logging or enable_reasoning_log):
+            self.telemetry = open_sink(log_dir)
+
+    def _build_headers(self, api_url: str, api_key: Optional[str] = None) -> Dict[str, str]:
         # --- auth & headers (OpenAI / Azure / local OpenAI-compatible) ---
-        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
-        self.headers: Dict[str, str] = {"Content-Type": "application/json"}
+        headers: Dict[str, str] = {"Content-Type": "application/json"}
+        api_key = api_key or self.api_key
 
-        if "openai.com" in self.api_url:
+        if "openai.com" in api_url:
             # Official OpenAI API
-            if self.api_key:
-                self.headers["Authorization"] = f"Bearer {self.api_key}"
+            if api_key:
+                headers["Authorization"] = f"Bearer {api_key}"
             org = os.environ.get("OPENAI_ORG_ID")
             if org:
-                self.headers["OpenAI-Organization"] = org
-        elif ".azure.com" in self.api_url:
+                headers["OpenAI-Organization"] = org
+        elif ".azure.com" in api_url:
             # Azure OpenAI (OpenAI-compatible path w/ api-version)
-            if self.api_key:
-                self.headers["api-key"] = self.api_key
+            if api_key:
+                headers["api-key"] = api_key
         else:
             # Local OpenAI-compatible servers
-            if self.api_key and "Authorization" not in self.headers and "api-key" not in self.headers:
-                self.headers["Authorization"] = f"Bearer {self.api_key}"
-
-        # --- logging dirs ---
-        self.log_root = Path(log_dir or os.environ.get("LLM_LOG_DIR", "logs"))
-        self.run_dir = self.log_root / time.strftime("%Y%m%d")
-        self.run_dir.mkdir(parents=True, exist_ok=True)
-        self.http_jsonl = self.run_dir / "http.jsonl"
-        self.assistant_jsonl = self.run_dir / "assistant_responses.jsonl"
-        self.thinking_jsonl = self.run_dir / "thinking.jsonl"
-        # legacy text logs (kept)
-        self.raw_log_path = str(self.run_dir / "llm_raw_log.txt")
-        self.reason_log_path = str(self.run_dir / "llm_reasoning_log.txt")
+            if api_key and "Authorization" not in headers and "api-key" not in headers:
+                headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+
+    def reconfigure(self, model: str, api_url: str):
+        """
+        Switches model/endpoint. Calls already in flight finish on the old
+        one; each call reads the (model, url, headers) triple once.
+        """
+        self.endpoint = (model, api_url, self._build_headers(api_url))
+        self.model, self.api_url, self.headers = self.endpoint
+
+    def set_routing(self, llm_cfg: dict):
+        """
+        Applies a reloaded "llm" section to the router, keeping the stats
+        of unchanged backends.
+        """
+        if not llm_cfg.get("routing", {}).get("enabled", False):
+            self.router = None
+        elif self.router is None:
+            self.router = LLMRouter.from_config(llm_cfg, self._build_headers)
+        else:
+            self.router.update(llm_cfg, self._build_headers)
 
     # ------------------ MAIN CALL ------------------
-    def _call_llm(self, prompt: str, domain_for_logging: str, max_tokens=768) -> dict:
+    def _call_llm(self, prompt: str, domain_for_logging: str, max_tokens=DEFAULT_MAX_TOKENS,
+                  schema: Optional[dict] = None, check: str = "") -> dict:
         """
         Each call is a fresh chat (no history). A unique chat_id is generated per request.
+        The result carries "timing_ms": time to first token, time to verdict and
+        total time (the stream is closed as soon as the verdict is parsed), and
+        "usage" (token counts, estimated when the server does not report them).
+        With routing enabled the router picks, hedges and fails over between
+        profiles and adds "backend".
+        """
+        router = self.router
+        if router is None:
+            return self._call_endpoint(self.endpoint, prompt, domain_for_logging, max_tokens, schema, check)
+        return router.call(lambda endpoint: self._call_endpoint(
+            endpoint, prompt, domain_for_logging, max_tokens, schema, check))
+
+    def _call_endpoint(self, endpoint, prompt: str, domain_for_logging: str, max_tokens: int,
+                       schema: Optional[dict], check: str) -> dict:
+        """
+        One logical call against one endpoint.
+
+        With a `schema` and structured output enabled, the reply is constrained
+        to that JSON object with the small structured token budget (reasoning
+        models keep the full one). Calls that get no verdict that way are asked
+        again the old way; an endpoint that rejects the constraint or keeps
+        ignoring it is asked the old way from the start for a while (see
+        _structured_outcome). A reply cut off by the budget before any answer
+        does not count against the endpoint.
+        """
+        api_url = endpoint[1]
+        mode = self.structured_output if schema is not None else "off"
+        if mode != "off" and self._structured_enabled(api_url):
+            budget = self.structured_max_tokens.get(check, DEFAULT_STRUCTURED_MAX_TOKENS)
+            if _counts_reasoning(endpoint[0]):
+                # Hidden reasoning is paid from the same budget; a short one leaves nothing for the answer
+                budget = max(budget, max_tokens)
+            result, status, content, finish = self._request(endpoint, prompt, domain_for_logging, budget,
+                                                            schema, mode, check)
+            answered = result.get("verdict") not in (None, "Error")
+            # Judge the answer, not the reasoning some servers put before it
+            answer = _THINK_PREFIX.sub("", content or "", count=1).lstrip()
+            if status == 200 and answer.startswith("{"):
+                self._structured_outcome(api_url, True, mode)
+                if answered:
+                    return result
+                # Honoured but cut short (budget spent): only this call falls back
+            elif status == 200 and finish == "length" and not answer:
+                pass  # the budget ran out before any answer: says nothing about the constraint
+            elif status == 200 or status in _UNSUPPORTED_STATUS:
+                # Free text, an empty reply or a rejected request
+                self._structured_outcome(api_url, False, mode, rejected=status != 200)
+                if answered:
+                    return result
+            else:
+                return result  # transport or server error: not the constraint's fault
+        return self._request(endpoint, prompt, domain_for_logging, max_tokens)[0]
+
+    def _structured_enabled(self, api_url: str) -> bool:
+        if self.structured_support.get(api_url) is not False:
+            return True
+        return time.monotonic() >= self.structured_retry_at.get(api_url, 0.0)
+
+    def _structured_outcome(self, api_url: str, honoured: bool, mode: str, rejected: bool = False):
+        """
+        Records how an endpoint treated a constrained request. A rejection
+        turns constraints off for it at once, free-text or empty replies
+        after STRUCTURED_MAX_MISSES in a row; either way they are tried
+        again after STRUCTURED_RETRY_S.
+        """
+        if honoured:
+            self.structured_support[api_url] = True
+            self.structured_misses[api_url] = 0
+            return
+        misses = self.structured_misses.get(api_url, 0) + 1
+        if not rejected and misses < STRUCTURED_MAX_MISSES:
+            self.structured_misses[api_url] = misses
+            return
+        if self.structured_support.get(api_url) is not False:
+            print(f"[LLM] {api_url} does not honour {mode} output; using free-form replies")
+        self.structured_support[api_url] = False
+        self.structured_misses[api_url] = 0
+        self.structured_retry_at[api_url] = time.monotonic() + STRUCTURED_RETRY_S
+
+    def _request(self, endpoint, prompt: str, domain_for_logging: str, max_tokens: int,
+                 schema: Optional[dict] = None, mode: str = "off", check: str = ""):
+        """
+        One completion; returns (result, HTTP status or None, content or None,
+        finish_reason or None).
         """
         chat_id = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        model, api_url, headers = endpoint
 
+        if mode != "off":
+            system = "You are a cybersecurity analyst. Reply with only the requested JSON object."
+        else:
+            system = (
+                "You are a cybersecurity analyst. Think carefully and reason internally, "
+                'but end your message with ONLY a single JSON object in this format: '
+                '{"verdict":"Safe|Malicious|Likely Phishing|Possibly Legitimate","mimics":null|"example.com"}'
+            )
         payload = {
-            "model": self.model,
+            "model": model,
             "messages": [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a cybersecurity analyst. Think carefully and reason internally, "
-                        'but end your message with ONLY a single JSON object in this format: '
-                        '{"verdict":"Safe|Malicious|Likely Phishing|Possibly Legitimate","mimics":null|"example.com"}'
-                    ),
-                },
+                {"role": "system", "content": system},
                 {"role": "user", "content": prompt},
             ],
         }
+        if mode == "json_schema":
+            payload["response_format"] = {"type": "json_schema", "json_schema": {
+                "name": f"{check or 'verdict'}_result", "strict": True, "schema": schema}}
+        elif mode == "json_object":
+            payload["response_format"] = {"type": "json_object"}
+        elif mode == "grammar":
+            payload["grammar"] = build_grammar(schema)
         # Token field compatibility
-        m = (self.model or "").lower()
-        if m.startswith("gpt-5") or m.startswith("gpt-4o"):
+        if _counts_reasoning(model) or (model or "").lower().startswith("gpt-4o"):
             payload["max_completion_tokens"] = max_tokens
         else:
             payload["max_tokens"] = max_tokens
+        stream = self.stream
+        if stream:
+            payload["stream"] = True
 
         start = time.perf_counter()
-        response = None
+        response = data = content = error = None
+        timing = {}
         try:
             response = requests.post(
-                self.api_url,
-                headers=self.headers,
+                api_url,
+                headers=headers,
                 json=payload,
                 timeout=self.timeout,
+                stream=stream,
             )
             latency_ms = (time.perf_counter() - start) * 1000
 
-            if self.enable_logging:
-                self._log_http(domain_for_logging, payload, response, latency_ms, chat_id=chat_id)
-
             if response.status_code != 200:
-                return {
+                result = {
                     "verdict": "Error",
                     "reason": f"HTTP {response.status_code}: {response.text[:300]}",
                 }
+            elif stream and response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                result, content, data, timing = self._read_stream(response, start)
+                latency_ms = timing["total_ms"]
+            else:
+                # Also the answer of servers that ignore "stream"
+                data = response.json()
+                content = self._extract_content(data)
+                result = self._parse_json(content)
+                latency_ms = (time.perf_counter() - start) * 1000
+                timing = {"ttft_ms": latency_ms, "ttv_ms": latency_ms, "total_ms": latency_ms}
 
-            content = self._extract_content(response.json())
-
-            if self.enable_logging:
-                self._log_assistant(domain_for_logging, content, chat_id=chat_id)
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            error = e
+            result = {"verdict": "Error", "reason": str(e)}
+        finally:
+            if stream and response is not None:
+                response.close()
+        if timing:
+            result["timing_ms"] = {k: None if v is None else round(v, 1) for k, v in timing.items()}
+        if getattr(response, "status_code", None) == 200:
+            result["usage"] = self._usage(data, payload, content)
 
-            if self.enable_reasoning_log:
-                think = re.search(r"<think>([\s\S]*?)</think>", content)
-                if think:
-                    with open(self.reason_log_path, "a", encoding="utf-8") as f:
-                        f.write(f"\n[{domain_for_logging}] ({chat_id})\n")
-                        f.write(think.group(1).strip() + "\n" + "-" * 70 + "\n")
+        if self.telemetry is not None:
+            if data is None and response is not None:
+                data = getattr(response, "text", None)
+            self.telemetry.record(
+                domain=domain_for_logging, model=model, chat_id=chat_id, latency_ms=latency_ms,
+                payload=payload, status=getattr(response, "status_code", None), response=data,
+                content=content, result=result, error=error, timing=timing,
+                http=self.enable_logging, reasoning=self.enable_reasoning_log,
+            )
+        finish = None
+        if isinstance(data, dict):
+            # Streams summarise it; full responses carry it per choice
+            choices = data.get("choices") or [{}]
+            finish = data.get("finish_reason") or (choices[0] or {}).get("finish_reason")
+        return result, getattr(response, "status_code", None), content, finish
 
-            match = re.search(r"\{[\s\S]*\}", content)
-            if match:
+    # ------------------ HELPERS ------------------
+    def _read_stream(self, response, start: float):
+        """
+        Reads SSE chunks until a verdict object is complete; returns
+        (result, content so far, summary for the logs, timing).
+        """
+        scanner = VerdictScanner()
+        parts, reasoning = [], []
+        pending = b""
+        chunks = 0
+        finish = None
+        result = None
+        ttft = None
+        read = getattr(response.raw, "read1", None)  # whatever has arrived, not a fixed size
+        # decode_content: proxies often gzip SSE, and requests leaves raw reads undecoded
+        blocks = (iter(lambda: read(8192, decode_content=True), b"") if read
+                  else response.iter_content(chunk_size=None))
+        for block in blocks:
+            pending += block
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                chunk = line[5:].strip()
+                if chunk == b"[DONE]":
+                    break
                 try:
-                    return json.loads(match.group())
-                except json.JSONDecodeError:
-                    return {"verdict": "Error", "reason": "Invalid JSON format"}
+                    choice = json.loads(chunk)["choices"][0]
+                except (ValueError, KeyError, IndexError):
+                    continue
+                chunks += 1
+                delta = choice.get("delta") or {}
+                finish = choice.get("finish_reason") or finish
+                if delta.get("reasoning_content"):
+                    reasoning.append(delta["reasoning_content"])  # servers that split out <think>
+                text = delta.get("content") or ""
+                if not text:
+                    continue
+                if ttft is None:
+                    ttft = (time.perf_counter() - start) * 1000
+                parts.append(text)
+                result = scanner.feed(text)
+                if result is not None:
+                    break
+            else:
+                continue
+            break
 
-            return {"verdict": "Error", "reason": "No JSON found in LLM response"}
+        now = (time.perf_counter() - start) * 1000
+        content = "".join(parts)
+        if reasoning:
+            content = f"<think>{''.join(reasoning)}</think>{content}"
+        if result is None:
+            # Stream ended without a verdict object: same fallback as a full response
+            result = self._parse_json(content)
+        summary = {"stream": True, "chunks": chunks, "finish_reason": finish or "early_exit"}
+        timing = {"ttft_ms": ttft, "ttv_ms": now if "verdict" in result and result["verdict"] != "Error" else None,
+                  "total_ms": now}
+        return result, content, summary, timing
 
-        except Exception as e:
-            latency_ms = (time.perf_counter() - start) * 1000
-            if self.enable_logging:
-                self._log_http(domain_for_logging, payload, response, latency_ms, error=e, chat_id=chat_id)
-            return {"verdict": "Error", "reason": str(e)}
+    @staticmethod
+    def _usage(data, payload: dict, content: Optional[str]) -> dict:
+        usage = data.get("usage") if isinstance(data, dict) else None
+        if usage and usage.get("completion_tokens"):
+            return {"prompt_tokens": usage.get("prompt_tokens", 0), "completion_tokens": usage["completion_tokens"]}
+        # Streams and some local servers report nothing: ~4 characters per token
+        prompt_chars = sum(len(m["content"]) for m in payload["messages"])
+        return {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content or "") // 4,
+                "estimated": True}
 
-    # ------------------ HELPERS ------------------
     def _extract_content(self, data: dict) -> str:
         try:
             return data["choices"][0]["message"]["content"]
         except Exception:
             return json.dumps(data)
 
-    def _write_jsonl(self, path: Path, record: Dict[str, Any]):
-        try:
-            path.parent.mkdir(parents=True, exist_ok=True)
-            with open(path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
-        except Exception:
-            pass
-
-    def _log_http(self, domain, payload, response, latency_ms, error=None, chat_id=None):
-        rec: Dict[str, Any] = {
-            "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "chat_id": chat_id,
-            "domain": domain,
-            "latency_ms": round(latency_ms, 2),
-            "request": payload,
-            "status": getattr(response, "status_code", None),
-        }
-        try:
-            if response is not None:
-                try:
-                    rec["response"] = response.json()
-                except Exception:
-                    rec["response_text"] = getattr(response, "text", None)
-        except Exception:
-            pass
-        if error:
-            rec["error"] = str(error)
-        self._write_jsonl(self.http_jsonl, rec)
+    def _parse_json(self, content: str) -> dict:
+        match = re.search(r"\{[\s\S]*\}", content)
+        if match:
+            try:
+                return json.loads(match.group())
+            except json.JSONDecodeError:
+                return {"verdict": "Error", "reason": "Invalid JSON format"}
 
-        # legacy flat log
-        try:
-            with open(self.raw_log_path, "a", encoding="utf-8") as f:
-                f.write(f"\nTime: {rec['ts']}\n")
-                f.write(f"Chat: {chat_id}\n")
-                f.write(f"Domain: {domain}\n")
-                f.write(f"Latency(ms): {rec['latency_ms']:.2f}\n")
-                f.write(f"Request Payload: {json.dumps(payload, indent=2)}\n")
-                f.write(f"Response Status: {rec.get('status')}\n")
-                if 'response' in rec:
-                    f.write(f"Response JSON: {json.dumps(rec['response'], ensure_ascii=False)[:20000]}\n")
-                elif 'response_text' in rec and rec['response_text'] is not None:
-                    f.write(f"Response Body: {rec['response_text'][:20000]}\n")
-                if error:
-                    f.write(f"Error: {error}\n")
-                f.write("-" * 80 + "\n")
-        except Exception:
-            pass
-
-    def _log_assistant(self, domain: str, content: str, chat_id=None):
-        rec = {
-            "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "chat_id": chat_id,
-            "domain": domain,
-            "assistant_content": content,
-        }
-        self._write_jsonl(self.assistant_jsonl, rec)
-        think = re.search(r"<think>([\s\S]*?)</think>", content)
-        if think:
-            self._write_jsonl(self.thinking_jsonl, {
-                "ts": rec["ts"],
-                "chat_id": chat_id,
-                "domain": domain,
-                "thinking": think.group(1).strip(),
-            })
+        return {"verdict": "Error", "reason": "No JSON found in LLM response"}
 
     #===================================================================================================
     def san_check(self, domain: str, san_list: list[str]) -> dict:
@@ -213,7 +491,9 @@ class LLMClient:
         )
 
         # FIX: pass domain_for_logging
-        return self._call_llm(prompt, domain_for_logging=domain)
+        return self._call_llm(prompt, domain_for_logging=domain,
+                              max_tokens=self.max_tokens.get("san_check", DEFAULT_MAX_TOKENS),
+                              schema=SAN_SCHEMA, check="san_check")
 
     #===================================================================================================
     def phishing_check(self, domain: str, title: str = "", **kwargs) -> dict:
@@ -223,4 +503,6 @@ class LLMClient:
             "Return ONLY JSON: "
             '{"verdict":"Safe|Malicious|Likely Phishing|Possibly Legitimate","mimics":null|"example.com"}'
         )
-        return self._call_llm(prompt, domain_for_logging=domain)
+        return self._call_llm(prompt, domain_for_logging=domain,
+                              max_tokens=self.max_tokens.get("phishing_check", DEFAULT_MAX_TOKENS),
+                              schema=PHISHING_SCHEMA, check="phishing_check")
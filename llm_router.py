@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# llm_router.py — several LLM profiles at once, with hedged requests
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BASE_DIR, "config")
+STATUS_FILE = os.path.join(CONFIG_DIR, "llm_backends.json")
+
+
+def _failed(result: Optional[dict]) -> bool:
+    return not result or result.get("verdict") == "Error"
+
+
+class Backend:
+    """
+    One LLM profile as a routing target: a rolling window of its latencies
+    and failures, plus running request, token and cost totals.
+    """
+
+    def __init__(self, name, model, api_url, headers, *, cost_per_1k_prompt=0.0,
+                 cost_per_1k_completion=0.0, window=200):
+        self.name = name
+        self.endpoint = (model, api_url, headers)
+        self.cost_per_1k_prompt = float(cost_per_1k_prompt)
+        self.cost_per_1k_completion = float(cost_per_1k_completion)
+        self.latencies = deque(maxlen=window)  # ms, successful calls only
+        self.outcomes = deque(maxlen=window)   # True for a failed call
+        self.tripped_until = 0.0
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "errors": 0, "hedges": 0, "failovers": 0, "wins": 0,
+                         "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self.lock:
+            data = sorted(self.latencies)
+        if not data:
+            return None
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    def error_rate(self) -> float:
+        with self.lock:
+            return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def observe(self, latency_ms: float, result: Optional[dict]):
+        failed = _failed(result)
+        usage = (result or {}).get("usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        with self.lock:
+            self.outcomes.append(failed)
+            if not failed:
+                self.latencies.append(latency_ms)
+            c = self.counters
+            c["requests"] += 1
+            c["errors"] += failed
+            c["prompt_tokens"] += prompt
+            c["completion_tokens"] += completion
+            c["cost"] += prompt / 1000 * self.cost_per_1k_prompt + completion / 1000 * self.cost_per_1k_completion
+
+    def status(self) -> dict:
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        with self.lock:
+            counters = dict(self.counters)
+        return {
+            "name": self.name, "model": self.endpoint[0], "api_url": self.endpoint[1],
+            "p50_ms": p50 and round(p50, 1), "p95_ms": p95 and round(p95, 1),
+            "error_rate": round(self.error_rate(), 3),
+            "tripped": self.tripped_until > time.monotonic(),
+            **counters, "cost": round(counters["cost"], 6),
+        }
+
+
+class LLMRouter:
+    """
+    Sends each call to the first healthy profile in `routing.profiles`
+    (cheapest first). If no answer has arrived by that backend's observed
+    p95 (`hedge_quantile`), the same call is also sent to the next backend,
+    fastest observed first, and the first successful answer wins. A failed
+    answer fails over to the next backend immediately.
+
+    Hedges stop once they reach `max_hedge_ratio` of the last `window`
+    calls, so the extra cost stays bounded. A backend failing more than
+    `max_error_rate` of its recent calls is moved to the end for `trip_s`
+    seconds. Losing requests still finish in the background and count
+    towards their backend's latency, tokens and cost.
+    """
+
+    def __init__(self, backends: List[Backend], *, hedge_quantile=0.95, hedge_after_ms=2000.0,
+                 min_hedge_ms=100.0, min_samples=20, max_hedge_ratio=0.1, max_error_rate=0.5,
+                 trip_s=30.0, window=200, report_interval=10.0, status_file=STATUS_FILE, max_workers=32):
+        self.backends = backends
+        self.hedge_quantile = hedge_quantile
+        self.hedge_after_ms = hedge_after_ms
+        self.min_hedge_ms = min_hedge_ms
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.max_error_rate = max_error_rate
+        self.trip_s = trip_s
+        self.window = window
+        self.recent = deque(maxlen=window)  # True for a call that hedged
+        self.report_interval = report_interval
+        self.status_file = status_file
+        self.last_report = 0.0
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-route")
+
+    @staticmethod
+    def _backends(llm_cfg: dict, build_headers: Callable, window: int) -> List[Backend]:
+        profiles = llm_cfg.get("profiles", {})
+        backends = []
+        for name in llm_cfg.get("routing", {}).get("profiles", []):
+            p = profiles.get(name)
+            if not p:
+                print(f"[ROUTER ERROR] Unknown LLM profile {name!r}")
+                continue
+            headers = build_headers(p["api_url"], os.environ.get(p.get("api_key_env") or ""))
+            backends.append(Backend(name, p["model"], p["api_url"], headers,
+                                    cost_per_1k_prompt=p.get("cost_per_1k_prompt", 0.0),
+                                    cost_per_1k_completion=p.get("cost_per_1k_completion", 0.0),
+                                    window=window))
+        return backends
+
+    @classmethod
+    def from_config(cls, llm_cfg: dict, build_headers: Callable) -> Optional["LLMRouter"]:
+        """
+        `build_headers(api_url, api_key)` gives each profile its auth
+        headers. None unless routing is enabled with at least one profile.
+        """
+        cfg = llm_cfg.get("routing", {})
+        if not cfg.get("enabled", False):
+            return None
+        window = cfg.get("window", 200)
+        backends = cls._backends(llm_cfg, build_headers, window)
+        if not backends:
+            return None
+        return cls(
+            backends,
+            hedge_quantile=cfg.get("hedge_quantile", 0.95),
+            hedge_after_ms=cfg.get("hedge_after_ms", 2000),
+            min_hedge_ms=cfg.get("min_hedge_ms", 100),
+            min_samples=cfg.get("min_samples", 20),
+            max_hedge_ratio=cfg.get("max_hedge_ratio", 0.1),
+            max_error_rate=cfg.get("max_error_rate", 0.5),
+            trip_s=cfg.get("trip_s", 30),
+            window=window,
+        )
+
+    def update(self, llm_cfg: dict, build_headers: Callable):
+        """
+        Applies a reloaded config; backends whose model and URL are
+        unchanged keep their statistics (`window` applies on restart).
+        """
+        old = {(b.name, b.endpoint[:2]): b for b in self.backends}
+        fresh = []
+        for b in self._backends(llm_cfg, build_headers, self.window):
+            kept = old.get((b.name, b.endpoint[:2]))
+            if kept is not None:
+                kept.endpoint = b.endpoint  # headers may have changed
+                kept.cost_per_1k_prompt = b.cost_per_1k_prompt
+                kept.cost_per_1k_completion = b.cost_per_1k_completion
+                b = kept
+            fresh.append(b)
+        if fresh:
+            self.backends = fresh
+        cfg = llm_cfg.get("routing", {})
+        self.hedge_quantile = cfg.get("hedge_quantile", self.hedge_quantile)
+        self.hedge_after_ms = cfg.get("hedge_after_ms", self.hedge_after_ms)
+        self.min_hedge_ms = cfg.get("min_hedge_ms", self.min_hedge_ms)
+        self.min_samples = cfg.get("min_samples", self.min_samples)
+        self.max_hedge_ratio = cfg.get("max_hedge_ratio", self.max_hedge_ratio)
+        self.max_error_rate = cfg.get("max_error_rate", self.max_error_rate)
+        self.trip_s = cfg.get("trip_s", self.trip_s)
+
+    # ---------- Routing ----------
+
+    def order(self) -> List[Backend]:
+        """
+        Primary first (first healthy in config order), then the other
+        healthy backends fastest first, then tripped ones as a last resort.
+        """
+        now = time.monotonic()
+        healthy, tripped = [], []
+        for b in self.backends:
+            if b.tripped_until <= now and len(b.outcomes) >= 5 and b.error_rate() > self.max_error_rate:
+                b.tripped_until = now + self.trip_s
+                with b.lock:
+                    b.outcomes.clear()  # probe afresh once the trip ends
+                print(f"[ROUTER] {b.name} failing, deprioritised for {self.trip_s:.0f}s")
+            (healthy if b.tripped_until <= now else tripped).append(b)
+        if not healthy:
+            return tripped
+        # Untried backends sort first so they get measured
+        rest = sorted(healthy[1:], key=lambda b: b.quantile(0.5) or 0.0)
+        return [healthy[0], *rest, *tripped]
+
+    def hedge_delay(self, backend: Backend) -> float:
+        """
+        Seconds to wait on `backend` before hedging: its observed quantile
+        once it has enough samples, `hedge_after_ms` until then.
+        """
+        ms = self.hedge_after_ms
+        if len(backend.latencies) >= self.min_samples:
+            ms = max(self.min_hedge_ms, backend.quantile(self.hedge_quantile))
+        return ms / 1000
+
+    def _may_hedge(self) -> bool:
+        # At most max_hedge_ratio * window hedges among the last `window`
+        # calls, so a few early hedges don't block the next ones
+        with self.lock:
+            return sum(self.recent) < self.max_hedge_ratio * self.recent.maxlen
+
+    def _run(self, fn, backend: Backend):
+        t0 = time.perf_counter()
+        try:
+            result = fn(backend.endpoint)
+        except Exception as e:
+            result = {"verdict": "Error", "reason": str(e)}
+        backend.observe((time.perf_counter() - t0) * 1000, result)
+        return result
+
+    def call(self, fn: Callable[[tuple], dict]) -> dict:
+        """
+        Runs `fn(endpoint)` on the routed backend(s) and returns the first
+        successful result (tagged with "backend"), or the last failure.
+        """
+        ranked = self.order()
+        pending = {}
+        started = 0
+        hedged = False
+        may_hedge = len(ranked) > 1 and self._may_hedge()
+
+        def launch(kind=None):
+            nonlocal started
+            backend = ranked[started]
+            started += 1
+            if kind:
+                with backend.lock:
+                    backend.counters[kind] += 1
+            pending[self.pool.submit(self._run, fn, backend)] = backend
+            return backend
+
+        deadline = time.monotonic() + self.hedge_delay(launch())
+        last = None
+        try:
+            while pending:
+                can_launch = started < len(ranked)
+                timeout = max(0.0, deadline - time.monotonic()) if can_launch and may_hedge else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    backend = pending.pop(future)
+                    result = future.result()
+                    if not _failed(result):
+                        if started > 1:
+                            with backend.lock:
+                                backend.counters["wins"] += 1
+                        result["backend"] = backend.name
+                        return result
+                    last = result
+                if not can_launch:
+                    continue
+                if done and not pending:
+                    deadline = time.monotonic() + self.hedge_delay(launch("failovers"))
+                elif not done:
+                    hedged = True
+                    deadline = time.monotonic() + self.hedge_delay(launch("hedges"))
+            return last
+        finally:
+            with self.lock:
+                self.recent.append(hedged)
+            self.maybe_report()
+
+    # ---------- Reporting ----------
+
+    def status(self) -> dict:
+        with self.lock:
+            ratio = sum(self.recent) / len(self.recent) if self.recent else 0.0
+        return {"updated_at": time.time(), "hedge_ratio": round(ratio, 3),
+                "backends": [b.status() for b in self.backends]}
+
+    def maybe_report(self):
+        """
+        Writes per-backend stats for the dashboard at most every
+        `report_interval` seconds.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_report < self.report_interval:
+                return
+            self.last_report = now
+        try:
+            tmp = f"{self.status_file}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.status(), f, indent=2)
+            os.replace(tmp, self.status_file)
+        except OSError as e:
+            print(f"[ROUTER ERROR] status: {e}")
+
+
+# ---------- Benchmark ----------
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def benchmark(calls=400, local="lognormal:300,0.6", cloud="fixed:250", concurrency=8) -> dict:
+    """
+    Local and cloud mock backends, the local one with a heavy tail:
+    latency percentiles and calls per backend with routing only to local
+    and with hedging to cloud.
+    """
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor as Pool
+    from llm_client import LLMClient
+    from mock_llm import MockLLMServer
+
+    servers = {"local": MockLLMServer(latency=local).start(), "cloud": MockLLMServer(latency=cloud).start()}
+    report = {}
+    try:
+        for label, profiles in (("local_only", ["local"]), ("hedged", ["local", "cloud"])):
+            llm_cfg = {
+                "profiles": {name: {"model": name, "api_url": srv.url, "cost_per_1k_prompt": 0.0 if name == "local" else 1.0,
+                                    "cost_per_1k_completion": 0.0 if name == "local" else 4.0}
+                             for name, srv in servers.items()},
+                "routing": {"enabled": True, "profiles": profiles, "hedge_after_ms": 1000, "min_samples": 20},
+            }
+            client = LLMClient("local", servers["local"].url, stream=False, max_tokens={},
+                               structured_output="json_schema", structured_max_tokens={})
+            client.router = LLMRouter.from_config(llm_cfg, client._build_headers)
+            client.router.status_file = os.path.join(tempfile.gettempdir(), "llm_backends_bench.json")
+            times = []
+
+            def one(i):
+                t0 = time.perf_counter()
+                client.phishing_check(f"bench-{label}-{i}.com")
+                times.append((time.perf_counter() - t0) * 1000)
+
+            with Pool(concurrency) as pool:
+                list(pool.map(one, range(calls)))
+            time.sleep(0.5)  # let losing requests finish so they are counted
+            status = client.router.status()
+            report[label] = {
+                "p50_ms": round(_percentile(times, 0.5), 1),
+                "p95_ms": round(_percentile(times, 0.95), 1),
+                "p99_ms": round(_percentile(times, 0.99), 1),
+                "max_ms": round(max(times), 1),
+                "hedge_ratio": status["hedge_ratio"],
+                "requests": {b["name"]: b["requests"] for b in status["backends"]},
+                "cost": {b["name"]: b["cost"] for b in status["backends"]},
+            }
+    finally:
+        for srv in servers.values():
+            srv.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hedged LLM routing benchmark against mock backends")
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--local", default="lognormal:300,0.6", help="local latency spec (see mock_llm.py)")
+    parser.add_argument("--cloud", default="fixed:250", help="cloud latency spec")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.calls, args.local, args.cloud, args.concurrency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
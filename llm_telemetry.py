@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# llm_telemetry.py — batched, rotated and compressed LLM call logs
+
+import argparse
+import atexit
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+THINK_RE = re.compile(r"<think>([\s\S]*?)</think>")
+DAY_FORMAT = "%Y%m%d"
+
+
+def truncate(value, limit: int):
+    """
+    Copies `value` with every string longer than `limit` cut short
+    (0 keeps everything).
+    """
+    if not limit:
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= limit else f"{value[:limit]}…[+{len(value) - limit} chars]"
+    if isinstance(value, dict):
+        return {k: truncate(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [truncate(v, limit) for v in value]
+    return value
+
+
+class TelemetrySink:
+    """
+    One structured record per LLM call, appended to
+    `<log_dir>/<YYYYmmdd>/llm.jsonl` by a background writer.
+
+    record() only queues the raw call data; truncation, JSON encoding and
+    file writes happen in batches on the writer thread. The day directory
+    comes from each record's own timestamp, and once a later day is
+    written the earlier days' files are gzipped. `sample_rate` keeps
+    request/response bodies for that share of successful calls (failed
+    calls always keep them); every record keeps its metadata and parsed
+    result. With `legacy_text` the old http.jsonl, assistant_responses.jsonl,
+    thinking.jsonl and llm_raw_log.txt files are written as well.
+    """
+
+    def __init__(self, log_dir="logs", *, sample_rate=1.0, max_field_chars=4000, compress=True,
+                 legacy_text=False, flush_interval=1.0, max_queue=10000):
+        self.root = Path(log_dir)
+        self.sample_rate = float(sample_rate)
+        self.max_field_chars = int(max_field_chars)
+        self.compress = compress
+        self.legacy_text = legacy_text
+        self.flush_interval = flush_interval
+        self.max_queue = int(max_queue)
+        self.queue = []
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.thread = None
+        self.last_day = None
+        self.stats = {"records": 0, "written": 0, "dropped": 0, "compressed": 0}
+        self.random = random.random
+
+    @classmethod
+    def from_config(cls, cfg: dict, log_dir=None) -> "TelemetrySink":
+        return cls(
+            log_dir or cfg.get("log_dir", "logs"),
+            sample_rate=cfg.get("sample_rate", 1.0),
+            max_field_chars=cfg.get("max_field_chars", 4000),
+            compress=cfg.get("compress", True),
+            legacy_text=cfg.get("legacy_text", False),
+            flush_interval=cfg.get("flush_interval_s", 1.0),
+            max_queue=cfg.get("max_queue", 10000),
+        )
+
+    # ---------- Recording ----------
+
+    def record(self, *, domain, model, chat_id, latency_ms, payload, status=None, response=None,
+               content=None, result=None, error=None, timing=None, http=True, reasoning=False):
+        """
+        Queues one call. `http` logs the call itself, `reasoning` its
+        <think> block (the two logging toggles of LLMClient).
+        """
+        ts = time.time()
+        keep_bodies = error is not None or status != 200 or self.random() < self.sample_rate
+        rec = (ts, domain, model, chat_id, latency_ms, status, error, result, timing,
+               payload if keep_bodies else None, response if keep_bodies else None,
+               content if keep_bodies or reasoning else None, keep_bodies, http, reasoning)
+        with self.cond:
+            self.stats["records"] += 1
+            if len(self.queue) >= self.max_queue:
+                self.stats["dropped"] += 1
+                return
+            self.queue.append(rec)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="llm-telemetry", daemon=True)
+                self.thread.start()
+
+    # ---------- Writer ----------
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait(timeout=self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[TELEMETRY ERROR] {e}")
+
+    def flush(self):
+        """
+        Writes everything queued so far.
+        """
+        with self.write_lock:
+            with self.cond:
+                batch, self.queue = self.queue, []
+            if not batch:
+                return
+            files: Dict[Path, list] = {}
+            for rec in batch:
+                for path, line in self._render(*rec):
+                    files.setdefault(path, []).append(line)
+            for path, lines in files.items():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            self.stats["written"] += len(batch)
+
+            day = time.strftime(DAY_FORMAT, time.localtime(batch[-1][0]))
+            if self.compress and day != self.last_day:
+                self.compress_before(day)
+            self.last_day = day
+
+    def close(self):
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"[TELEMETRY ERROR] {e}")
+
+    def _render(self, ts, domain, model, chat_id, latency_ms, status, error, result, timing,
+                payload, response, content, bodies, http, reasoning):
+        limit = self.max_field_chars
+        day_dir = self.root / time.strftime(DAY_FORMAT, time.localtime(ts))
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+        think = THINK_RE.search(content) if content else None
+        out = []
+
+        if http:
+            rec: Dict[str, Any] = {
+                "ts": stamp, "chat_id": chat_id, "domain": domain, "model": model,
+                "latency_ms": round(latency_ms, 2), "status": status, "result": result,
+            }
+            if timing:
+                rec["timing_ms"] = {k: None if v is None else round(v, 2) for k, v in timing.items()}
+            if error is not None:
+                rec["error"] = str(error)
+            if bodies:
+                rec["request"] = truncate(payload, limit)
+                if isinstance(response, (dict, list)):
+                    rec["response"] = truncate(response, limit)
+                elif response is not None:
+                    rec["response_text"] = truncate(response, limit)
+                # Stored apart so a long reasoning block never truncates the answer
+                rec["content"] = truncate(THINK_RE.sub("", content).strip() if think else content, limit)
+                if think:
+                    rec["thinking"] = truncate(think.group(1).strip(), limit)
+            else:
+                rec["sampled_out"] = True
+            out.append((day_dir / "llm.jsonl", json.dumps(rec, ensure_ascii=False) + "\n"))
+            if self.legacy_text and bodies:
+                out += self._legacy(day_dir, rec, payload, response, content, think)
+
+        if reasoning and think:
+            out.append((day_dir / "llm_reasoning_log.txt",
+                        f"\n[{domain}] ({chat_id})\n{think.group(1).strip()}\n{'-' * 70}\n"))
+        return out
+
+    @staticmethod
+    def _legacy(day_dir, rec, payload, response, content, think):
+        """
+        The pre-telemetry files, in their original formats.
+        """
+        base = {"ts": rec["ts"], "chat_id": rec["chat_id"], "domain": rec["domain"]}
+        http = {**base, "latency_ms": rec["latency_ms"], "request": payload, "status": rec["status"]}
+        if isinstance(response, (dict, list)):
+            http["response"] = response
+        elif response is not None:
+            http["response_text"] = response
+        if "error" in rec:
+            http["error"] = rec["error"]
+        out = [(day_dir / "http.jsonl", json.dumps(http, ensure_ascii=False) + "\n")]
+
+        raw = [f"\nTime: {rec['ts']}\n", f"Chat: {rec['chat_id']}\n", f"Domain: {rec['domain']}\n",
+               f"Latency(ms): {rec['latency_ms']:.2f}\n",
+               f"Request Payload: {json.dumps(payload, indent=2)}\n",
+               f"Response Status: {rec['status']}\n"]
+        if "response" in http:
+            raw.append(f"Response JSON: {json.dumps(response, ensure_ascii=False)[:20000]}\n")
+        elif http.get("response_text") is not None:
+            raw.append(f"Response Body: {response[:20000]}\n")
+        if "error" in rec:
+            raw.append(f"Error: {rec['error']}\n")
+        raw.append("-" * 80 + "\n")
+        out.append((day_dir / "llm_raw_log.txt", "".join(raw)))
+
+        if content is not None:
+            out.append((day_dir / "assistant_responses.jsonl",
+                        json.dumps({**base, "assistant_content": content}, ensure_ascii=False) + "\n"))
+            if think:
+                out.append((day_dir / "thinking.jsonl",
+                            json.dumps({**base, "thinking": think.group(1).strip()}, ensure_ascii=False) + "\n"))
+        return out
+
+    # ---------- Rotation ----------
+
+    def compress_before(self, day: str):
+        """
+        Gzips the log files of day directories older than `day`. Lines
+        written late to an already compressed file are appended to its .gz
+        as another gzip member.
+        """
+        if not self.root.is_dir():
+            return
+        for day_dir in self.root.iterdir():
+            if not (day_dir.is_dir() and day_dir.name.isdigit() and day_dir.name < day):
+                continue
+            for path in day_dir.iterdir():
+                if path.suffix not in (".jsonl", ".txt"):
+                    continue
+                with open(path, "rb") as src, gzip.open(f"{path}.gz", "ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                path.unlink()
+                self.stats["compressed"] += 1
+
+
+# ---------- Registry ----------
+
+_sinks: Dict[str, TelemetrySink] = {}
+_sinks_lock = threading.Lock()
+
+
+def open_sink(log_dir: Optional[str] = None) -> TelemetrySink:
+    """
+    The process-wide sink for `log_dir`, configured from config.json's
+    "logging" section and flushed at exit.
+    """
+    from settings import config
+    cfg = config.get("logging", {})
+    log_dir = os.path.abspath(log_dir or os.environ.get("LLM_LOG_DIR") or cfg.get("log_dir", "logs"))
+    with _sinks_lock:
+        sink = _sinks.get(log_dir)
+        if sink is None:
+            sink = _sinks[log_dir] = TelemetrySink.from_config(cfg, log_dir)
+            atexit.register(sink.close)
+        return sink
+
+
+# ---------- Benchmark ----------
+
+def _bench_call(i):
+    prompt = f"Analyze domain `login-{i}.example-bank.com`. Return ONLY JSON: " + "x" * 200
+    payload = {"model": "bench", "max_tokens": 768, "messages": [
+        {"role": "system", "content": "You are a cybersecurity analyst. " * 8},
+        {"role": "user", "content": prompt}]}
+    content = "<think>" + "reasoning " * 300 + '</think>{"verdict":"Safe","mimics":null}'
+    response = {"id": f"chatcmpl-{i}", "choices": [{"message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 120, "completion_tokens": 700}}
+    return payload, response, content
+
+
+def benchmark(calls=2000, **sink_kwargs) -> dict:
+    """
+    Per-call time spent on the calling thread: the old synchronous writes
+    (four files opened per call, pretty-printed payload) against
+    record(), plus the time the writer needs to drain the same calls.
+    """
+    results = {}
+    data = [_bench_call(i) for i in range(calls)]
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = TelemetrySink(os.path.join(tmp, "sync"), legacy_text=True, compress=False)
+        t0 = time.perf_counter()
+        for i, (payload, response, content) in enumerate(data):
+            rec = (time.time(), f"d{i}", "bench", f"c{i}", 100.0, 200, None, None, None,
+                   payload, response, content, True, True, False)
+            for path, line in legacy._render(*rec):
+                if path.name == "llm.jsonl":
+                    continue  # not written before the sink existed
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        results["sync_legacy_us"] = (time.perf_counter() - t0) / calls * 1e6
+
+        sink = TelemetrySink(os.path.join(tmp, "async"), flush_interval=3600, **sink_kwargs)
+        t0 = time.perf_counter()
+        for i, (payload, response, content) in enumerate(data):
+            sink.record(domain=f"d{i}", model="bench", chat_id=f"c{i}", latency_ms=100.0, payload=payload,
+                        status=200, response=response, content=content, result={"verdict": "Safe"})
+        results["record_us"] = (time.perf_counter() - t0) / calls * 1e6
+        t0 = time.perf_counter()
+        sink.flush()
+        results["writer_us"] = (time.perf_counter() - t0) / calls * 1e6
+        results["bytes_per_call_sync"] = sum(p.stat().st_size for p in Path(tmp, "sync").rglob("*")
+                                             if p.is_file()) / calls
+        results["bytes_per_call_async"] = sum(p.stat().st_size for p in Path(tmp, "async").rglob("*")
+                                              if p.is_file()) / calls
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM telemetry logging benchmark")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--sample-rate", type=float, default=1.0)
+    parser.add_argument("--max-field-chars", type=int, default=4000)
+    parser.add_argument("--legacy-text", action="store_true", help="also write the old formats from the sink")
+    args = parser.parse_args()
+    results = benchmark(args.calls, sample_rate=args.sample_rate, max_field_chars=args.max_field_chars,
+                        legacy_text=args.legacy_text)
+    print(json.dumps({k: round(v, 1) for k, v in results.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# mock_llm.py
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_latency(spec: str):
+    """
+    Latency distribution spec -> zero-arg sampler returning seconds.
+      fixed:200             always 200 ms
+      uniform:100,400       uniform between 100 and 400 ms
+      lognormal:300,0.5     median 300 ms, sigma 0.5
+      exp:250               exponential with 250 ms mean
+    """
+    kind, _, args = (spec or "fixed:0").partition(":")
+    vals = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda: vals[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(vals[0], vals[1]) / 1000
+    if kind == "lognormal":
+        mu, sigma = math.log(max(vals[0], 1e-3)), vals[1] if len(vals) > 1 else 0.5
+        return lambda: random.lognormvariate(mu, sigma) / 1000
+    if kind == "exp":
+        return lambda: random.expovariate(1000 / vals[0]) if vals[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class MockLLMServer:
+    """
+    Local OpenAI-compatible /v1/chat/completions stub for offline runs.
+
+    Verdicts come from an optional script ({"domain-or-glob": {"verdict": ...,
+    "mimics": ..., "san": "Safe|Suspicious"}}) and otherwise are a stable
+    function of the domain name, so repeated runs see the same answers.
+    `error_rate` of requests fail with HTTP 500 after the sampled latency.
+    Reasoning-model output is simulated with `think_tokens` words of
+    <think> before the JSON and `tail_tokens` after it, `token_ms` apart;
+    requests with "stream": true get them as SSE chunks. Constrained
+    requests (response_format / grammar) get the bare JSON when `structured`
+    is "honour", free text when "ignore" and HTTP 400 when "reject".
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency="fixed:0", malicious_ratio=0.0,
+                 *, jitter_ms=0.0, error_rate=0.0, script=None, think_tokens=0, tail_tokens=0, token_ms=0.0,
+                 structured="honour"):
+        self.sample_latency = parse_latency(latency)
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.malicious_ratio = malicious_ratio
+        self.think_tokens = think_tokens
+        self.tail_tokens = tail_tokens
+        self.token_ms = token_ms
+        self.structured = structured
+        self.script = {}
+        if script:
+            with open(script) as f:
+                self.script = {k.lower(): v for k, v in json.load(f).items()}
+        self._rng = random.Random(0)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="mock-llm", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _scripted(self, domain: str) -> dict | None:
+        domain = domain.lower()
+        if domain in self.script:
+            return self.script[domain]
+        for pattern, entry in self.script.items():
+            if fnmatch.fnmatch(domain, pattern):
+                return entry
+        return None
+
+    def verdict_for(self, domain: str, san: bool = False) -> dict:
+        entry = self._scripted(domain)
+        if san:
+            verdict = (entry or {}).get("san", "Safe")
+            return {"verdict": verdict, "reason": "mock"}
+        if entry is not None:
+            return {"verdict": entry.get("verdict", "Safe"), "mimics": entry.get("mimics")}
+        h = int.from_bytes(hashlib.sha1(domain.encode("utf-8")).digest()[:4], "big") / 2**32
+        if h < self.malicious_ratio:
+            return {"verdict": "Malicious", "mimics": None}
+        return {"verdict": "Safe", "mimics": None}
+
+    def completion(self, verdict: dict, bare: bool = False) -> list:
+        """
+        The reply as word-sized tokens: optional reasoning, the verdict JSON,
+        optional trailing text (only the JSON when `bare`).
+        """
+        text = json.dumps(verdict)
+        if bare:
+            return re.findall(r"\S+\s*|\s+", text)
+        if self.think_tokens:
+            text = "<think>" + "considering " * self.think_tokens + "</think>\n" + text
+        if self.tail_tokens:
+            text += "\n" + "note " * self.tail_tokens
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    payload = {}
+                with server._lock:
+                    server.requests += 1
+                    failed = server._rng.random() < server.error_rate
+                    jitter = server._rng.uniform(0, server.jitter_ms) / 1000
+                    if failed:
+                        server.errors += 1
+
+                prompt = " ".join(m.get("content", "") for m in payload.get("messages", [])
+                                  if m.get("role") == "user")
+                match = re.search(r"`([^`]+)`", prompt)
+                verdict = server.verdict_for(match.group(1) if match else prompt, san="SANs" in prompt)
+
+                constrained = "response_format" in payload or "grammar" in payload
+                rejected = constrained and server.structured == "reject"
+                time.sleep(max(0.0, server.sample_latency() + jitter))
+                if failed or rejected:
+                    body = b'{"error": {"message": "mock failure", "type": "server_error"}}'
+                    self.send_response(400 if rejected else 500)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                if constrained and server.structured == "honour":
+                    schema = (payload.get("response_format", {}).get("json_schema") or {}).get("schema")
+                    if schema:
+                        verdict = {k: verdict.get(k) for k in schema["properties"]}
+                    pieces = server.completion(verdict, bare=True)
+                else:
+                    pieces = server.completion(verdict)
+                if payload.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.end_headers()
+                    try:
+                        for piece in pieces:
+                            time.sleep(server.token_ms / 1000)
+                            chunk = {"id": "mock", "object": "chat.completion.chunk",
+                                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                            self.wfile.flush()
+                        done = {"id": "mock", "object": "chat.completion.chunk",
+                                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # the client stopped reading once it had the verdict
+                    return
+
+                time.sleep(len(pieces) * server.token_ms / 1000)
+                body = json.dumps({
+                    "id": "mock",
+                    "object": "chat.completion",
+                    "model": payload.get("model", "mock"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(pieces)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4891)
+    parser.add_argument("--latency", default="lognormal:300,0.5")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malicious-ratio", type=float, default=0.0)
+    parser.add_argument("--script", default=None, help="JSON file of scripted verdicts")
+    parser.add_argument("--think-tokens", type=int, default=0, help="reasoning words before the JSON")
+    parser.add_argument("--tail-tokens", type=int, default=0, help="words after the JSON")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="delay per generated word")
+    parser.add_argument("--structured", choices=["honour", "ignore", "reject"], default="honour",
+                        help="how to treat response_format / grammar requests")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.malicious_ratio,
+                           jitter_ms=args.jitter_ms, error_rate=args.error_rate, script=args.script,
+                           think_tokens=args.think_tokens, tail_tokens=args.tail_tokens, token_ms=args.token_ms,
+                           structured=args.structured)
+    print(f"Mock LLM listening on {server.url} (latency {args.latency})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
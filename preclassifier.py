@@ -0,0 +1,235 @@
+# preclassifier.py
+
+import math
+import os
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from domain_names import normalize, on_shared_host
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BASE_DIR, "config")
+
+TOP_SITES_FILE = os.path.join(CONFIG_DIR, "top_sites.txt")
+
+# TLDs that show up disproportionately in phishing / abuse feeds
+RISKY_TLDS = {
+    "zip", "mov", "xyz", "top", "click", "link", "work", "live", "buzz",
+    "rest", "cam", "icu", "cfd", "sbs", "monster", "quest", "gq", "ml",
+    "cf", "tk", "ga", "pw", "cc", "su", "ru", "cn", "info", "online",
+    "site", "website", "space", "fun", "shop", "store", "support", "country",
+}
+TRUSTED_TLDS = {"gov", "edu", "mil", "int"}
+
+# Words phishers like to glue onto a brand name
+LURE_WORDS = (
+    "login", "signin", "verify", "secure", "account", "update", "wallet",
+    "support", "billing", "recover", "unlock", "confirm", "auth",
+)
+
+MAX_LABEL_LEN = 63
+
+
+def _load_top_sites(path: str) -> List[str]:
+    try:
+        with open(path) as f:
+            return [line.strip().lower() for line in f if line.strip() and not line.startswith("#")]
+    except FileNotFoundError:
+        return []
+
+
+def _encode(labels: List[str], width: int) -> np.ndarray:
+    """
+    Pack strings into a zero-padded (n, width) uint8 matrix.
+    """
+    out = np.zeros((len(labels), width), dtype=np.uint8)
+    for i, s in enumerate(labels):
+        b = s.encode("ascii", "ignore")[:width]
+        out[i, :len(b)] = np.frombuffer(b, dtype=np.uint8)
+    return out
+
+
+class LexicalPreClassifier:
+    """
+    Cheap in-process scoring stage that runs before the LLM.
+    Produces a phishing probability per domain; only the uncertain
+    middle band (allow_below < p < block_above) is sent to the LLM.
+    """
+
+    # logistic weights: intercept, risky_tld, trusted_tld, brand_lure,
+    # near_top_site, entropy, digit_ratio, extra_labels, long_name, hyphens
+    WEIGHTS = np.array([-1.0, 1.4, -2.5, 2.4, 3.2, 1.1, 2.2, 0.35, 0.04, 0.45])
+
+    def __init__(
+        self,
+        top_sites: Optional[Iterable[str]] = None,
+        allow_below: float = 0.1,
+        block_above: float = 0.95,
+        *,
+        top_sites_file: str = TOP_SITES_FILE,
+    ):
+        sites = list(top_sites) if top_sites is not None else _load_top_sites(top_sites_file)
+        self.top_sites = set(sites)
+        self.allow_below = allow_below
+        self.block_above = block_above
+
+        # second-level labels of top sites ("paypal" for paypal.com)
+        slds = sorted({s.split(".")[0] for s in sites if s})
+        self._sld_lens = np.array([len(s) for s in slds], dtype=np.int32)
+        self._sld_matrix = _encode(slds, MAX_LABEL_LEN)
+        self._sld_set = set(slds)
+
+        brands = [s for s in slds if len(s) >= 5]
+        self._brand_re = re.compile("|".join(map(re.escape, brands))) if brands else None
+        self._lure_re = re.compile("|".join(LURE_WORDS))
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict]) -> "LexicalPreClassifier":
+        cfg = cfg or {}
+        top_sites_file = cfg.get("top_sites_file") or TOP_SITES_FILE
+        if not os.path.isabs(top_sites_file):
+            top_sites_file = os.path.join(CONFIG_DIR, top_sites_file)
+        return cls(
+            allow_below=float(cfg.get("allow_below", 0.1)),
+            block_above=float(cfg.get("block_above", 0.95)),
+            top_sites_file=top_sites_file,
+        )
+
+    @classmethod
+    def from_settings(cls) -> Optional["LexicalPreClassifier"]:
+        """
+        Builds the classifier from config.json, or None when disabled there.
+        """
+        from settings import config
+        cfg = config.get("preclassifier", {})
+        if not cfg.get("enabled", True):
+            return None
+        return cls.from_config(cfg)
+
+    # ---------- Features ----------
+
+    def features(self, domains: List[str]) -> np.ndarray:
+        """
+        Returns an (n, 10) feature matrix, first column is the bias term.
+        """
+        n = len(domains)
+        X = np.zeros((n, 10), dtype=np.float64)
+        if n == 0:
+            return X
+        X[:, 0] = 1.0
+
+        parsed = [normalize(d) for d in domains]
+        names = [p.name for p in parsed]
+        regs = [p.registrable for p in parsed]
+        slds = [r.split(".")[0] for r in regs]
+        tlds = [d.rsplit(".", 1)[-1] for d in names]
+
+        X[:, 1] = [t in RISKY_TLDS for t in tlds]
+        X[:, 2] = [t in TRUSTED_TLDS for t in tlds]
+
+        # brand keyword on a domain that is not the brand itself,
+        # weighted up when paired with a lure word
+        for i, (name, reg) in enumerate(zip(names, regs)):
+            if self._brand_re is None or reg in self.top_sites:
+                continue
+            if self._brand_re.search(name):
+                X[i, 3] = 1.0 + (0.5 if self._lure_re.search(name) else 0.0)
+
+        X[:, 4] = self._near_top_site(slds, regs)
+
+        # character statistics over the whole name (dots excluded)
+        chars = _encode([d.replace(".", "") for d in names], 253)
+        lengths = np.maximum((chars > 0).sum(axis=1), 1)
+        X[:, 5] = np.clip(self._entropy(chars, lengths) - 3.0, 0.0, None)
+        X[:, 6] = ((chars >= ord("0")) & (chars <= ord("9"))).sum(axis=1) / lengths
+        label_counts = np.array([d.count(".") + 1 for d in names])
+        X[:, 7] = np.maximum(label_counts - 3, 0)
+        X[:, 8] = np.maximum(np.array([len(d) for d in names]) - 20, 0)
+        X[:, 9] = (chars == ord("-")).sum(axis=1)
+        return X
+
+    @staticmethod
+    def _entropy(chars: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        counts = np.zeros((chars.shape[0], 256), dtype=np.float64)
+        rows = np.repeat(np.arange(chars.shape[0]), chars.shape[1])
+        np.add.at(counts, (rows, chars.ravel()), 1.0)
+        counts[:, 0] = 0.0
+        p = counts / lengths[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            h = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1)
+        return h
+
+    def _near_top_site(self, slds: List[str], regs: List[str]) -> np.ndarray:
+        """
+        1.0 when the second-level label is one or two edits away from a
+        top site's label (paypa1.com, gooogle.net) without being that site.
+        """
+        out = np.zeros(len(slds), dtype=np.float64)
+        if not len(self._sld_lens):
+            return out
+        for i, (sld, reg) in enumerate(zip(slds, regs)):
+            if reg in self.top_sites or sld in self._sld_set or len(sld) < 4:
+                continue
+            d = self._min_edit_distance(sld)
+            if 1 <= d <= (1 if len(sld) < 7 else 2):
+                out[i] = 1.0
+        return out
+
+    def _min_edit_distance(self, s: str) -> int:
+        """
+        Levenshtein distance from `s` to every top-site label at once.
+        Rows of the DP are vectorized over candidates; the insertion
+        term is resolved with a running minimum along each row.
+        """
+        cand = self._sld_matrix
+        lens = self._sld_lens
+        width = min(int(lens.max()), MAX_LABEL_LEN)
+        cand = cand[:, :width]
+        j = np.arange(width + 1, dtype=np.int32)
+        prev = np.broadcast_to(j, (cand.shape[0], width + 1)).copy()
+        for i, ch in enumerate(s.encode("ascii", "ignore"), start=1):
+            cost = (cand != ch).astype(np.int32)
+            base = np.empty_like(prev)
+            base[:, 0] = i
+            base[:, 1:] = np.minimum(prev[:, 1:] + 1, prev[:, :-1] + cost)
+            prev = np.minimum.accumulate(base - j, axis=1) + j
+        dist = prev[np.arange(cand.shape[0]), np.minimum(lens, width)]
+        return int(dist.min())
+
+    # ---------- Scoring ----------
+
+    def score(self, domains: List[str]) -> np.ndarray:
+        """
+        Phishing probability for each domain. Top sites score 0, and so do
+        their subdomains unless they sit on a shared host (PSL private
+        section), where the subdomain belongs to whoever registered it.
+        """
+        X = self.features(domains)
+        z = X @ self.WEIGHTS
+        p = 1.0 / (1.0 + np.exp(-z))
+        known = np.array([self._known(d) for d in domains], dtype=bool)
+        if len(known):
+            p[known] = 0.0
+        return p
+
+    def _known(self, domain: str) -> bool:
+        name = normalize(domain)
+        if name.registrable not in self.top_sites:
+            return False
+        return name.name == name.registrable or not on_shared_host(name.name)
+
+    def classify(self, domain: str) -> dict:
+        """
+        Returns {"verdict": "allow"|"block"|None, "score": p}.
+        A None verdict means the domain falls in the uncertain band.
+        """
+        p = float(self.score([domain])[0])
+        if p <= self.allow_below:
+            verdict = "allow"
+        elif p >= self.block_above:
+            verdict = "block"
+        else:
+            verdict = None
+        return {"verdict": verdict, "score": round(p, 4) if math.isfinite(p) else p}
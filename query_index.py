@@ -0,0 +1,266 @@
+# query_index.py
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BASE_DIR, "config")
+LOG_FILE = os.path.join(CONFIG_DIR, "queries.log")
+INDEX_FILE = os.path.join(CONFIG_DIR, "queries.index.sqlite")
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    id      INTEGER PRIMARY KEY,   -- log order, so ids ascend with time
+    ts      INTEGER NOT NULL,
+    rname   TEXT NOT NULL,         -- reversed name: suffix search is a range scan
+    verdict TEXT NOT NULL,
+    source  TEXT NOT NULL,
+    client  TEXT
+);
+CREATE INDEX IF NOT EXISTS queries_ts ON queries (ts);
+CREATE INDEX IF NOT EXISTS queries_rname ON queries (rname, id);
+CREATE INDEX IF NOT EXISTS queries_client ON queries (client, id);
+CREATE INDEX IF NOT EXISTS queries_source ON queries (source, id);
+CREATE TABLE IF NOT EXISTS log_state (path TEXT PRIMARY KEY, inode INTEGER, offset INTEGER);
+"""
+
+
+def _reverse(name: str) -> str:
+    return ".".join(reversed(name.split(".")))
+
+
+def parse_line(line: str, _cache={}):
+    """
+    "ts - qname - verdict (source)[ - client]" -> row tuple, or None.
+    """
+    parts = line.rstrip("\n").split(" - ")
+    if len(parts) < 3:
+        return None
+    stamp, qname, decision = parts[0], parts[1], parts[2]
+    client = parts[3] if len(parts) > 3 else None
+    # strptime per line dominates indexing; parse the hour once and add
+    # minutes and seconds by hand
+    hour = _cache.get(stamp[:13])
+    try:
+        if hour is None:
+            hour = int(time.mktime(time.strptime(stamp[:13], "%Y-%m-%d %H")))
+            if len(_cache) > 1024:
+                _cache.clear()
+            _cache[stamp[:13]] = hour
+        ts = hour + int(stamp[14:16]) * 60 + int(stamp[17:19])
+    except ValueError:
+        return None
+    verdict, _, source = decision.partition(" ")
+    return ts, _reverse(qname.lower()), verdict, source.strip("()"), client
+
+
+def parse_time(value) -> Optional[int]:
+    """
+    Epoch seconds or "YYYY-mm-dd[ HH:MM:SS]" (local time, like the log).
+    """
+    if value in (None, ""):
+        return None
+    value = str(value)
+    if value.isdigit():
+        return int(value)
+    for fmt in (TIME_FORMAT, "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return int(time.mktime(time.strptime(value, fmt)))
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {value}")
+
+
+class QueryIndex:
+    """
+    On-disk SQLite index of queries.log for paginated search.
+
+    sync() parses only the bytes appended since the last call (the offset
+    is stored in the index), so the log is indexed segment by segment as
+    it is written; a truncated or replaced log is followed from its start
+    while already indexed rows are kept. Searches page by row id with a
+    cursor and never load more than one page, whatever the index size.
+    """
+
+    def __init__(self, db_path=INDEX_FILE, log_path=LOG_FILE, batch_lines=50000, sync_interval=5.0):
+        self.db_path = db_path
+        self.log_path = log_path
+        self.batch_lines = int(batch_lines)
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.thread = None
+        with self._db() as db:
+            db.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, cfg: dict, **kwargs) -> "QueryIndex":
+        return cls(batch_lines=cfg.get("batch_lines", 50000),
+                   sync_interval=cfg.get("sync_interval_s", 5), **kwargs)
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> Optional["QueryIndex"]:
+        """
+        Builds the index from config.json, or None when disabled there.
+        """
+        from settings import config
+        cfg = config.get("query_index", {})
+        if not cfg.get("enabled", True):
+            return None
+        return cls.from_config(cfg, **kwargs)
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread (Flask serves each request on its own)
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # ---------- Indexing ----------
+
+    def sync(self, blocking: bool = True, max_batches: Optional[int] = None) -> int:
+        """
+        Indexes lines appended to the log since the last sync; returns how many.
+        With blocking=False it returns 0 at once if another sync is running;
+        `max_batches` bounds the work done in one call (the rest is left
+        for the next).
+        """
+        if not self.lock.acquire(blocking=blocking):
+            return 0
+        try:
+            db = self._db()
+            try:
+                st = os.stat(self.log_path)
+            except FileNotFoundError:
+                return 0
+            row = db.execute("SELECT inode, offset FROM log_state WHERE path = ?", (self.log_path,)).fetchone()
+            inode, offset = row if row else (st.st_ino, 0)
+            if inode != st.st_ino or st.st_size < offset:
+                inode, offset = st.st_ino, 0  # rotated or cleared
+            if st.st_size == offset:
+                return 0
+
+            added = 0
+            with open(self.log_path, "rb") as f:
+                f.seek(offset)
+                while True:
+                    lines = f.readlines(self.batch_lines * 80)
+                    # A line still being written is left for the next sync
+                    if lines and not lines[-1].endswith(b"\n"):
+                        lines.pop()
+                    if not lines:
+                        break
+                    rows = [r for r in (parse_line(l.decode("utf-8", "replace")) for l in lines) if r]
+                    offset += sum(len(l) for l in lines)
+                    with db:
+                        db.executemany(
+                            "INSERT INTO queries (ts, rname, verdict, source, client) VALUES (?, ?, ?, ?, ?)", rows)
+                        db.execute("INSERT OR REPLACE INTO log_state VALUES (?, ?, ?)",
+                                   (self.log_path, inode, offset))
+                    added += len(rows)
+                    f.seek(offset)
+                    if max_batches is not None:
+                        max_batches -= 1
+                        if max_batches <= 0:
+                            break
+            return added
+        finally:
+            self.lock.release()
+
+    def start(self):
+        """
+        Keeps the index current from a background thread.
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name="query-index", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[INDEX ERROR] {e}")
+            time.sleep(self.sync_interval)
+
+    # ---------- Search ----------
+
+    def search(self, *, since=None, until=None, domain=None, exact=False, verdict=None,
+               source=None, client=None, cursor=None, limit=100, order="desc") -> dict:
+        """
+        One page of matching rows, newest first (or oldest first with
+        order="asc"), plus the cursor for the next page (None at the end).
+        `domain` matches the name and every name under it unless `exact`;
+        `source` matches by prefix ("subdomain burst" covers every burst).
+        """
+        limit = max(1, min(int(limit), 1000))
+        asc = order == "asc"
+        db = self._db()
+        where, args = [], []
+
+        # Time range -> id range: the log is written in time order
+        lo = hi = None
+        since, until = parse_time(since), parse_time(until)
+        if since is not None:
+            row = db.execute("SELECT id FROM queries WHERE ts >= ? ORDER BY ts, id LIMIT 1", (since,)).fetchone()
+            if row is None:
+                return {"rows": [], "next_cursor": None}
+            lo = row[0]
+        if until is not None:
+            row = db.execute("SELECT id FROM queries WHERE ts <= ? ORDER BY ts DESC, id DESC LIMIT 1", (until,)).fetchone()
+            if row is None:
+                return {"rows": [], "next_cursor": None}
+            hi = row[0]
+        if cursor is not None:
+            if asc:
+                lo = max(lo or 0, int(cursor) + 1)
+            else:
+                hi = min(hi, int(cursor) - 1) if hi is not None else int(cursor) - 1
+        if lo is not None:
+            where.append("id >= ?")
+            args.append(lo)
+        if hi is not None:
+            where.append("id <= ?")
+            args.append(hi)
+
+        if domain:
+            r = _reverse(domain.strip().rstrip(".").lower())
+            if exact:
+                where.append("rname = ?")
+                args.append(r)
+            else:
+                # "/" sorts right after ".", so this range is every name under r
+                where.append("(rname = ? OR (rname > ? AND rname < ?))")
+                args += [r, r + ".", r + "/"]
+        if verdict:
+            where.append("verdict = ?")
+            args.append(verdict)
+        if source:
+            where.append("source >= ? AND source < ?")
+            args += [source, source + "\uffff"]
+        if client:
+            where.append("client = ?")
+            args.append(client)
+
+        sql = "SELECT id, ts, rname, verdict, source, client FROM queries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY id {'ASC' if asc else 'DESC'} LIMIT ?"
+        rows = db.execute(sql, args + [limit + 1]).fetchall()
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "rows": [{"id": i, "time": time.strftime(TIME_FORMAT, time.localtime(ts)), "ts": ts,
+                      "qname": _reverse(rname), "verdict": v, "source": s, "client": c}
+                     for i, ts, rname, v, s, c in rows],
+            "next_cursor": rows[-1][0] if more else None,
+        }
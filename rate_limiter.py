@@ -0,0 +1,167 @@
+# rate_limiter.py
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BASE_DIR, "config")
+STATUS_FILE = os.path.join(CONFIG_DIR, "rate_limit_status.json")
+
+FALLBACKS = {"allow", "block", "servfail", "refused"}
+
+
+class _Client:
+    """
+    Per-client state: two token buckets (all queries, new analyses) and
+    counters for the offender report.
+    """
+    __slots__ = ("q_tokens", "q_at", "a_tokens", "a_at", "last_seen",
+                 "queries", "dropped", "analyses", "denied")
+
+    def __init__(self, now, query_burst, analysis_burst):
+        self.q_tokens, self.q_at = query_burst, now
+        self.a_tokens, self.a_at = analysis_burst, now
+        self.last_seen = now
+        self.queries = self.dropped = self.analyses = self.denied = 0
+
+
+class ClientRateLimiter:
+    """
+    Token buckets per client IP, one for every query and a much smaller one
+    for queries that would start an LLM analysis. Clients idle for
+    `idle_timeout` seconds are evicted, so memory is O(active clients).
+    """
+
+    def __init__(self, query_rate=50.0, query_burst=200.0, analysis_rate=0.5,
+                 analysis_burst=10.0, *, query_fallback="refused", analysis_fallback="allow",
+                 idle_timeout=300.0, max_clients=100000, status_file=STATUS_FILE,
+                 report_interval=10.0):
+        for fallback in (query_fallback, analysis_fallback):
+            if fallback not in FALLBACKS:
+                raise ValueError(f"Unknown rate-limit fallback: {fallback}")
+        self.query_rate = float(query_rate)
+        self.query_burst = float(query_burst)
+        self.analysis_rate = float(analysis_rate)
+        self.analysis_burst = float(analysis_burst)
+        self.query_fallback = query_fallback
+        self.analysis_fallback = analysis_fallback
+        self.idle_timeout = float(idle_timeout)
+        self.max_clients = int(max_clients)
+        self.status_file = status_file
+        self.report_interval = report_interval
+        # Least recently seen first; every hit moves a client to the end
+        self.clients: "OrderedDict[str, _Client]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.last_report = time.monotonic()
+        self.evicted = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "ClientRateLimiter":
+        return cls(
+            query_rate=cfg.get("queries_per_s", 50),
+            query_burst=cfg.get("query_burst", 200),
+            analysis_rate=cfg.get("analyses_per_min", 30) / 60.0,
+            analysis_burst=cfg.get("analysis_burst", 10),
+            query_fallback=cfg.get("query_fallback", "refused"),
+            analysis_fallback=cfg.get("analysis_fallback", "allow"),
+            idle_timeout=cfg.get("idle_s", 300),
+            max_clients=cfg.get("max_clients", 100000),
+        )
+
+    @classmethod
+    def from_settings(cls) -> Optional["ClientRateLimiter"]:
+        """
+        Builds the limiter from config.json, or None when disabled there.
+        """
+        from settings import config
+        cfg = config.get("rate_limit", {})
+        if not cfg.get("enabled", False):
+            return None
+        return cls.from_config(cfg)
+
+    # ---------- Buckets ----------
+
+    def _client(self, client, now):
+        entry = self.clients.get(client)
+        if entry is None:
+            entry = self.clients[client] = _Client(now, self.query_burst, self.analysis_burst)
+            self._evict(now)
+        else:
+            self.clients.move_to_end(client)
+        entry.last_seen = now
+        return entry
+
+    def _evict(self, now):
+        while self.clients:
+            oldest = next(iter(self.clients.values()))
+            if now - oldest.last_seen < self.idle_timeout and len(self.clients) <= self.max_clients:
+                break
+            self.clients.popitem(last=False)
+            self.evicted += 1
+
+    def allow_query(self, client) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            c = self._client(client, now)
+            c.queries += 1
+            c.q_tokens = min(self.query_burst, c.q_tokens + (now - c.q_at) * self.query_rate)
+            c.q_at = now
+            if c.q_tokens >= 1.0:
+                c.q_tokens -= 1.0
+                return True
+            c.dropped += 1
+            return False
+
+    def allow_analysis(self, client) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            c = self._client(client, now)
+            c.analyses += 1
+            c.a_tokens = min(self.analysis_burst, c.a_tokens + (now - c.a_at) * self.analysis_rate)
+            c.a_at = now
+            if c.a_tokens >= 1.0:
+                c.a_tokens -= 1.0
+                return True
+            c.denied += 1
+            return False
+
+    # ---------- Reporting ----------
+
+    def top_offenders(self, n=10) -> List[dict]:
+        with self.lock:
+            self._evict(time.monotonic())
+            rows = [
+                {"client": ip, "queries": c.queries, "dropped": c.dropped,
+                 "analyses": c.analyses, "denied": c.denied}
+                for ip, c in self.clients.items() if c.dropped or c.denied
+            ]
+        rows.sort(key=lambda r: (r["dropped"] + r["denied"], r["queries"]), reverse=True)
+        return rows[:n]
+
+    def maybe_report(self):
+        """
+        Writes the offender report at most every `report_interval` seconds.
+        Cheap enough to call on every query.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_report < self.report_interval:
+                return
+            self.last_report = now
+        status = {
+            "updated_at": time.time(),
+            "active_clients": len(self.clients),
+            "evicted": self.evicted,
+            "top_offenders": self.top_offenders(),
+        }
+        try:
+            tmp = f"{self.status_file}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(status, f, indent=2)
+            os.replace(tmp, self.status_file)
+        except OSError as e:
+            print(f"[RATE LIMIT ERROR] status: {e}")
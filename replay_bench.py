@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# replay_bench.py — offline replay benchmark for the full FilteringResolver pipeline
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dnslib import DNSRecord, QTYPE, RR, A
+from dnslib.server import BaseResolver, DNSLogger, DNSServer
+
+from mock_llm import MockLLMServer, parse_latency
+
+QUIET_LOGGER = "-request,-reply,-truncated"
+
+
+# ---------- Stub upstream ----------
+
+class StubUpstreamResolver(BaseResolver):
+    """
+    Answers every A query with a TEST-NET address after a sampled delay.
+    """
+
+    def __init__(self, latency="fixed:0"):
+        self.sample_latency = parse_latency(latency)
+
+    def resolve(self, request, handler):
+        time.sleep(max(0.0, self.sample_latency()))
+        reply = request.reply()
+        if request.q.qtype == QTYPE.A:
+            reply.add_answer(RR(request.q.qname, QTYPE.A, rdata=A("192.0.2.1"), ttl=60))
+        return reply
+
+
+# ---------- Query stream ----------
+
+def _zipf_choice(rng, items: List[str], n: int, s: float) -> List[str]:
+    if not items or n <= 0:
+        return []
+    ranks = np.arange(1, len(items) + 1, dtype=np.float64)
+    weights = ranks ** -s
+    weights /= weights.sum()
+    idx = rng.choice(len(items), size=n, p=weights)
+    return [items[i] for i in idx]
+
+
+def synthetic_stream(n: int, mix: Dict[str, float], universe: int, zipf_s: float,
+                     seed: int = 0) -> Tuple[List[Tuple[str, str]], Dict[str, List[str]]]:
+    """
+    Returns ([(name, class), ...], lists) where `lists` holds the names to
+    seed into the resolver's user lists ("listed") and auto lists ("cached").
+    """
+    rng = np.random.default_rng(seed)
+    listed = [f"listed{i}.bench-list.net" for i in range(200)]
+    cached = [f"cached{i}.bench-cache.org" for i in range(1000)]
+    # Spread over many registrables, as real unknown traffic is (and so the
+    # burst detector, when enabled, doesn't take the whole class list-only)
+    unknown = [f"u{i}-{rng.integers(1 << 30):x}.bench-unknown{i % 1000}.com" for i in range(universe)]
+    pools = {"listed": listed, "cached": cached, "unknown": unknown}
+
+    total = sum(mix.values()) or 1.0
+    counts = {k: int(round(n * v / total)) for k, v in mix.items() if k in pools}
+    stream = []
+    for cls, count in counts.items():
+        stream += [(name, cls) for name in _zipf_choice(rng, pools[cls], count, zipf_s)]
+    order = rng.permutation(len(stream))
+    stream = [stream[i] for i in order]
+
+    lists = {
+        "user_whitelist": listed[::2],
+        "user_blacklist": listed[1::2],
+        "auto_whitelist": cached[::2],
+        "auto_blacklist": cached[1::2],
+    }
+    return stream, lists
+
+
+def recorded_stream(path: str) -> List[Tuple[str, str]]:
+    """
+    Plain names, one per line, or queries.log lines ("ts - name - verdict").
+    """
+    out = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(" - ")
+            out.append((parts[1] if len(parts) >= 3 else parts[0], "recorded"))
+    return out
+
+
+# ---------- Resolver under test (own process, so CPU/RSS are its own) ----------
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return 0.0
+
+
+def _serve_resolver(conn, opts: dict):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from filtering_resolver import FilteringResolver
+    from domain_analyser import DomainAnalyser
+    from backends import build_backends
+    from analysis_queue import AnalysisQueue
+    from burst_detector import BurstDetector
+    from verdict_learner import VerdictLearner
+
+    backends = build_backends(opts["backends"])
+    analyser = DomainAnalyser("mock", opts["llm_url"], opts["block_score"],
+                              whois_provider=backends["whois"], cert_provider=backends["cert"])
+    resolver = FilteringResolver(
+        filtering_enabled=True,
+        list_only_filtering_enabled=opts["list_only"],
+        model="mock",
+        api_url=opts["llm_url"],
+        block_score=opts["block_score"],
+        upstream_dns=opts["upstream"],
+        lists=opts["lists"],
+        log_file=opts["log_file"],
+        analyser=analyser,
+        # Everything comes from the bench options, never the live config.json
+        rate_limiter=False,
+        burst_detector=BurstDetector() if opts["burst_detection"] else False,
+        analysis_queue=False,
+        learner=VerdictLearner(opts["lists"]["auto_whitelist"], opts["lists"]["auto_blacklist"],
+                               opts["block_score"]) if opts["learn"] else False,
+        events=False,
+        tracer=False,
+    )
+    if opts["queue_workers"] > 0:
+        resolver.analysis_queue = AnalysisQueue(resolver._analyse, workers=opts["queue_workers"])
+    server = DNSServer(resolver, address="127.0.0.1", port=0, logger=DNSLogger(QUIET_LOGGER))
+    server.start_thread()
+    conn.send(server.server.server_address[1])
+
+    conn.recv()  # start of measurement
+    ru0 = resource.getrusage(resource.RUSAGE_SELF)
+    conn.recv()  # end of measurement
+    ru1 = resource.getrusage(resource.RUSAGE_SELF)
+    conn.send({
+        "cpu_s": round((ru1.ru_utime - ru0.ru_utime) + (ru1.ru_stime - ru0.ru_stime), 3),
+        "rss_mb": round(_rss_mb(), 1),
+        "peak_rss_mb": round(ru1.ru_maxrss / 1024, 1),
+    })
+    server.stop()
+
+
+# ---------- Client ----------
+
+def _query(port: int, name: str, timeout: float) -> Tuple[Optional[int], float]:
+    q = DNSRecord.question(name)
+    t0 = time.perf_counter()
+    try:
+        data = q.send("127.0.0.1", port, timeout=timeout)
+        rcode = DNSRecord.parse(data).header.rcode
+    except (socket.timeout, OSError):
+        rcode = None
+    return rcode, (time.perf_counter() - t0) * 1000
+
+
+def _percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    a = np.asarray(values)
+    return {
+        "count": int(a.size),
+        "mean": round(float(a.mean()), 2),
+        "p50": round(float(np.percentile(a, 50)), 2),
+        "p95": round(float(np.percentile(a, 95)), 2),
+        "p99": round(float(np.percentile(a, 99)), 2),
+        "max": round(float(a.max()), 2),
+    }
+
+
+def run(args) -> dict:
+    if args.replay:
+        stream = recorded_stream(args.replay)[:args.queries or None]
+        lists = {}
+    else:
+        mix = {k: float(v) for k, v in (p.split("=") for p in args.mix.split(","))}
+        stream, lists = synthetic_stream(args.queries, mix, args.universe, args.zipf, args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="replay-bench-")
+    list_paths = {}
+    for key, names in lists.items():
+        list_paths[key] = os.path.join(workdir, f"{key}.txt")
+        with open(list_paths[key], "w") as f:
+            f.write("\n".join(names) + "\n")
+    for key in ("user_whitelist", "user_blacklist", "auto_whitelist", "auto_blacklist"):
+        list_paths.setdefault(key, os.path.join(workdir, f"{key}.txt"))
+
+    upstream = DNSServer(StubUpstreamResolver(args.upstream_latency), address="127.0.0.1",
+                         port=0, logger=DNSLogger(QUIET_LOGGER))
+    upstream.start_thread()
+    llm = MockLLMServer(latency=args.llm_latency, malicious_ratio=args.malicious_ratio,
+                        jitter_ms=args.llm_jitter_ms, error_rate=args.llm_error_rate,
+                        script=args.llm_script).start()
+
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=_serve_resolver, args=(child, {
+        "list_only": args.list_only,
+        "burst_detection": args.burst_detection,
+        "learn": args.learn,
+        "queue_workers": args.queue_workers,
+        "llm_url": llm.url,
+        "block_score": 4,
+        "upstream": f"127.0.0.1:{upstream.server.server_address[1]}",
+        "lists": list_paths,
+        "log_file": os.path.join(workdir, "queries.log"),
+        "backends": {"whois": args.whois, "whois_fixture": args.whois_fixture,
+                     "whois_latency": args.whois_latency,
+                     "tls": args.tls, "tls_fixture": args.tls_fixture,
+                     "tls_latency": args.tls_latency},
+    }), daemon=True)
+    proc.start()
+    port = parent.recv()
+
+    results: List[Tuple[str, Optional[int], float, float]] = []
+    lock = threading.Lock()
+    interval = 1.0 / args.qps if args.qps > 0 else 0.0
+
+    def one(name, cls, scheduled):
+        rcode, service_ms = _query(port, name, args.timeout)
+        # Latency from the scheduled send time, so client-side queueing counts
+        total_ms = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            results.append((cls, rcode, total_ms, service_ms))
+
+    parent.send("start")
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i, (name, cls) in enumerate(stream):
+            scheduled = t_start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, name, cls, scheduled)
+    wall = time.perf_counter() - t_start
+    parent.send("stop")
+    resolver_stats = parent.recv()
+    proc.join(timeout=5)
+
+    upstream.stop()
+    llm.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    by_class: Dict[str, List[float]] = {}
+    rcodes: Dict[str, int] = {}
+    for cls, rcode, total_ms, _ in results:
+        by_class.setdefault(cls, []).append(total_ms)
+        key = "timeout" if rcode is None else str(rcode)
+        rcodes[key] = rcodes.get(key, 0) + 1
+
+    report = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "queries": len(stream),
+            "qps_target": args.qps,
+            "concurrency": args.concurrency,
+            "mix": None if args.replay else args.mix,
+            "replay": args.replay,
+            "zipf": args.zipf,
+            "universe": args.universe,
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "whois": args.whois,
+            "tls": args.tls,
+            "upstream_latency": args.upstream_latency,
+            "list_only": args.list_only,
+            "queue_workers": args.queue_workers,
+            "burst_detection": args.burst_detection,
+            "learn": args.learn,
+        },
+        "wall_s": round(wall, 3),
+        "qps": round(len(results) / wall, 1) if wall else 0.0,
+        "latency_ms": _percentiles([r[2] for r in results]),
+        "service_ms": _percentiles([r[3] for r in results]),
+        "by_class": {cls: _percentiles(v) for cls, v in sorted(by_class.items())},
+        "rcodes": rcodes,
+        "llm_requests": llm.requests,
+        "llm_errors": llm.errors,
+        "resolver": {**resolver_stats,
+                     "cpu_pct": round(100 * resolver_stats["cpu_s"] / wall, 1) if wall else 0.0},
+    }
+    return report
+
+
+def build_parser(**kwargs) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay a query stream against FilteringResolver", **kwargs)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--qps", type=float, default=200.0, help="target send rate (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=64, help="client threads")
+    parser.add_argument("--mix", default="listed=0.3,cached=0.3,unknown=0.4")
+    parser.add_argument("--universe", type=int, default=5000, help="distinct unknown names")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of name popularity")
+    parser.add_argument("--replay", default=None, help="recorded names or queries.log to replay")
+    parser.add_argument("--llm-latency", default="lognormal:300,0.5")
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-script", default=None, help="JSON file of scripted verdicts")
+    parser.add_argument("--malicious-ratio", type=float, default=0.0)
+    parser.add_argument("--whois", choices=["fixture", "live"], default="fixture")
+    parser.add_argument("--whois-fixture", default="")
+    parser.add_argument("--whois-latency", default="fixed:50")
+    parser.add_argument("--tls", choices=["fixture", "live"], default="fixture")
+    parser.add_argument("--tls-fixture", default="")
+    parser.add_argument("--tls-latency", default="fixed:30")
+    parser.add_argument("--upstream-latency", default="fixed:1")
+    parser.add_argument("--list-only", action="store_true")
+    parser.add_argument("--queue-workers", type=int, default=4, help="analysis queue workers (0 = no queue)")
+    parser.add_argument("--burst-detection", action="store_true", help="enable random-subdomain burst detection")
+    parser.add_argument("--learn", action="store_true", help="promote confident verdicts into the auto lists")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="append the JSON result to this file")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    report = run(args)
+    line = json.dumps(report)
+    print(line)
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,98 @@
-from dnslib.server import DNSServer
-from filtering_resolver import FilteringResolver
-from settings import config
-from app import Dashboard
+import argparse
+import time
 from threading import Thread
-from blacklist_updater import BlacklistUpdater
 
-if __name__ == "__main__":
-    for url in config["blacklist_urls"]:
-        BlacklistUpdater(url).update()
+from settings import config, manager
+
+# Only the DNS path is imported up front. Flask, the feed updater and the
+# analyser (LLM client, numpy, WHOIS/TLS) load in background threads once
+# the DNS socket is bound.
+
+
+def _start_dashboard():
+    from app import Dashboard
+    Dashboard().start()
+
+
+def _start_feeds(resolver, refresh=True):
+    from feed_matcher import RuleMatcher
+    from feed_scheduler import FeedScheduler
+
+    # Serve with the last compiled feed list; refreshed feeds are swapped in live
+    resolver.set_feed_matcher(RuleMatcher.from_file())
+    if not refresh:
+        return
+
+    def build(cfg):
+        return FeedScheduler.from_config(
+            cfg,
+            on_publish=lambda info: resolver.set_feed_matcher(
+                RuleMatcher.from_file(version=info["version"])),
+        ).start()
+
+    scheduler = build(config)
+
+    def rebuild(old, new, changed):
+        # Added feeds are fetched right away; dropped ones leave the next publish
+        nonlocal scheduler
+        scheduler.stop()
+        scheduler = build(new)
 
-    Thread(target=lambda: Dashboard().start(), daemon=True).start()
+    manager.subscribe(rebuild, keys={"blacklist_urls", "feed_refresh"})
 
+
+def main(argv=None):
+    t_launch = time.perf_counter()
+    parser = argparse.ArgumentParser(description="DNS filtering server")
+    parser.add_argument("--port", type=int, default=config["dns_port"])
+    parser.add_argument("--upstream", default=None, help="overrides upstream_dns (default from config)")
+    parser.add_argument("--no-dashboard", action="store_true")
+    parser.add_argument("--query-log", default=None, help="query log file (default config/queries.log)")
+    parser.add_argument("--list-only", action="store_true",
+                        help="only apply lists (overrides advanced_analysis_enabled)")
+    parser.add_argument("--no-feeds", action="store_true",
+                        help="serve the last compiled feed list without fetching or republishing it")
+    parser.add_argument("--no-watch", action="store_true", help="don't apply config.json edits live")
+    args = parser.parse_args(argv)
+
+    from dnslib.server import DNSServer
+    from filtering_resolver import FilteringResolver, LOG_FILE
+
+    profile = config["llm"]["profiles"][config["llm"]["active_profile"]]
     resolver = FilteringResolver(
         filtering_enabled=config["filtering_enabled"],
-        list_only_filtering_enabled=not config["advanced_analysis_enabled"],
-        model=config["llm"]["profiles"][config["llm"]["active_profile"]]["model"],
-        api_url=config["llm"]["profiles"][config["llm"]["active_profile"]]["api_url"],
+        list_only_filtering_enabled=args.list_only or not config["advanced_analysis_enabled"],
+        model=profile["model"],
+        api_url=profile["api_url"],
         block_score=config["block_score"],
-        upstream_dns=config["upstream_dns"]
+        upstream_dns=args.upstream or config["upstream_dns"],
+        log_file=args.query_log or LOG_FILE,
     )
 
-    DNSServer(resolver, port=config["dns_port"]).start()
+    # config.json edits apply live; command-line overrides stay fixed
+    pinned = {name for name, flag in (("list_only", args.list_only), ("upstream_dns", args.upstream)) if flag}
+    manager.subscribe(lambda old, new, changed: resolver.apply_config(new, pinned),
+                      keys={"filtering_enabled", "advanced_analysis_enabled", "block_score",
+                            "upstream_dns", "llm", "tracing"})
+    if not args.no_watch:
+        manager.watch()
+
+    server = DNSServer(resolver, port=args.port, address=config.get("dns_listen_address") or "")
+    server.start_thread()
+    print(f"[DNS] Listening on port {args.port} "
+          f"({(time.perf_counter() - t_launch) * 1000:.0f} ms after launch)")
+
+    Thread(target=_start_feeds, args=(resolver, not args.no_feeds), name="feeds-init", daemon=True).start()
+    Thread(target=resolver.warm_up, name="analyser-init", daemon=True).start()
+    if not args.no_dashboard:
+        Thread(target=_start_dashboard, name="dashboard", daemon=True).start()
+
+    try:
+        while server.isAlive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
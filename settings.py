@@ -1,5 +1,9 @@
+import copy
 import json
 import os
+import threading
+import time
+from typing import Optional
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
@@ -14,6 +18,7 @@ def load_config() -> dict:
 def save_config(config: dict):
     with open(CONFIG_PATH, "w") as f:
         json.dump(config, f, indent=2)
+    manager.reload()  # apply now instead of waiting for the watcher
 
 def get_llm_settings(profile_choice: str | None = None) -> dict:
     """
@@ -34,5 +39,135 @@ def get_llm_settings(profile_choice: str | None = None) -> dict:
         **profiles[profile]
     }
 
-# global reference (used by server.py)
+# ---------- Live reload ----------
+
+def validate_config(cfg: dict) -> list:
+    """
+    Problems that would break a running server; empty when usable.
+    """
+    errors = []
+    for key in ("filtering_enabled", "advanced_analysis_enabled"):
+        if not isinstance(cfg.get(key), bool):
+            errors.append(f"{key} must be true or false")
+    for key in ("block_score", "dns_port", "dashboard_port"):
+        if not isinstance(cfg.get(key), int) or isinstance(cfg.get(key), bool):
+            errors.append(f"{key} must be an integer")
+    if isinstance(cfg.get("block_score"), int) and cfg["block_score"] < 1:
+        errors.append("block_score must be at least 1")
+    if not isinstance(cfg.get("upstream_dns"), str) or not cfg.get("upstream_dns"):
+        errors.append("upstream_dns must be a host[:port] string")
+    llm_cfg = cfg.get("llm")
+    if not isinstance(llm_cfg, dict):
+        errors.append("llm section missing")
+    else:
+        profile = llm_cfg.get("profiles", {}).get(llm_cfg.get("active_profile"))
+        if not isinstance(profile, dict):
+            errors.append(f"llm.active_profile {llm_cfg.get('active_profile')!r} is not in llm.profiles")
+        elif not profile.get("model") or not profile.get("api_url"):
+            errors.append("active LLM profile needs model and api_url")
+        if llm_cfg.get("structured_output", "json_schema") not in ("json_schema", "json_object", "grammar", "off"):
+            errors.append("llm.structured_output must be json_schema, json_object, grammar or off")
+        routing = llm_cfg.get("routing", {})
+        if routing.get("enabled"):
+            unknown = [p for p in routing.get("profiles", []) if p not in llm_cfg.get("profiles", {})]
+            if unknown or not routing.get("profiles"):
+                errors.append(f"llm.routing.profiles must name llm.profiles entries (unknown: {unknown})")
+    return errors
+
+
+class ConfigManager:
+    """
+    Versioned view of config.json. reload() validates the file and, if it
+    changed, swaps in a new snapshot and calls every subscriber with
+    (old, new, changed top-level keys); an invalid file is reported and
+    the running config kept. watch() polls the file's mtime in a
+    background thread.
+
+    The module-level `config` dict is updated in place on every reload, so
+    code that reads it per use sees new values; components holding derived
+    state subscribe instead.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH, live: Optional[dict] = None):
+        self.path = path
+        self.live = live if live is not None else {}
+        self.snapshot = {}
+        self.version = 0
+        self.mtime = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, callback, keys=None):
+        """
+        callback(old, new, changed) after each applied reload; with `keys`,
+        only when one of them changed.
+        """
+        self.subscribers.append((callback, set(keys) if keys else None))
+
+    def reload(self) -> bool:
+        """
+        Re-reads the file; returns True if a new version was applied.
+        """
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                with open(self.path, "r") as f:
+                    new = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[CONFIG ERROR] {self.path}: {e}")
+                return False
+            self.mtime = mtime
+            errors = validate_config(new)
+            if errors:
+                print(f"[CONFIG ERROR] {self.path} not applied: {'; '.join(errors)}")
+                return False
+            old = self.snapshot
+            changed = {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+            if not changed and self.version:
+                return False
+            self.snapshot = new
+            self.version += 1
+            # Keys are replaced one by one and removed ones dropped last, so
+            # readers on other threads never see the dict empty or a key missing
+            fresh = copy.deepcopy(new)
+            self.live.update(fresh)
+            for key in [k for k in self.live if k not in fresh]:
+                del self.live[key]
+            version = self.version
+        if old:
+            print(f"[CONFIG] v{version}: {', '.join(sorted(changed))} changed")
+        for callback, keys in list(self.subscribers):
+            if old and (keys is None or keys & changed):
+                try:
+                    callback(old, new, changed)
+                except Exception as e:
+                    print(f"[CONFIG ERROR] subscriber {getattr(callback, '__qualname__', callback)}: {e}")
+        return True
+
+    def watch(self, interval: float = 1.0):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._watch, args=(interval,), name="config-watch", daemon=True)
+        self.thread.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self.mtime:
+                self.reload()
+
+
+def active_profile(cfg: dict) -> dict:
+    llm_cfg = cfg["llm"]
+    return llm_cfg["profiles"][llm_cfg["active_profile"]]
+
+
+# global reference (used by server.py); kept current by `manager`
 config = load_config()
+manager = ConfigManager(live=config)
+manager.reload()
@@ -1,15 +1,13 @@
 # simple_verifier.py
 
-import requests
 import ssl
 import socket
-import whois
 from datetime import datetime, timezone
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 
+# requests, whois, cryptography and bs4 are imported inside the checks that
+# use them: importing this module (for is_recent_domain) stays cheap.
+
 # ----------------- SSL CERTIFICATE (SAN) -----------------
 
 def get_san(hostname, port=443):
@@ -17,6 +15,8 @@ def get_san(hostname, port=443):
     Extract Subject Alternative Names (SANs) from an SSL certificate.
     Returns a list of domain names or None if no certificate.
     """
+    from cryptography import x509
+    from cryptography.hazmat.backends import default_backend
     try:
         context = ssl.create_default_context()
         with socket.create_connection((hostname, port), timeout=3) as sock:
@@ -37,6 +37,7 @@ def get_domain_creation_date(hostname):
     Returns a datetime object for the domain's creation date.
     Returns None if not found or WHOIS lookup fails.
     """
+    import whois
     try:
         w = whois.whois(hostname)
         created = w.creation_date
@@ -71,6 +72,7 @@ def is_valid_url(url):
         return False
 
 def check_url_status(url):
+    import requests
     try:
         response = requests.head(url, allow_redirects=True, timeout=5)
         return response.status_code
@@ -78,6 +80,8 @@ def check_url_status(url):
         return None
 
 def find_broken_links(site_url):
+    import requests
+    from bs4 import BeautifulSoup
     broken_links = []
     try:
         page = requests.get(site_url, timeout=10)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# startup_bench.py — cold-start time of server.py and per-module import cost
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from dnslib import DNSRecord
+from dnslib.server import DNSLogger, DNSServer
+
+from replay_bench import QUIET_LOGGER, StubUpstreamResolver
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _first_answer(port: int, deadline: float) -> float:
+    """
+    Polls the DNS port until a query is answered; returns perf_counter() then.
+    """
+    q = DNSRecord.question("startup-probe.example")
+    while time.perf_counter() < deadline:
+        try:
+            q.send("127.0.0.1", port, timeout=0.02)
+            return time.perf_counter()
+        except (socket.timeout, OSError):
+            time.sleep(0.005)
+    raise TimeoutError("server did not answer")
+
+
+def launch(upstream_port: int, importtime: bool = False, timeout: float = 30.0):
+    """
+    Starts server.py (list-only, no dashboard, no feed refresh or config
+    watcher, so measuring leaves the lists untouched) and returns
+    (ms to first DNS answer, stderr text).
+    """
+    port = _free_port()
+    query_log = os.path.join(tempfile.gettempdir(), f"startup-bench-{os.getpid()}.log")
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + [
+        os.path.join(BASE_DIR, "server.py"), "--port", str(port), "--list-only",
+        "--no-dashboard", "--no-feeds", "--no-watch",
+        "--upstream", f"127.0.0.1:{upstream_port}", "--query-log", query_log,
+    ]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        answered = _first_answer(port, t0 + timeout)
+        # Let the background threads finish their imports before reading the log
+        time.sleep(1.0 if importtime else 0)
+    finally:
+        proc.terminate()
+        _, err = proc.communicate(timeout=10)
+        if os.path.exists(query_log):
+            os.remove(query_log)
+    return (answered - t0) * 1000, err
+
+
+def import_costs(stderr: str, top: int):
+    """
+    Top-level modules by cumulative import time (ms) from -X importtime output.
+    """
+    costs = []
+    for line in stderr.splitlines():
+        m = IMPORT_LINE.match(line)
+        if m and not m.group(3):
+            costs.append((m.group(4), int(m.group(2)) / 1000))
+    costs.sort(key=lambda c: -c[1])
+    return costs[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server.py cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="modules to list by import cost")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    upstream = DNSServer(StubUpstreamResolver(), address="127.0.0.1", port=0, logger=DNSLogger(QUIET_LOGGER))
+    upstream.start_thread()
+    try:
+        times = [launch(upstream.server.server_address[1])[0] for _ in range(args.runs)]
+        _, err = launch(upstream.server.server_address[1], importtime=True)
+    finally:
+        upstream.stop()
+
+    report = {
+        "runs": args.runs,
+        "first_answer_ms": {"median": round(statistics.median(times), 1),
+                            "min": round(min(times), 1), "max": round(max(times), 1)},
+        "imports_ms": [{"module": m, "cumulative_ms": round(ms, 1)} for m, ms in import_costs(err, args.top)],
+    }
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"First DNS answer after launch: median {report['first_answer_ms']['median']} ms "
+          f"(min {report['first_answer_ms']['min']}, max {report['first_answer_ms']['max']}, {args.runs} runs)")
+    print("\nTop-level imports (cumulative ms, includes background threads):")
+    for row in report["imports_ms"]:
+        print(f"  {row['cumulative_ms']:>8.1f}  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from domain_names import normalize
+from filtering_resolver import FilteringResolver
+from verdict_learner import VerdictLearner
+
+CONFIDENT_ALLOW = {"verdict": "allow", "score": 0, "source": "llm", "evidence": {"llm_verdict": "Safe"}}
+CONFIDENT_BLOCK = {"verdict": "block", "score": 9, "source": "llm", "evidence": {"llm_verdict": "Malicious"}}
+
+
+def _resolver(tmp_path):
+    lists = {key: str(tmp_path / f"{key}.txt")
+             for key in ("user_whitelist", "user_blacklist", "auto_whitelist", "auto_blacklist")}
+    resolver = FilteringResolver(True, True, "mock", "http://127.0.0.1:1", 4, "127.0.0.1:53",
+                                 lists=lists, log_file=str(tmp_path / "queries.log"), rate_limiter=False,
+                                 burst_detector=False, analysis_queue=False, learner=False,
+                                 events=False, tracer=False)
+    learner = VerdictLearner(lists["auto_whitelist"], lists["auto_blacklist"], 4)
+    return resolver, learner
+
+
+def test_learned_registrable_covers_only_itself(tmp_path):
+    resolver, learner = _resolver(tmp_path)
+    assert learner.record("weebly.com", CONFIDENT_ALLOW) == "auto_whitelist"
+    assert learner.record("github.io", CONFIDENT_BLOCK) == "auto_blacklist"
+    learner.flush()
+
+    assert resolver._listed(normalize("weebly.com"), "auto_whitelist")
+    assert not resolver._listed(normalize("paypal-verify.weebly.com"), "auto_whitelist")
+    assert resolver._listed(normalize("github.io"), "auto_blacklist")
+    assert not resolver._listed(normalize("someone.github.io"), "auto_blacklist")
+
+
+def test_user_registrable_covers_subdomains(tmp_path):
+    resolver, _ = _resolver(tmp_path)
+    with open(resolver.lists["user_whitelist"], "w") as f:
+        f.write("example.com\n")
+
+    assert resolver._listed(normalize("www.example.com"), "user_whitelist")
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# tracing.py — sampled per-query spans and an on-demand sampling profiler
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACE_FILE = os.path.join(BASE_DIR, "logs", "traces.jsonl")
+
+_local = threading.local()
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "t0")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        self.trace.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.depth -= 1
+        self.trace.add(self.name, self.t0)
+        return False
+
+
+class Trace:
+    """
+    Spans of one sampled query, as (name, start_us, dur_us, depth) relative
+    to the trace start. Installed as the thread's current trace until
+    finish(), so span()/add_span() anywhere below attach to it.
+    """
+
+    __slots__ = ("tracer", "name", "t0", "wall", "spans", "depth", "attrs", "previous")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.depth = 1
+        self.wall = time.time()
+        self.previous = getattr(_local, "trace", None)
+        _local.trace = self
+        self.t0 = time.perf_counter()
+
+    def add(self, name, t0, t1=None):
+        t1 = time.perf_counter() if t1 is None else t1
+        if len(self.spans) < self.tracer.max_spans:
+            self.spans.append((name, round((t0 - self.t0) * 1e6), round((t1 - t0) * 1e6), self.depth))
+
+    def finish(self, **attrs):
+        end = time.perf_counter()
+        _local.trace = self.previous
+        self.attrs.update(attrs)
+        self.tracer.emit({
+            "name": self.name,
+            "ts": self.wall,
+            "dur_us": round((end - self.t0) * 1e6),
+            "tid": threading.get_ident(),
+            "attrs": self.attrs,
+            "spans": self.spans,
+        })
+
+
+def current() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+
+def span(name: str):
+    """
+    Context manager timing a stage of the current trace; a shared no-op
+    when this thread is not being traced.
+    """
+    trace = getattr(_local, "trace", None)
+    return _NO_SPAN if trace is None else _Span(trace, name)
+
+
+def add_span(name: str, t0: float, t1: Optional[float] = None):
+    """
+    Records an already-timed stage (perf_counter() start) on the current trace.
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.add(name, t0, t1)
+
+
+class Tracer:
+    """
+    Samples `sample_rate` of queries into traces, buffers them in memory
+    and appends them to `trace_file` (one JSON object per line) from a
+    background thread, so the query path never waits on disk. At most
+    `max_buffered` traces wait for the writer; extra ones are dropped.
+    """
+
+    def __init__(self, sample_rate=0.01, trace_file=TRACE_FILE, max_spans=64,
+                 max_buffered=10000, flush_interval=1.0):
+        self.sample_rate = float(sample_rate)
+        self.trace_file = trace_file
+        self.max_spans = max_spans
+        self.max_buffered = max_buffered
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.dropped = 0
+        self.random = random.random
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "Tracer":
+        trace_file = cfg.get("trace_file", TRACE_FILE)
+        return cls(
+            sample_rate=cfg.get("sample_rate", 0.01),
+            trace_file=trace_file if os.path.isabs(trace_file) else os.path.join(BASE_DIR, trace_file),
+            max_spans=cfg.get("max_spans", 64),
+            max_buffered=cfg.get("max_buffered", 10000),
+        )
+
+    @classmethod
+    def from_settings(cls) -> Optional["Tracer"]:
+        """
+        Builds the tracer from config.json, or None when tracing is
+        disabled or the sample rate is 0 (callers then skip tracing entirely).
+        """
+        from settings import config
+        cfg = config.get("tracing", {})
+        if not cfg.get("enabled", False) or cfg.get("sample_rate", 0.01) <= 0:
+            return None
+        return cls.from_config(cfg)
+
+    def begin(self, name: str, **attrs) -> Optional[Trace]:
+        """
+        A new trace for this thread, or None if the query is not sampled.
+        """
+        if self.random() >= self.sample_rate:
+            return None
+        return Trace(self, name, attrs)
+
+    def emit(self, record: dict):
+        with self.lock:
+            if len(self.buffer) >= self.max_buffered:
+                self.dropped += 1
+                return
+            self.buffer.append(record)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="tracer", daemon=True)
+                self.thread.start()
+
+    def flush(self):
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+        if not batch:
+            return
+        os.makedirs(os.path.dirname(self.trace_file), exist_ok=True)
+        with open(self.trace_file, "a") as f:
+            f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch))
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[TRACE ERROR] {e}")
+
+
+# ---------- Export ----------
+
+def read_traces(path: str):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def to_chrome(traces) -> dict:
+    """
+    Chrome trace-event JSON (chrome://tracing, Perfetto): each trace and
+    span becomes a complete ("X") event on its thread's track.
+    """
+    events = []
+    for t in traces:
+        start = t["ts"] * 1e6
+        events.append({"name": t["name"], "ph": "X", "ts": start, "dur": t["dur_us"],
+                       "pid": 1, "tid": t["tid"], "args": t.get("attrs", {})})
+        for name, offset, dur, _ in t["spans"]:
+            events.append({"name": name, "ph": "X", "ts": start + offset, "dur": dur,
+                           "pid": 1, "tid": t["tid"]})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def to_folded(traces) -> Counter:
+    """
+    Folded stacks ("resolve;analysis;llm <self-µs>") for flamegraph.pl or
+    speedscope. Spans nest by start/end and depth within each trace.
+    """
+    folded = Counter()
+    for t in traces:
+        # (name, start, end, depth) with the root at depth 0, ordered parent before child
+        nodes = [(t["name"], 0, t["dur_us"], 0)] + [
+            (name, off, off + dur, depth) for name, off, dur, depth in t["spans"]]
+        nodes.sort(key=lambda n: (n[1], n[3]))
+        stack = []  # [path, end, depth, self_us]
+        for name, start, end, depth in nodes:
+            while stack and (stack[-1][2] >= depth or stack[-1][1] <= start):
+                path, _, _, self_us = stack.pop()
+                folded[path] += max(self_us, 0)
+            if stack:
+                stack[-1][3] -= end - start
+                path = f"{stack[-1][0]};{name}"
+            else:
+                path = name
+            stack.append([path, end, depth, end - start])
+        while stack:
+            path, _, _, self_us = stack.pop()
+            folded[path] += max(self_us, 0)
+    return folded
+
+
+# ---------- Sampling profiler ----------
+
+_profile_lock = threading.Lock()
+
+
+def sample_profile(seconds: float = 5.0, interval: float = 0.005) -> Optional[Counter]:
+    """
+    Samples every other thread's Python stack every `interval` seconds for
+    `seconds` and returns folded stacks -> sample count (thread name as the
+    root frame). None if another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        folded = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                folded[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return folded
+    finally:
+        _profile_lock.release()
+
+
+def format_folded(folded: Counter) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in folded.most_common())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert resolver traces")
+    parser.add_argument("format", choices=["chrome", "folded"])
+    parser.add_argument("traces", nargs="?", default=TRACE_FILE)
+    parser.add_argument("-o", "--output", default=None, help="output file (default stdout)")
+    parser.add_argument("--slowest", type=int, default=None, help="only the N slowest traces")
+    args = parser.parse_args()
+
+    traces = read_traces(args.traces)
+    if args.slowest:
+        traces = sorted(traces, key=lambda t: -t["dur_us"])[:args.slowest]
+    if args.format == "chrome":
+        out = json.dumps(to_chrome(traces))
+    else:
+        out = format_folded(to_folded(traces))
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        sys.stdout.write(out)
+
+
+if __name__ == "__main__":
+    main()
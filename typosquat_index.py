@@ -0,0 +1,245 @@
+# typosquat_index.py
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_DIR = os.path.join(BASE_DIR, "config")
+
+BRANDS_FILE = os.path.join(CONFIG_DIR, "protected_brands.txt")
+INDEX_FILE = os.path.join(CONFIG_DIR, "typosquat_index.npz")
+
+
+def _hash(domain: str) -> int:
+    """
+    64-bit fingerprint of a domain name.
+    """
+    return int.from_bytes(hashlib.blake2b(domain.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _load_brands(path: str) -> List[str]:
+    try:
+        with open(path) as f:
+            return [line.strip().lower() for line in f if line.strip() and not line.startswith("#")]
+    except FileNotFoundError:
+        return []
+
+
+def _permutations(brand: str) -> List[str]:
+    import dnstwist  # only needed by the offline build
+
+    fuzz = dnstwist.Fuzzer(brand)
+    fuzz.generate()
+    perms = fuzz.permutations() if hasattr(fuzz, "permutations") else fuzz.domains
+    out = []
+    for p in perms:
+        name = p.get("domain") or p.get("domain-name")
+        if name and name != brand:
+            out.append(name.lower())
+    return out
+
+
+def _config_path(key: str, default: str) -> str:
+    from settings import config
+    path = config.get("typosquat", {}).get(key) or default
+    return path if os.path.isabs(path) else os.path.join(CONFIG_DIR, path)
+
+
+def _hash_brand(args):
+    brand_id, brand = args
+    perms = _permutations(brand)
+    return brand_id, np.fromiter((_hash(d) for d in perms), dtype=np.uint64, count=len(perms))
+
+
+class TyposquatIndex:
+    """
+    Compact hash index of dnstwist permutations -> protected brand.
+
+    Fingerprints are kept sorted and bucketed by their top bits, so a
+    lookup is one jump into `offsets` plus a scan of a bucket holding
+    a few entries on average: O(1) without a sparse hash table.
+    """
+
+    def __init__(self, brands: List[str], keys: np.ndarray, values: np.ndarray):
+        self.brands = list(brands)
+        self.keys = keys.astype(np.uint64, copy=False)
+        self.values = values.astype(np.uint16 if len(self.brands) < (1 << 16) else np.uint32, copy=False)
+        # 2-4 fingerprints per bucket keeps the offsets table a fraction of the keys
+        self.bits = max(1, int(len(self.keys)).bit_length() - 2)
+        self.shift = np.uint64(64 - self.bits)
+        buckets = (self.keys >> self.shift).astype(np.int64)
+        counts = np.bincount(buckets, minlength=1 << self.bits)
+        self.offsets = np.zeros((1 << self.bits) + 1, dtype=np.uint32)
+        np.cumsum(counts, out=self.offsets[1:])
+        self._protected = set(self.brands)
+
+    # ---------- Build / persist ----------
+
+    @classmethod
+    def build(cls, brands: Iterable[str], processes: Optional[int] = None) -> "TyposquatIndex":
+        brands = sorted({b.strip().lower() for b in brands if b.strip()})
+        protected = {_hash(b) for b in brands}
+        jobs = list(enumerate(brands))
+
+        keys: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        if processes == 1 or len(jobs) < 64:
+            results = map(_hash_brand, jobs)
+            for brand_id, hashes in results:
+                keys.append(hashes)
+                values.append(np.full(len(hashes), brand_id, dtype=np.uint32))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                for brand_id, hashes in pool.map(_hash_brand, jobs, chunksize=32):
+                    keys.append(hashes)
+                    values.append(np.full(len(hashes), brand_id, dtype=np.uint32))
+
+        k = np.concatenate(keys) if keys else np.zeros(0, dtype=np.uint64)
+        v = np.concatenate(values) if values else np.zeros(0, dtype=np.uint32)
+        # A permutation of one brand can be another protected brand; never flag those
+        keep = ~np.isin(k, np.fromiter(protected, dtype=np.uint64, count=len(protected)))
+        k, v = k[keep], v[keep]
+        order = np.argsort(k, kind="stable")
+        k, v = k[order], v[order]
+        # Dedupe: first brand wins for permutations shared by several brands
+        if len(k):
+            first = np.ones(len(k), dtype=bool)
+            first[1:] = k[1:] != k[:-1]
+            k, v = k[first], v[first]
+        return cls(brands, k, v)
+
+    def save(self, path: str = INDEX_FILE):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, keys=self.keys, values=self.values, brands=np.array(self.brands, dtype=str))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> "TyposquatIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(list(data["brands"]), data["keys"], data["values"])
+
+    @classmethod
+    def from_settings(cls) -> Optional["TyposquatIndex"]:
+        """
+        Loads the prebuilt index named in config.json, or None when the
+        check is disabled or the offline build hasn't been run yet.
+        """
+        from settings import config
+        if not config.get("typosquat", {}).get("enabled", True):
+            return None
+        path = _config_path("index_file", INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls.load(path)
+        except Exception as e:
+            print(f"[TYPOSQUAT ERROR] {path}: {e}")
+            return None
+
+    # ---------- Lookup ----------
+
+    def lookup(self, domain: str) -> Optional[str]:
+        """
+        Returns the protected brand `domain` impersonates, or None.
+        """
+        domain = (domain or "").lower().strip(".")
+        if not domain or domain in self._protected:
+            return None
+        h = _hash(domain)
+        b = h >> int(self.shift)
+        lo, hi = int(self.offsets[b]), int(self.offsets[b + 1])
+        for i in range(lo, hi):
+            if int(self.keys[i]) == h:
+                return self.brands[int(self.values[i])]
+        return None
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + self.values.nbytes + self.offsets.nbytes)
+
+
+# ---------- Offline job / benchmark ----------
+
+def _synthetic_brands(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    tlds = ["com", "net", "org", "io", "de", "co.uk"]
+    out = set()
+    while len(out) < n:
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+        out.add(f"{name}.{rng.choice(tlds)}")
+    return sorted(out)
+
+
+def benchmark(sizes=(1000, 10000), processes: Optional[int] = None, lookups: int = 100000) -> List[dict]:
+    results = []
+    for n in sizes:
+        brands = _synthetic_brands(n, seed=n)
+
+        t0 = time.perf_counter()
+        index = TyposquatIndex.build(brands, processes=processes)
+        build_s = time.perf_counter() - t0
+
+        rng = random.Random(n)
+        hits = [_permutations(b)[0] for b in rng.sample(brands, min(100, n))]
+        misses = [f"nohit{i}.example" for i in range(100)]
+        probes = [rng.choice(hits + misses) for _ in range(lookups)]
+
+        t0 = time.perf_counter()
+        for d in probes:
+            index.lookup(d)
+        lookup_us = (time.perf_counter() - t0) / lookups * 1e6
+
+        results.append({
+            "brands": n,
+            "entries": len(index),
+            "build_s": round(build_s, 2),
+            "index_mb": round(index.nbytes / 1e6, 2),
+            "lookup_us": round(lookup_us, 3),
+        })
+        print(json.dumps(results[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline typosquat index builder")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="build the index from the protected-brand list")
+    p_build.add_argument("--brands", default=None, help="defaults to typosquat.brands_file in config.json")
+    p_build.add_argument("--out", default=None, help="defaults to typosquat.index_file in config.json")
+    p_build.add_argument("--processes", type=int, default=None)
+
+    p_bench = sub.add_parser("bench", help="benchmark build time, size and lookup latency")
+    p_bench.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    p_bench.add_argument("--processes", type=int, default=None)
+
+    args = parser.parse_args()
+    if args.cmd == "build":
+        args.brands = args.brands or _config_path("brands_file", BRANDS_FILE)
+        args.out = args.out or _config_path("index_file", INDEX_FILE)
+        brands = _load_brands(args.brands)
+        if not brands:
+            parser.error(f"no brands found in {args.brands}")
+        t0 = time.perf_counter()
+        index = TyposquatIndex.build(brands, processes=args.processes)
+        index.save(args.out)
+        print(f"Indexed {len(index)} permutations of {len(brands)} brands "
+              f"({index.nbytes / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f}s -> {args.out}")
+    else:
+        benchmark(args.sizes, processes=args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# verdict_learner.py
+
+import threading
+import time
+from typing import Optional
+
+from lists import WHITELIST_AUTO, BLACKLIST_AUTO, open_list
+
+AUTO_WHITELIST = "auto_whitelist"
+AUTO_BLACKLIST = "auto_blacklist"
+
+# Checks that failed or never ran: nothing to be confident about
+_UNSURE = {"Error", ""}
+
+
+class VerdictLearner:
+    """
+    Promotes confident analysis verdicts into the auto whitelist/blacklist
+    so the same domain is answered from the lists next time.
+
+    A block is learned when score >= block_score + block_margin, an allow
+    when score <= block_score - allow_margin; lexical verdicts (cheap to
+    recompute) and results with a failed LLM check are never learned.
+    Verdicts are buffered and written by a background thread through the
+    lists' ListStores as "domain ts score model" entries, so the resolver
+    sees them as deltas. A domain that switches lists leaves the old one
+    in the same flush. Entries older than `ttl_days` are removed every
+    `compact_interval` seconds, after which both lists are snapshotted.
+    """
+
+    def __init__(self, whitelist_file=WHITELIST_AUTO, blacklist_file=BLACKLIST_AUTO, block_score=4, *,
+                 block_margin=2, allow_margin=4, ttl_days=30.0, flush_interval=5.0, flush_batch=100,
+                 compact_interval=3600.0):
+        self.stores = {AUTO_WHITELIST: open_list(whitelist_file), AUTO_BLACKLIST: open_list(blacklist_file)}
+        self.block_score = block_score
+        self.block_margin = block_margin
+        self.allow_margin = allow_margin
+        self.ttl_s = float(ttl_days) * 86400
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, int(flush_batch))
+        self.compact_interval = compact_interval
+
+        self.buffer = {}      # domain -> (key, ts, score, model) not yet written
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.thread = None
+        self.last_compact = None
+        self.stats = {"learned": 0, "refreshed": 0, "flipped": 0, "expired": 0, "compactions": 0}
+
+    @classmethod
+    def from_config(cls, cfg: dict, block_score=4, **kwargs) -> "VerdictLearner":
+        return cls(
+            block_score=block_score,
+            block_margin=cfg.get("block_margin", 2),
+            allow_margin=cfg.get("allow_margin", 4),
+            ttl_days=cfg.get("ttl_days", 30),
+            flush_interval=cfg.get("flush_interval_s", 5),
+            flush_batch=cfg.get("flush_batch", 100),
+            compact_interval=cfg.get("compact_interval_s", 3600),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_settings(cls, block_score=4, **kwargs) -> Optional["VerdictLearner"]:
+        """
+        Builds the learner from config.json, or None when disabled there.
+        """
+        from settings import config
+        cfg = config.get("verdict_learning", {})
+        if not cfg.get("enabled", True):
+            return None
+        return cls.from_config(cfg, block_score, **kwargs)
+
+    # ---------- Confidence ----------
+
+    def classify(self, result: Optional[dict]) -> Optional[str]:
+        """
+        The list a result belongs in, or None if it is not confident enough.
+        """
+        if not result or result.get("source") == "lexical":
+            return None
+        evidence = result.get("evidence") or {}
+        if evidence.get("llm_verdict") in _UNSURE or evidence.get("san_verdict") == "Error":
+            return None
+        if not any(v is not None for v in evidence.values()):
+            return None  # reserved TLDs: decided without looking
+        score = result.get("score", 0)
+        if result.get("verdict") == "block" and score >= self.block_score + self.block_margin:
+            return AUTO_BLACKLIST
+        if result.get("verdict") == "allow" and score <= self.block_score - self.allow_margin:
+            return AUTO_WHITELIST
+        return None
+
+    # ---------- Recording ----------
+
+    def record(self, domain: str, result: Optional[dict], model: str = "-") -> Optional[str]:
+        """
+        Buffers `domain` for its list if the verdict is confident and not
+        already learned recently. Returns the list key it was queued for.
+        """
+        key = self.classify(result)
+        if key is None:
+            return None
+        now = time.time()
+        model = (model or "-").replace(" ", "_")
+        with self.cond:
+            known = self.buffer.get(domain) or self._known(domain)
+            # Same list and not yet half-way to expiry: nothing to write
+            if known is not None and known[0] == key and now - known[1] < self.ttl_s / 2:
+                return None
+            self.buffer[domain] = (key, now, result.get("score", 0), model)
+            self.start()
+            if len(self.buffer) >= self.flush_batch:
+                self.cond.notify()
+        return key
+
+    @staticmethod
+    def _ts(fields: str) -> Optional[float]:
+        try:
+            return float(fields.split(None, 1)[0])
+        except (IndexError, ValueError):
+            return None  # hand-added entry: never expires
+
+    def _known(self, domain):
+        for key, store in self.stores.items():
+            fields = store.get(domain)
+            if fields is not None:
+                ts = self._ts(fields)
+                return key, time.time() if ts is None else ts
+        return None
+
+    # ---------- Writer ----------
+
+    def start(self):
+        """
+        Starts the writer thread; its first pass drops expired entries.
+        """
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="verdict-learner", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if self.last_compact is None or time.monotonic() - self.last_compact >= self.compact_interval:
+                    self.compact()
+                self.flush()
+            except OSError as e:
+                print(f"[LEARNER ERROR] {e}")
+            with self.cond:
+                self.cond.wait(timeout=self.flush_interval)
+
+    def flush(self):
+        """
+        Writes buffered verdicts, one store update per list.
+        """
+        with self.write_lock:
+            with self.cond:
+                batch, self.buffer = self.buffer, {}
+            if not batch:
+                return
+            added = {key: {} for key in self.stores}
+            removed = {key: [] for key in self.stores}
+            for domain, (key, ts, score, model) in batch.items():
+                added[key][domain] = f"{ts:.0f} {score} {model}"
+                previous = self._known(domain)
+                if previous is None:
+                    self.stats["learned"] += 1
+                elif previous[0] != key:
+                    removed[previous[0]].append(domain)
+                    self.stats["flipped"] += 1
+                else:
+                    self.stats["refreshed"] += 1
+            # Add before removing so a flipped domain is never in neither list
+            for key, store in self.stores.items():
+                if added[key]:
+                    store.update(added[key])
+            for key, store in self.stores.items():
+                if removed[key]:
+                    store.update(removed=removed[key])
+
+    def compact(self):
+        """
+        Removes expired entries, then snapshots both lists.
+        """
+        with self.write_lock:
+            cutoff = time.time() - self.ttl_s
+            for store in self.stores.values():
+                expired = [d for d, fields in store.items() if (self._ts(fields) or cutoff) < cutoff]
+                if expired:
+                    store.update(removed=expired)
+                    self.stats["expired"] += len(expired)
+                store.snapshot()
+            self.stats["compactions"] += 1
+            self.last_compact = time.monotonic()
+
+    def invalidate(self, block_score: Optional[int] = None, model: Optional[str] = None) -> int:
+        """
+        After a live config change, drops the learned entries it undermines:
+        those no longer past the margins of the new `block_score`, or learned
+        by a model other than `model`. Hand-added entries are kept.
+        """
+        if block_score is not None:
+            self.block_score = block_score
+        model = model.replace(" ", "_") if model else None
+
+        def stale(key, score, learned_by):
+            if model is not None and learned_by != model:
+                return True
+            if key == AUTO_BLACKLIST:
+                return score < self.block_score + self.block_margin
+            return score > self.block_score - self.allow_margin
+
+        dropped = 0
+        with self.write_lock:
+            with self.cond:
+                self.buffer = {d: e for d, e in self.buffer.items() if not stale(e[0], e[2], e[3])}
+            for key, store in self.stores.items():
+                drop = []
+                for domain, fields in store.items():
+                    parts = fields.split()
+                    try:
+                        if len(parts) >= 3 and stale(key, float(parts[1]), parts[2]):
+                            drop.append(domain)
+                    except ValueError:
+                        continue
+                if drop:
+                    dropped += store.update(removed=drop)[1]
+        if dropped:
+            print(f"[LEARNER] Dropped {dropped} learned entries after config change")
+        return dropped
+
+    def status(self) -> dict:
+        with self.cond:
+            buffered = len(self.buffer)
+        return {
+            **self.stats,
+            "buffered": buffered,
+            "whitelist": len(self.stores[AUTO_WHITELIST]),
+            "blacklist": len(self.stores[AUTO_BLACKLIST]),
+        }